@@ -0,0 +1,94 @@
+"""Throughput benchmark for reading the MetaQA `kb.txt`.
+
+Compares the streaming chunked reader in `meta_qa/meta_qa.py` against the
+previous `np.loadtxt` path and reports triples/sec and peak RSS. Each reader
+runs in its own process so the RSS figures do not leak into each other.
+
+Usage:
+    python benchmarks/meta_qa_kb.py [/path/to/kb.txt]
+
+Without an argument a synthetic KB with the shape of MetaQA's is generated.
+"""
+
+import importlib.util
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _load_meta_qa():
+    spec = importlib.util.spec_from_file_location("meta_qa", os.path.join(_ROOT, "meta_qa", "meta_qa.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _write_synthetic_kb(path, n_triples=150000):
+    relations = ["directed_by", "written_by", "starred_actors", "release_year", "in_language",
+                 "has_tags", "has_genre", "has_imdb_votes", "has_imdb_rating"]
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n_triples):
+            f.write("Movie Title {}|{}|Some Entity Name {}\n".format(i // 8, relations[i % len(relations)], i % 43234))
+
+
+def _read_loadtxt(meta_qa, kb_file):
+    count = 0
+    for line in np.loadtxt(kb_file, delimiter="|", dtype=str):
+        row = {"subject": line[0], "predicate": line[1], "object": line[2]}
+        count += 1
+    return count
+
+
+def _read_streaming(meta_qa, kb_file):
+    count = 0
+    for batch in meta_qa.iter_kb_batches(kb_file):
+        for subject, predicate, object in batch:
+            row = {"subject": subject, "predicate": predicate, "object": object}
+            count += 1
+    return count
+
+
+def _run(reader, kb_file, queue):
+    # Import the builder module (and with it `datasets`) up front so both
+    # readers start from the same baseline and the import is not timed.
+    meta_qa = _load_meta_qa()
+    start = time.perf_counter()
+    count = reader(meta_qa, kb_file)
+    elapsed = time.perf_counter() - start
+    queue.put((count, elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+
+def main(argv):
+    tmp_dir = None
+    if len(argv) > 1:
+        kb_file = argv[1]
+    else:
+        tmp_dir = tempfile.TemporaryDirectory()
+        kb_file = os.path.join(tmp_dir.name, "kb.txt")
+        _write_synthetic_kb(kb_file)
+
+    print("kb file: {} ({:.1f} MiB)".format(kb_file, os.path.getsize(kb_file) / 2 ** 20))
+    ctx = multiprocessing.get_context("spawn")
+    for name, reader in [("np.loadtxt", _read_loadtxt), ("iter_kb_batches", _read_streaming)]:
+        queue = ctx.Queue()
+        process = ctx.Process(target=_run, args=(reader, kb_file, queue))
+        process.start()
+        count, elapsed, max_rss = queue.get()
+        process.join()
+        print("{:<16} {:>10d} triples {:>12.0f} triples/sec  peak RSS {:>8.1f} MiB".format(
+            name, count, count / elapsed, max_rss / 1024))
+
+    if tmp_dir is not None:
+        tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,139 @@
+"""Per-epoch iteration cost of the QALD-9 `qald` and `qald-structured` configs.
+
+`qald` stores `question` and `answers` as JSON strings, so every epoch pays a
+`json.loads` per row to get at the English question and the answer values.
+`qald-structured` stores them as nested columns. The benchmark times one epoch
+of row iteration for both, plus a batched epoch over the Arrow columns of the
+structured layout that never materialises a row.
+
+Usage:
+    python benchmarks/qald_features.py [/path/to/qald-9-train-multilingual.json] [epochs]
+
+Without a file argument a synthetic QALD file is generated.
+"""
+
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import time
+
+import datasets
+import pyarrow.compute as pc
+
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_LANGUAGES = ["en", "de", "fr", "ru", "es", "it", "nl", "pt", "hi_IN", "fa", "pt_BR", "ro"]
+
+
+def _load_qald9():
+    spec = importlib.util.spec_from_file_location("qald_9", os.path.join(_ROOT, "qald", "qald-9.py"))
+    module = importlib.util.module_from_spec(spec)
+    # `datasets` looks the builder's module up by name when it is instantiated.
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def _write_synthetic_qald(path, n_questions=20000):
+    questions = []
+    for i in range(n_questions):
+        if i % 10 == 0:
+            answers = [{"head": {}, "boolean": i % 20 == 0}]
+        else:
+            bindings = [{"uri": {"type": "uri", "value": "http://dbpedia.org/resource/Entity_{}".format(i * 7 + j)}}
+                        for j in range(i % 9 + 1)]
+            answers = [{"head": {"vars": ["uri"]}, "results": {"bindings": bindings}}]
+        questions.append({
+            "id": str(i),
+            "answertype": "boolean" if i % 10 == 0 else "resource",
+            "aggregation": False,
+            "onlydbo": True,
+            "hybrid": False,
+            "question": [{"language": language, "string": "Question {} in {}?".format(i, language),
+                          "keywords": "question, {}".format(i)} for language in _LANGUAGES],
+            "query": {"sparql": "SELECT DISTINCT ?uri WHERE { ?uri a <http://dbpedia.org/ontology/Thing_%d> }" % i},
+            "answers": answers
+        })
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"dataset": {"id": "qald-9-train-multilingual"}, "questions": questions}, f)
+
+
+def _build(qald9, config_name, data_file):
+    builder = qald9.QALDQuestions(config_name=config_name)
+    rows = [example for _, example in builder._generate_examples(data_file=data_file, split="train")]
+    # With the config's features the nested columns get the layout a real
+    # build writes: `Sequence({...})` is a struct of lists, not a list of structs.
+    return datasets.Dataset.from_list(rows, features=builder.info.features)
+
+
+def _epoch_json(dataset):
+    n_values = 0
+    for row in dataset:
+        question = json.loads(row["question"])
+        answers = json.loads(row["answers"])
+        english = next((entry["string"] for entry in question if entry["language"] == "en"), None)
+        for answer in answers:
+            for binding in answer.get("results", {}).get("bindings", []):
+                n_values += len(binding)
+    return n_values
+
+
+def _epoch_structured(dataset):
+    n_values = 0
+    for row in dataset:
+        question = row["question"]
+        english = next((string for language, string in zip(question["language"], question["string"])
+                        if language == "en"), None)
+        n_values += len(row["answers"]["bindings"]["value"])
+    return n_values
+
+
+def _epoch_columns(dataset, batch_size=1000):
+    n_values = 0
+    for batch in dataset.with_format("arrow").iter(batch_size=batch_size):
+        question = batch.column("question").combine_chunks()
+        languages = pc.list_flatten(question.field("language"))
+        english = pc.filter(pc.list_flatten(question.field("string")), pc.equal(languages, "en"))
+        n_values += len(pc.list_flatten(batch.column("answers").combine_chunks().field("bindings").field("value")))
+    return n_values
+
+
+def _time(epoch, dataset, epochs):
+    timings = []
+    for _ in range(epochs):
+        start = time.perf_counter()
+        n_values = epoch(dataset)
+        timings.append(time.perf_counter() - start)
+    return n_values, min(timings)
+
+
+def main(argv):
+    tmp_dir = None
+    if len(argv) > 1:
+        data_file = argv[1]
+    else:
+        tmp_dir = tempfile.TemporaryDirectory()
+        data_file = os.path.join(tmp_dir.name, "qald-9-train-multilingual.json")
+        _write_synthetic_qald(data_file)
+    epochs = int(argv[2]) if len(argv) > 2 else 3
+
+    qald9 = _load_qald9()
+    as_json = _build(qald9, "qald", data_file)
+    structured = _build(qald9, "qald-structured", data_file)
+    print("data file: {} ({} questions)".format(data_file, len(as_json)))
+    for name, epoch, dataset in [("json.loads rows", _epoch_json, as_json),
+                                 ("structured rows", _epoch_structured, structured),
+                                 ("structured arrow", _epoch_columns, structured)]:
+        n_values, elapsed = _time(epoch, dataset, epochs)
+        print("{:<18} {:>8.3f} s/epoch {:>12.0f} rows/sec  ({} answer bindings)".format(
+            name, elapsed, len(dataset) / elapsed, n_values))
+
+    if tmp_dir is not None:
+        tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main(sys.argv)
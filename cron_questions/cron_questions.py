@@ -1,9 +1,14 @@
 """CronKGQA."""
 
+import builtins
 import os
 import json
 import pickle
+import shutil
+from array import array
 
+import numpy as np
+import pyarrow as pa
 import datasets
 
 logger = datasets.logging.get_logger(__name__)
@@ -25,6 +30,362 @@ _URL = "https://github.com/apoorvumang/CronKGQA"
 
 _LICENSE = "MIT License"
 
+_BATCH_SIZE = 1000
+
+_QUESTION_SCHEMA = pa.schema([
+    ("question", pa.string()),
+    ("answers", pa.list_(pa.string())),
+    ("answer_times", pa.list_(pa.int32())),
+    ("answer_type", pa.string()),
+    ("template", pa.string()),
+    ("entities", pa.list_(pa.string())),
+    ("times", pa.list_(pa.int32())),
+    ("relations", pa.list_(pa.string())),
+    ("type", pa.string()),
+    ("annotation", pa.struct([("key", pa.list_(pa.string())), ("value", pa.list_(pa.string()))])),
+    ("uniq_id", pa.int64()),
+    ("paraphrases", pa.list_(pa.string())),
+    ("legacy_answers", pa.string()),
+    ("legacy_times", pa.string()),
+    ("legacy_annotation", pa.string()),
+    ("legacy_entities", pa.list_(pa.string())),
+    ("legacy_relations", pa.list_(pa.string()))
+])
+
+# The `cron_questions` config reproduces the rows the pickle-based script
+# emitted, so its JSON strings and lists are kept as first converted.
+_LEGACY_COLUMNS = {
+    "legacy_answers": "answers",
+    "legacy_times": "times",
+    "legacy_annotation": "annotation",
+    "legacy_entities": "entities",
+    "legacy_relations": "relations"
+}
+
+# The question pickles only hold builtin containers, strings and ints, plus
+# numpy scalars in some releases; anything else is refused.
+_PICKLE_GLOBALS = {
+    ("builtins", "set"): builtins.set,
+    ("builtins", "frozenset"): builtins.frozenset
+}
+_NUMPY_GLOBALS = {"numpy.core.multiarray", "numpy._core.multiarray", "numpy"}
+
+
+class _QuestionUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        if (module, name) in _PICKLE_GLOBALS:
+            return _PICKLE_GLOBALS[module, name]
+        if module in _NUMPY_GLOBALS and name in ("scalar", "dtype"):
+            return super().find_class(module, name)
+        raise pickle.UnpicklingError("Refusing to unpickle {}.{} from a CronQuestions file".format(module, name))
+
+
+def _typed_question(question):
+    annotation = sorted(question["annotation"].items())
+    if question["answer_type"] == "time":
+        answers, answer_times = [], sorted(int(time) for time in question["answers"])
+    else:
+        answers, answer_times = sorted(str(answer) for answer in question["answers"]), []
+    return {
+        "question": question["question"],
+        "answers": answers,
+        "answer_times": answer_times,
+        "answer_type": question["answer_type"],
+        "template": question["template"],
+        "entities": sorted(question["entities"]),
+        "times": sorted(int(time) for time in question["times"]),
+        "relations": sorted(question["relations"]),
+        "type": question["type"],
+        "annotation": {
+            "key": [key for key, _ in annotation],
+            "value": [str(value) for _, value in annotation]
+        },
+        "uniq_id": int(question["uniq_id"]),
+        "paraphrases": list(question.get("paraphrases") or []),
+        # numpy ints, which some pickles hold, are written like plain ints.
+        "legacy_answers": json.dumps(list(question["answers"]), default=int),
+        "legacy_times": json.dumps(list(question["times"]), default=int),
+        "legacy_annotation": json.dumps(question["annotation"], default=int),
+        "legacy_entities": list(question["entities"]),
+        "legacy_relations": list(question["relations"])
+    }
+
+
+def questions_arrow_file(pickle_file):
+    return os.path.splitext(pickle_file)[0] + ".arrow"
+
+
+def convert_questions(pickle_file, arrow_file):
+    """Converts a CronQuestions question pickle into a typed Arrow IPC file.
+
+    `answers` holds the entity IDs of entity answers and `answer_times` the
+    years of time answers; `times` are ints and `annotation` holds the sorted
+    keys and their values as two aligned lists, the layout `datasets.Sequence`
+    stores a dict feature in. The `legacy_*` columns keep the JSON strings and
+    the entity and relation order of the original `cron_questions` rows. The
+    pickle is read with an unpickler that only builds builtin containers, and
+    the file is renamed into place once complete.
+    """
+    with open(pickle_file, "rb") as f:
+        questions = _QuestionUnpickler(f).load()
+    tmp_file = "{}.tmp{}".format(arrow_file, os.getpid())
+    with pa.OSFile(tmp_file, "wb") as sink, pa.ipc.new_file(sink, _QUESTION_SCHEMA) as writer:
+        for start in range(0, len(questions), _BATCH_SIZE):
+            rows = [_typed_question(question) for question in questions[start:start + _BATCH_SIZE]]
+            writer.write_table(pa.Table.from_pylist(rows, schema=_QUESTION_SCHEMA))
+    os.replace(tmp_file, arrow_file)
+
+
+def load_questions(pickle_file):
+    """Memory-maps the typed Arrow copy of a question pickle, converting it on first use.
+
+    A copy written with another schema, e.g. by an older version of this
+    script, is converted again.
+    """
+    arrow_file = questions_arrow_file(pickle_file)
+    if os.path.exists(arrow_file):
+        questions = pa.ipc.open_file(pa.memory_map(arrow_file, "r")).read_all()
+        if questions.schema.equals(_QUESTION_SCHEMA):
+            return questions
+    convert_questions(pickle_file, arrow_file)
+    return pa.ipc.open_file(pa.memory_map(arrow_file, "r")).read_all()
+
+
+# `TemporalKGWriter` and `TemporalKG` mirror `TripleStoreWriter` and
+# `TripleStore` in meta_qa/meta_qa.py (loading scripts cannot import each
+# other), with two year columns added; keep the atomic rename and the lazily
+# read name files of the two in step.
+class TemporalKGWriter:
+    """Interns (head, relation, tail, start, end) facts into entity/relation dictionaries and int32 columns.
+
+    Call `add` for every fact and `close` once to write the store to
+    `store_dir`. The store is written to a temporary directory first and moved
+    into place at the end, so readers never see a half-written store.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.entity_ids = {}
+        self.relation_ids = {}
+        self.heads = array("i")
+        self.relations = array("i")
+        self.tails = array("i")
+        self.starts = array("i")
+        self.ends = array("i")
+
+    def add(self, head, relation, tail, start, end):
+        entity_ids = self.entity_ids
+        self.heads.append(entity_ids.setdefault(head, len(entity_ids)))
+        self.relations.append(self.relation_ids.setdefault(relation, len(self.relation_ids)))
+        self.tails.append(entity_ids.setdefault(tail, len(entity_ids)))
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def close(self):
+        tmp_dir = "{}.tmp{}".format(self.store_dir, os.getpid())
+        os.makedirs(tmp_dir, exist_ok=True)
+        for name in ["heads", "relations", "tails", "starts", "ends"]:
+            np.save(os.path.join(tmp_dir, name + ".npy"), np.frombuffer(getattr(self, name), dtype=np.int32))
+        for name, ids in [("entities", self.entity_ids), ("relation_names", self.relation_ids)]:
+            with open(os.path.join(tmp_dir, name + ".txt"), "w", encoding="utf-8") as f:
+                f.write("\n".join(ids))
+        try:
+            os.rename(tmp_dir, self.store_dir)
+        except OSError:
+            # Another process finished the same store first.
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return TemporalKG(self.store_dir)
+
+
+class TemporalKG:
+    """The CronQuestions temporal KG as memory-mapped int32 columns.
+
+    Fact `i` is `(heads[i], relations[i], tails[i])`, valid from year
+    `starts[i]` to year `ends[i]` inclusive. Entity and relation names are
+    read from the store only when first needed.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        # `open_memmap` rather than `np.load`: `datasets` swaps `np.load` in
+        # loading scripts for a wrapper that cannot memory-map.
+        for name in ["heads", "relations", "tails", "starts", "ends"]:
+            setattr(self, name, np.lib.format.open_memmap(os.path.join(store_dir, name + ".npy"), mode="r"))
+        self._entities = None
+        self._relation_names = None
+        self._entity_ids = None
+        self._relation_ids = None
+
+    def __len__(self):
+        return len(self.heads)
+
+    def _read_names(self, name):
+        with open(os.path.join(self.store_dir, name + ".txt"), encoding="utf-8") as f:
+            return f.read().split("\n")
+
+    @property
+    def entities(self):
+        if self._entities is None:
+            self._entities = self._read_names("entities")
+        return self._entities
+
+    @property
+    def relation_names(self):
+        if self._relation_names is None:
+            self._relation_names = self._read_names("relation_names")
+        return self._relation_names
+
+    @property
+    def entity_ids(self):
+        if self._entity_ids is None:
+            self._entity_ids = {name: idx for idx, name in enumerate(self.entities)}
+        return self._entity_ids
+
+    @property
+    def relation_ids(self):
+        if self._relation_ids is None:
+            self._relation_ids = {name: idx for idx, name in enumerate(self.relation_names)}
+        return self._relation_ids
+
+
+def iter_kg_facts(kg_file):
+    """Yields (head, relation, tail, start, end) from a tab-separated CronQuestions KG file.
+
+    Blank lines are skipped; a line without exactly five fields, or with
+    years that are not integers, raises a ValueError naming the file and line
+    number.
+    """
+    with open(kg_file, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            fields = line.split("\t")
+            if len(fields) != 5:
+                raise ValueError("{}:{}: expected 5 tab-separated fields, got {}".format(
+                    kg_file, line_number, len(fields)))
+            head, relation, tail, start, end = fields
+            try:
+                start, end = int(start), int(end)
+            except ValueError:
+                raise ValueError("{}:{}: expected integer years, got {!r} and {!r}".format(
+                    kg_file, line_number, start, end)) from None
+            yield head, relation, tail, start, end
+
+
+def load_kg_store(kg_file):
+    """Returns the `TemporalKG` of a `kg/full.txt` file, building it next to the file on first use."""
+    store_dir = os.path.splitext(kg_file)[0] + "_store"
+    if os.path.exists(store_dir):
+        return TemporalKG(store_dir)
+    writer = TemporalKGWriter(store_dir)
+    for head, relation, tail, start, end in iter_kg_facts(kg_file):
+        writer.add(head, relation, tail, start, end)
+    return writer.close()
+
+
+def _gather_ranges(starts, ends):
+    """Concatenates `range(start, end)` over all rows; also returns each row's length."""
+    counts = np.maximum(ends - starts, 0)
+    offsets = starts - (np.cumsum(counts) - counts)
+    return np.repeat(offsets, counts) + np.arange(counts.sum()), counts
+
+
+class IntervalIndex:
+    """Finds the facts of a `TemporalKG` valid in a year range, for many queries at once.
+
+    Two orders of the whole KG, by start year and by end year, answer range
+    queries by scanning whichever side of the range admits fewer facts. For
+    entity queries every entity keeps its facts (as head or tail) sorted by
+    start year, so only the facts starting before the range ends are read.
+
+    Results are parallel `(queries, facts)` arrays sorted by query and fact,
+    where `facts` are positions in the store:
+
+        index = IntervalIndex(load_kg_store(kg_file))
+        queries, facts = index.valid_at(entity_ids, years)
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.starts = np.asarray(store.starts, dtype=np.int64)
+        self.ends = np.asarray(store.ends, dtype=np.int64)
+        self.by_start = np.argsort(self.starts, kind="stable")
+        self.sorted_starts = self.starts[self.by_start]
+        self.by_end = np.argsort(self.ends, kind="stable")
+        self.sorted_ends = self.ends[self.by_end]
+
+        heads = np.asarray(store.heads, dtype=np.int64)
+        tails = np.asarray(store.tails, dtype=np.int64)
+        self.num_entities = int(max(heads.max(), tails.max())) + 1 if len(heads) else 0
+        facts = np.arange(len(heads))
+        self_loops = heads == tails
+        nodes = np.concatenate([heads, tails[~self_loops]])
+        facts = np.concatenate([facts, facts[~self_loops]])
+        self.min_start = int(self.starts.min()) if len(self.starts) else 0
+        # Sorting on (entity, start) as one key lets a single searchsorted find
+        # the end of every entity's "started by year T" prefix.
+        self.year_span = int(self.starts.max()) - self.min_start + 2 if len(self.starts) else 1
+        keys = nodes * self.year_span + (self.starts[facts] - self.min_start)
+        order = np.argsort(keys, kind="stable")
+        self.entity_keys = keys[order]
+        self.entity_facts = facts[order]
+        self.indptr = np.zeros(self.num_entities + 1, dtype=np.int64)
+        np.cumsum(np.bincount(nodes, minlength=self.num_entities), out=self.indptr[1:])
+
+    def _sorted_pairs(self, queries, facts):
+        keys = np.unique(queries.astype(np.int64) * max(len(self.starts), 1) + facts)
+        return keys // max(len(self.starts), 1), keys % max(len(self.starts), 1)
+
+    def overlapping(self, begin_years, end_years, entities=None):
+        """Returns the facts valid at some point in `[begin_years[i], end_years[i]]` for every query `i`.
+
+        With `entities`, query `i` only considers facts with `entities[i]` as
+        head or tail; otherwise it ranges over the whole KG.
+        """
+        begin_years = np.asarray(begin_years, dtype=np.int64)
+        end_years = np.asarray(end_years, dtype=np.int64)
+        queries = np.arange(len(begin_years))
+        if entities is not None:
+            entities = np.asarray(entities, dtype=np.int64)
+            known = (entities >= 0) & (entities < self.num_entities)
+            entities = np.where(known, entities, 0)
+            first = np.where(known, self.indptr[entities], 0)
+            last = np.where(known, self.indptr[entities + 1], 0)
+            started = np.searchsorted(
+                self.entity_keys, entities * self.year_span + (end_years - self.min_start), side="right")
+            positions, counts = _gather_ranges(first, np.clip(started, first, last))
+            facts = self.entity_facts[positions]
+            owners = np.repeat(queries, counts)
+            valid = self.ends[facts] >= begin_years[owners]
+            return self._sorted_pairs(owners[valid], facts[valid])
+
+        # Facts started by the end of the range, or facts not ended before its
+        # beginning: scan the smaller set and filter on the other bound.
+        num_started = np.searchsorted(self.sorted_starts, end_years, side="right")
+        first_not_ended = np.searchsorted(self.sorted_ends, begin_years, side="left")
+        by_start = num_started <= len(self.ends) - first_not_ended
+
+        positions, counts = _gather_ranges(np.zeros(by_start.sum(), dtype=np.int64), num_started[by_start])
+        start_facts = self.by_start[positions]
+        start_owners = np.repeat(queries[by_start], counts)
+        keep = self.ends[start_facts] >= begin_years[start_owners]
+
+        positions, counts = _gather_ranges(first_not_ended[~by_start], np.full((~by_start).sum(), len(self.ends)))
+        end_facts = self.by_end[positions]
+        end_owners = np.repeat(queries[~by_start], counts)
+        keep_end = self.starts[end_facts] <= end_years[end_owners]
+
+        return self._sorted_pairs(
+            np.concatenate([start_owners[keep], end_owners[keep_end]]),
+            np.concatenate([start_facts[keep], end_facts[keep_end]])
+        )
+
+    def valid_at(self, entities, years):
+        """Returns the facts about `entities[i]` valid in year `years[i]`, for every query `i`."""
+        return self.overlapping(years, years, entities)
+
+
 class CronQuestionsConfig(datasets.BuilderConfig):
     """BuilderConfig for CronQuestions"""
     def __init__(self,
@@ -47,10 +408,83 @@ class CronQuestions(datasets.GeneratorBasedBuilder):
             description="CronQuestions",
             data_url="https://drive.google.com/u/0/uc?id=1wilPf3qohD-6156Daaz5M6GRuJiRP3P4&export=download",
             data_dir="CronQuestions"
+        ),
+        CronQuestionsConfig(
+            name="cron_questions-typed",
+            description="CronQuestions with typed answers, times and annotation",
+            data_url="https://drive.google.com/u/0/uc?id=1wilPf3qohD-6156Daaz5M6GRuJiRP3P4&export=download",
+            data_dir="CronQuestions"
+        ),
+        CronQuestionsConfig(
+            name="kg",
+            description="CronQuestions temporal KG (wikidata_big/kg/full.txt)",
+            data_url="https://drive.google.com/u/0/uc?id=1wilPf3qohD-6156Daaz5M6GRuJiRP3P4&export=download",
+            data_dir="CronQuestions"
         )
     ]
 
     def _info(self):
+        if self.config.name == "kg":
+            return datasets.DatasetInfo(
+                description=_DESCRIPTION,
+                supervised_keys=None,
+                homepage=_URL,
+                citation=_CITATION,
+                license=_LICENSE,
+                features=datasets.Features(
+                    {
+                        "head": datasets.Value("string"),
+                        "relation": datasets.Value("string"),
+                        "tail": datasets.Value("string"),
+                        "start": datasets.Value("int32"),
+                        "end": datasets.Value("int32"),
+                        "head_id": datasets.Value("int32"),
+                        "relation_id": datasets.Value("int32"),
+                        "tail_id": datasets.Value("int32")
+                    }
+                )
+            )
+        if self.config.name == "cron_questions-typed":
+            return datasets.DatasetInfo(
+                description=_DESCRIPTION,
+                supervised_keys=None,
+                homepage=_URL,
+                citation=_CITATION,
+                license=_LICENSE,
+                features=datasets.Features(
+                    {
+                        "question": datasets.Value("string"),
+                        "answers": datasets.Sequence(
+                            datasets.Value("string")
+                        ),
+                        "answer_times": datasets.Sequence(
+                            datasets.Value("int32")
+                        ),
+                        "answer_type": datasets.Value("string"),
+                        "template": datasets.Value("string"),
+                        "entities": datasets.Sequence(
+                            datasets.Value("string")
+                        ),
+                        "times": datasets.Sequence(
+                            datasets.Value("int32")
+                        ),
+                        "relations": datasets.Sequence(
+                            datasets.Value("string")
+                        ),
+                        "type": datasets.Value("string"),
+                        "annotation": datasets.Sequence(
+                            {
+                                "key": datasets.Value("string"),
+                                "value": datasets.Value("string")
+                            }
+                        ),
+                        "uniq_id": datasets.Value("int64"),
+                        "paraphrases": datasets.Sequence(
+                            datasets.Value("string")
+                        )
+                    }
+                )
+            )
         return datasets.DatasetInfo(
             description=_DESCRIPTION,
             supervised_keys=None,
@@ -82,6 +516,16 @@ class CronQuestions(datasets.GeneratorBasedBuilder):
 
     def _split_generators(self, dl_manager):
         download_dir = dl_manager.download_and_extract(self.config.data_url)
+        if self.config.name == "kg":
+            return [
+                datasets.SplitGenerator(
+                    name=datasets.Split.TRAIN,
+                    gen_kwargs={
+                        "data_file": os.path.join(download_dir, "data", "wikidata_big", "kg", "full.txt"),
+                        "split": "train"
+                    }
+                )
+            ]
         return [
             datasets.SplitGenerator(
                 name=datasets.Split.TRAIN,
@@ -106,11 +550,43 @@ class CronQuestions(datasets.GeneratorBasedBuilder):
             )
         ]
 
+    def _generate_kg(self, kg_file):
+        store = load_kg_store(kg_file)
+        entities, relation_names = store.entities, store.relation_names
+        for start in range(0, len(store), _BATCH_SIZE):
+            stop = start + _BATCH_SIZE
+            columns = zip(
+                store.heads[start:stop].tolist(),
+                store.relations[start:stop].tolist(),
+                store.tails[start:stop].tolist(),
+                store.starts[start:stop].tolist(),
+                store.ends[start:stop].tolist()
+            )
+            for idx, (head, relation, tail, begin, end) in enumerate(columns, start):
+                yield idx, {
+                    "head": entities[head],
+                    "relation": relation_names[relation],
+                    "tail": entities[tail],
+                    "start": begin,
+                    "end": end,
+                    "head_id": head,
+                    "relation_id": relation,
+                    "tail_id": tail
+                }
+
     def _generate_examples(self, data_file, split, **kwargs):
-        with open(data_file, "rb") as f:
-            cronquestions = pickle.load(f)
-            for idx, question in enumerate(cronquestions):
-                question["annotation"] = json.dumps(question["annotation"])
-                question["answers"] = json.dumps(list(question["answers"]))
-                question["times"] = json.dumps(list(question["times"]))
-                yield idx, question
\ No newline at end of file
+        if self.config.name == "kg":
+            yield from self._generate_kg(data_file)
+            return
+        questions = load_questions(data_file)
+        if self.config.name == "cron_questions-typed":
+            questions = questions.drop_columns(list(_LEGACY_COLUMNS))
+        else:
+            questions = questions.drop_columns(
+                ["answers", "answer_times", "times", "annotation", "entities", "relations"])
+            questions = questions.rename_columns([_LEGACY_COLUMNS.get(name, name) for name in questions.column_names])
+        idx = 0
+        for batch in questions.to_batches(_BATCH_SIZE):
+            for question in batch.to_pylist():
+                yield idx, question
+                idx += 1
\ No newline at end of file
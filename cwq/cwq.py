@@ -21,6 +21,8 @@ import json
 import os
 import re
 
+import numpy as np
+
 import datasets
 
 
@@ -61,20 +63,54 @@ _DATA_URLS = {
 }
 
 
+def _row_store_files(dataset_file):
+    base = os.path.splitext(dataset_file)[0]
+    return base + "_rows.jsonl", base + "_offsets.npy"
+
+
+def load_row_store(dataset_file):
+    """Returns `(rows_file, offsets)` for CWQ's `dataset.json`, converting it on first use.
+
+    The conversion parses `dataset.json` once and writes it as JSON Lines
+    next to the download, together with the byte offset of every row, so
+    row `i` is `rows_file[offsets[i]:offsets[i + 1]]`. Every split of every
+    config then reads only the rows it lists.
+    """
+    rows_file, offsets_file = _row_store_files(dataset_file)
+    if not os.path.exists(offsets_file):
+        with open(dataset_file, encoding="utf-8") as f:
+            cwq = json.load(f)
+        offsets = np.zeros(len(cwq) + 1, dtype=np.int64)
+        tmp_suffix = ".tmp{}".format(os.getpid())
+        with open(rows_file + tmp_suffix, "wb") as f:
+            for idx, row in enumerate(cwq):
+                f.write(json.dumps(row, ensure_ascii=False).encode("utf-8") + b"\n")
+                offsets[idx + 1] = f.tell()
+        os.replace(rows_file + tmp_suffix, rows_file)
+        # The offsets file is written last; its presence marks a complete store.
+        with open(offsets_file + tmp_suffix, "wb") as f:
+            np.save(f, offsets)
+        os.replace(offsets_file + tmp_suffix, offsets_file)
+    return rows_file, np.lib.format.open_memmap(offsets_file, mode="r")
+
+
 class CwqConfig(datasets.BuilderConfig):
     """BuilderConfig for CWQ splits."""
 
-    def __init__(self, name, **kwargs):
+    def __init__(self, name, split_file=None, **kwargs):
         """BuilderConfig for CWQ.
         Args:
           name: Unique name of the split.
+          split_file: path or URL of a split file with `trainIdxs`, `devIdxs`
+            and `testIdxs`, e.g. one written by `mcd_split.py`. Required for
+            the `custom` config; defaults to the published split otherwise.
           **kwargs: keyword arguments forwarded to super.
         """
         # Version history:
         super(CwqConfig, self).__init__(
             name=name, description=_DESCRIPTION, **kwargs
         )
-        self.split_file = os.path.join(name + ".json")
+        self.split_file = split_file or _DATA_URLS.get(name)
 
 
 _QUESTION = "question"
@@ -91,6 +127,7 @@ class CWQ(datasets.GeneratorBasedBuilder):
         CwqConfig(name="mcd2"),
         CwqConfig(name="mcd3"),
         CwqConfig(name="random_split"),
+        CwqConfig(name="custom"),
     ]
 
     DEFAULT_CONFIG_NAME = "random_split"
@@ -124,7 +161,16 @@ class CWQ(datasets.GeneratorBasedBuilder):
 
     def _split_generators(self, dl_manager):
         """Returns SplitGenerators."""
-        cwq_files = dl_manager.download_and_extract(_DATA_URLS)
+        if self.config.split_file is None:
+            raise ValueError(
+                "The `custom` config needs a split file: `datasets.load_dataset('cwq', 'custom', split_file=...)`"
+            )
+        cwq_files = dl_manager.download_and_extract(
+            {
+                "dataset": _DATA_URLS["dataset"],
+                "split": self.config.split_file
+            }
+        )
         return [
             datasets.SplitGenerator(
                 name=datasets.Split.TRAIN,
@@ -154,16 +200,11 @@ class CWQ(datasets.GeneratorBasedBuilder):
 
     def _generate_examples(self, data_files, split, split_id, **kwargs):
         """Yields examples."""
-        with open(os.path.join(data_files["dataset"]), encoding="utf-8") as f1:
-            if self.config.name == "random_split":
-                splits = json.load(open(data_files["random_split"], encoding="utf-8"))
-            elif self.config.name == "mcd1":
-                splits = json.load(open(data_files["mcd1"], encoding="utf-8"))
-            elif self.config.name == "mcd2":
-                splits = json.load(open(data_files["mcd2"], encoding="utf-8"))
-            elif self.config.name == "mcd3":
-                splits = json.load(open(data_files["mcd3"], encoding="utf-8"))
-
-            cwq = json.load(f1)
+        with open(data_files["split"], encoding="utf-8") as f:
+            splits = json.load(f)
+
+        rows_file, offsets = load_row_store(data_files["dataset"])
+        with open(rows_file, "rb") as f:
             for idx in splits[split_id]:
-                yield idx, cwq[idx]
\ No newline at end of file
+                f.seek(offsets[idx])
+                yield idx, json.loads(f.read(offsets[idx + 1] - offsets[idx]))
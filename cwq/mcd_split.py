@@ -0,0 +1,314 @@
+# coding=utf-8
+# Lint as: python3
+"""Maximum compound divergence (MCD) split generation over SPARQL queries.
+
+Follows the CFQ recipe (Keysers et al., 2020) that produced CWQ's `mcd1`,
+`mcd2` and `mcd3` splits: atoms are the query form, predicates and single
+triple patterns; compounds are pairs of triple patterns joined on a shared
+term. A greedy search then assigns questions to train or test so that the
+compound distributions diverge as much as possible while the atom
+divergence stays within a tolerance.
+
+Divergences use the Chernoff coefficient, `1 - sum(p ** alpha * q ** (1 - alpha))`,
+with alpha 0.5 for atoms and 0.1 for compounds. The search keeps the
+unnormalised overlap sum per side and updates it from the features of the
+candidate only, scoring a random pool of candidates per step with NumPy, so
+it handles 100k+ questions in minutes.
+
+The output has the layout of CWQ's split files and can be loaded with the
+`custom` config of the `cwq` builder:
+
+    python cwq/mcd_split.py dataset.json my_mcd.json --query-field sparqlPattern
+    datasets.load_dataset("cwq", "custom", split_file="my_mcd.json")
+
+For datasets whose queries still contain entity IRIs (LC-QuAD 2.0, GrailQA,
+...) pass the matching `--query-field`; Wikidata, Freebase and DBpedia entity
+IRIs as well as literals are abstracted the way CWQ's `M0`, `M1`, ...
+placeholders are.
+"""
+
+import argparse
+import json
+import re
+import warnings
+from collections import Counter
+
+import numpy as np
+
+
+ATOM_ALPHA = 0.5
+COMPOUND_ALPHA = 0.1
+
+_PREFIX = re.compile(r"PREFIX\s+\S*\s*<[^>]*>", re.IGNORECASE)
+_TRIPLE_SEPARATOR = re.compile(r"(?:\s+\.)+\s+")
+_VARIABLE = re.compile(r"\?\w+")
+_SUBSELECT = re.compile(r"SELECT[^{]*WHERE\s*\{", re.IGNORECASE)
+_VALUES = re.compile(r"VALUES\s+\?\w+\s*\{[^}]*\}", re.IGNORECASE)
+_ENTITY = re.compile(
+    r"^(M\d+|wd:Q\d+|<http://www\.wikidata\.org/entity/Q\d+>|:?[mg]\.[\w]+|ns:[mg]\.[\w]+"
+    r"|dbr:\S+|res:\S+|<http://dbpedia\.org/resource/[^>]*>)$"
+)
+_LITERAL = re.compile(r"^(\".*\"(\S*)|'.*'(\S*)|-?\d+(\.\d+)?)$")
+
+
+def _normalize_term(term):
+    if _VARIABLE.fullmatch(term):
+        return "?"
+    if _ENTITY.match(term):
+        return "M"
+    if _LITERAL.match(term):
+        return "L"
+    return term
+
+
+def _normalize_pattern(pattern):
+    return " ".join(_normalize_term(term) for term in pattern.split())
+
+
+def extract_atoms_and_compounds(query):
+    """Returns `(atoms, compounds)` of a SPARQL query as lists of strings.
+
+    Variables, entities and literals are abstracted, so two queries that
+    only differ in those share all of their atoms and compounds.
+    """
+    query = _PREFIX.sub("", query).strip()
+    open_brace, close_brace = query.find("{"), query.rfind("}")
+    if open_brace < 0 or close_brace < open_brace:
+        return [" ".join(_VARIABLE.sub("?", query).split())], []
+
+    atoms = ["FORM " + " ".join(_VARIABLE.sub("?", query[:open_brace]).split())]
+    body = query[open_brace + 1:close_brace]
+    # Nested sub-selects and VALUES blocks (GrailQA) become atoms of their own.
+    for block in _SUBSELECT.findall(body) + _VALUES.findall(body):
+        atoms.append(_normalize_pattern(block.rstrip("{ ")))
+    body = _VALUES.sub(" . ", _SUBSELECT.sub(" . ", body)).replace("{", " . ").replace("}", " . ")
+    triples = []
+    for pattern in _TRIPLE_SEPARATOR.split(" " + body + " "):
+        pattern = pattern.strip()
+        if not pattern:
+            continue
+        terms = pattern.split()
+        if terms[0].upper() in ["FILTER", "OPTIONAL", "VALUES", "BIND", "MINUS", "UNION"] or len(terms) < 3:
+            atoms.append(_normalize_pattern(pattern))
+            continue
+        subject, predicate, object = terms[0], terms[1], " ".join(terms[2:])
+        normalized = " ".join([_normalize_term(subject), predicate, _normalize_term(object)])
+        atoms.append(predicate)
+        atoms.append(normalized)
+        triples.append((subject, object, normalized))
+
+    compounds = []
+    for i in range(len(triples)):
+        for j in range(i + 1, len(triples)):
+            for a, b in [(triples[i], triples[j]), (triples[j], triples[i])]:
+                joins = "".join(
+                    role_a + role_b
+                    for role_a, term_a in [("s", a[0]), ("o", a[1])]
+                    for role_b, term_b in [("s", b[0]), ("o", b[1])]
+                    if term_a == term_b
+                )
+                if joins and a[2] <= b[2]:
+                    compounds.append("{} | {} | {}".format(a[2], joins, b[2]))
+                    break
+    return atoms, compounds
+
+
+class _FeatureMatrix:
+    """Sparse question x feature count matrix in CSR form."""
+
+    def __init__(self, rows):
+        vocabulary = {}
+        indptr = [0]
+        indices = []
+        counts = []
+        for row in rows:
+            for feature, count in Counter(row).items():
+                indices.append(vocabulary.setdefault(feature, len(vocabulary)))
+                counts.append(count)
+            indptr.append(len(indices))
+        self.vocabulary = vocabulary
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.counts = np.asarray(counts, dtype=np.float64)
+        lengths = np.diff(self.indptr)
+        self.row_sums = np.bincount(np.repeat(np.arange(len(lengths)), lengths), self.counts, minlength=len(lengths))
+
+    def gather(self, rows):
+        """Returns `(owners, features, counts)` of the nonzeros of `rows`, `owners` indexing into `rows`."""
+        starts, ends = self.indptr[rows], self.indptr[rows + 1]
+        lengths = ends - starts
+        positions = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+        return np.repeat(np.arange(len(rows)), lengths), self.indices[positions], self.counts[positions]
+
+
+class _Divergence:
+    """Running Chernoff overlap between the train (side 0) and test (side 1) distributions."""
+
+    def __init__(self, matrix, alpha):
+        self.matrix = matrix
+        self.alpha = alpha
+        self.counts = np.zeros((2, len(matrix.vocabulary)))
+        self.totals = np.zeros(2)
+        self.overlap = 0.0
+
+    def _terms(self, train_counts, test_counts):
+        return train_counts ** self.alpha * test_counts ** (1 - self.alpha)
+
+    def divergence(self):
+        if not self.totals.all():
+            return 0.0
+        return 1.0 - self.overlap / self._terms(self.totals[0], self.totals[1])
+
+    def candidate_divergences(self, candidates, side):
+        """Returns the divergence after adding each of `candidates` to `side`, plus the overlap deltas."""
+        owners, features, counts = self.matrix.gather(candidates)
+        old = self._terms(self.counts[0, features], self.counts[1, features])
+        new_counts = self.counts[:, features].copy()
+        new_counts[side] += counts
+        deltas = np.bincount(owners, self._terms(new_counts[0], new_counts[1]) - old, minlength=len(candidates))
+        totals = np.repeat(self.totals[None, :], len(candidates), axis=0)
+        totals[:, side] += self.matrix.row_sums[candidates]
+        normalizer = self._terms(totals[:, 0], totals[:, 1])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            divergences = np.where(normalizer > 0, 1.0 - (self.overlap + deltas) / normalizer, 0.0)
+        return divergences, deltas
+
+    def add(self, row, side, delta=None):
+        if delta is None:
+            _, delta = self.candidate_divergences(np.asarray([row]), side)
+            delta = delta[0]
+        start, end = self.matrix.indptr[row], self.matrix.indptr[row + 1]
+        self.counts[side, self.matrix.indices[start:end]] += self.matrix.counts[start:end]
+        self.totals[side] += self.matrix.row_sums[row]
+        self.overlap += delta
+
+
+def divergences(queries, train_ids, test_ids):
+    """Returns `(atom_divergence, compound_divergence)` of an existing split, e.g. CWQ's `mcd1`."""
+    features = [extract_atoms_and_compounds(query) for query in queries]
+    result = []
+    for matrix, alpha in [(_FeatureMatrix(f[0] for f in features), ATOM_ALPHA),
+                          (_FeatureMatrix(f[1] for f in features), COMPOUND_ALPHA)]:
+        divergence = _Divergence(matrix, alpha)
+        for side, ids in enumerate([train_ids, test_ids]):
+            owners, indices, counts = matrix.gather(np.asarray(ids, dtype=np.int64))
+            np.add.at(divergence.counts[side], indices, counts)
+            divergence.totals[side] = divergence.counts[side].sum()
+        divergence.overlap = divergence._terms(divergence.counts[0], divergence.counts[1]).sum()
+        result.append(divergence.divergence())
+    return tuple(result)
+
+
+def generate_mcd_split(queries, train_fraction=0.8, dev_fraction=0.1, max_atom_divergence=0.02,
+                       candidates_per_step=256, seed=0):
+    """Greedily builds a maximum compound divergence split.
+
+    Train and the held-out side (dev and test together) are filled at the
+    same rate. Each step adds to the side due next the candidate with the
+    highest compound divergence among those that keep the atom divergence
+    within `max_atom_divergence`. A warning is issued if the finished split
+    still exceeds it, which happens when the candidate pools are too small
+    to steer the atom distributions back after an unlucky step.
+
+    Args:
+      queries: one SPARQL query (or query pattern) per question.
+      train_fraction: share of the questions assigned to train.
+      dev_fraction: share of all questions that go to dev. Dev is sampled from
+        the held-out side and the rest of it becomes test, as for CWQ's MCD splits.
+      max_atom_divergence: largest atom divergence allowed between train and
+        the held-out side.
+      candidates_per_step: size of the random candidate pool scored per step.
+      seed: random seed.
+    Returns:
+      A dict with `trainIdxs`, `devIdxs` and `testIdxs`, like CWQ's split files.
+    """
+    rng = np.random.default_rng(seed)
+    features = [extract_atoms_and_compounds(query) for query in queries]
+    atoms = _Divergence(_FeatureMatrix(f[0] for f in features), ATOM_ALPHA)
+    compounds = _Divergence(_FeatureMatrix(f[1] for f in features), COMPOUND_ALPHA)
+
+    num_questions = len(queries)
+    capacity = [int(round(num_questions * train_fraction)), 0]
+    capacity[1] = num_questions - capacity[0]
+    remaining = rng.permutation(num_questions)
+    num_remaining = num_questions
+    assigned = [[], []]
+
+    def assign(position, side, deltas):
+        nonlocal num_remaining
+        row = remaining[position]
+        atoms.add(row, side, deltas[0])
+        compounds.add(row, side, deltas[1])
+        assigned[side].append(int(row))
+        num_remaining -= 1
+        remaining[position] = remaining[num_remaining]
+
+    # Seed both sides so the divergences are defined from the first step on.
+    for side in [0, 1]:
+        if capacity[side] and num_remaining:
+            assign(num_remaining - 1, side, (None, None))
+
+    while num_remaining:
+        positions = rng.integers(0, num_remaining, size=min(candidates_per_step, num_remaining))
+        candidates = remaining[positions]
+        # Both sides fill at the same rate, so neither is left to absorb the
+        # last questions unscored once the other is full.
+        if len(assigned[0]) >= capacity[0] or len(assigned[1]) >= capacity[1]:
+            side = int(len(assigned[0]) >= capacity[0])
+        else:
+            side = int(len(assigned[1]) * capacity[0] < len(assigned[0]) * capacity[1])
+        atom_divergences, atom_deltas = atoms.candidate_divergences(candidates, side)
+        compound_divergences, compound_deltas = compounds.candidate_divergences(candidates, side)
+        # Candidates that would leave the atom divergence above the tolerance
+        # are rejected; when every candidate does, the one that brings it
+        # closest to the tolerance is taken instead.
+        excess = np.maximum(atom_divergences - max_atom_divergence, 0.0)
+        if excess.all():
+            i = int(np.argmin(excess))
+        else:
+            i = int(np.argmax(np.where(excess > 0, -np.inf, compound_divergences)))
+        assign(positions[i], side, (atom_deltas[i], compound_deltas[i]))
+
+    if atoms.divergence() > max_atom_divergence:
+        warnings.warn("atom divergence {:.4f} of the split exceeds max_atom_divergence {}; try a larger "
+                      "candidates_per_step".format(atoms.divergence(), max_atom_divergence))
+
+    held_out = rng.permutation(assigned[1])
+    num_dev = int(round(len(held_out) * dev_fraction / (1 - train_fraction))) if train_fraction < 1 else 0
+    return {
+        "trainIdxs": sorted(assigned[0]),
+        "devIdxs": sorted(int(idx) for idx in held_out[:num_dev]),
+        "testIdxs": sorted(int(idx) for idx in held_out[num_dev:])
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("dataset", help="JSON list of questions, e.g. CWQ's dataset.json")
+    parser.add_argument("output", help="where to write the split file")
+    parser.add_argument("--query-field", default="sparqlPattern")
+    parser.add_argument("--train-fraction", type=float, default=0.8)
+    parser.add_argument("--dev-fraction", type=float, default=0.1)
+    parser.add_argument("--max-atom-divergence", type=float, default=0.02)
+    parser.add_argument("--candidates-per-step", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with open(args.dataset, encoding="utf-8") as f:
+        queries = [question[args.query_field] for question in json.load(f)]
+    split = generate_mcd_split(
+        queries,
+        train_fraction=args.train_fraction,
+        dev_fraction=args.dev_fraction,
+        max_atom_divergence=args.max_atom_divergence,
+        candidates_per_step=args.candidates_per_step,
+        seed=args.seed
+    )
+    atom_divergence, compound_divergence = divergences(queries, split["trainIdxs"], split["testIdxs"])
+    print("atom divergence {:.4f}, compound divergence {:.4f}".format(atom_divergence, compound_divergence))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(split, f)
+
+
+if __name__ == "__main__":
+    main()
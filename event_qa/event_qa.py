@@ -1,8 +1,11 @@
 """Event-QA"""
 
+import hashlib
 import json
 import os
+import shutil
 
+import numpy as np
 import datasets
 
 logger = datasets.logging.get_logger(__name__)
@@ -28,6 +31,182 @@ _DATA_URLS = {
     "events": "https://eventcqa.l3s.uni-hannover.de/dataset/events.txt"
 }
 
+_VOCABULARY_CONFIGS = ["predicates", "entities", "events"]
+
+_CONFIG_RESOURCES = {
+    "eventkg": ["eventkg"],
+    "dbpedia": ["dbpedia"],
+    "eventkg-dbpedia": ["eventkg", "dbpedia"],
+    "predicates": ["predicates"],
+    "entities": ["entities"],
+    "events": ["events"]
+}
+
+
+def _load_questions(data_file):
+    """Reads an Event-QA question file into rows of the `eventkg`/`dbpedia` features.
+
+    `answerType` and `onlyDbo` are renamed to the feature names, the id becomes
+    a string and `question` and `answers` are JSON-encoded.
+    """
+    with open(data_file, encoding="utf8") as f:
+        questions = json.load(f)["questions"]
+    for question in questions:
+        if question.get("answerType"):
+            question["answertype"] = question.pop("answerType")
+        if question.get("onlyDbo"):
+            question["onlydbo"] = question.pop("onlyDbo")
+        question["question"] = json.dumps(question["question"])
+        question["id"] = str(question["id"])
+        question["answers"] = json.dumps(question["answers"])
+    return questions
+
+
+def join_questions(eventkg_questions, dbpedia_questions):
+    """Aligns the EventKG and DBpedia versions of the Event-QA questions by `id`.
+
+    Question metadata comes from the EventKG version when both exist. Ids
+    found in only one file keep `None` for the other KG's query and answers;
+    they follow the EventKG order, with DBpedia-only ids at the end.
+    """
+    dbpedia_by_id = {question["id"]: question for question in dbpedia_questions}
+    eventkg_ids = set()
+    rows = []
+    for eventkg in eventkg_questions:
+        eventkg_ids.add(eventkg["id"])
+        rows.append((eventkg, dbpedia_by_id.get(eventkg["id"])))
+    rows.extend((None, dbpedia) for dbpedia in dbpedia_questions if dbpedia["id"] not in eventkg_ids)
+    for eventkg, dbpedia in rows:
+        question = eventkg or dbpedia
+        yield {
+            "id": question["id"],
+            "question": question["question"],
+            "hybrid": question.get("hybrid"),
+            "onlydbo": question.get("onlydbo"),
+            "answertype": question.get("answertype"),
+            "aggregation": question.get("aggregation"),
+            "eventkg_query": eventkg["query"] if eventkg else None,
+            "dbpedia_query": dbpedia["query"] if dbpedia else None,
+            "eventkg_answers": eventkg["answers"] if eventkg else None,
+            "dbpedia_answers": dbpedia["answers"] if dbpedia else None
+        }
+
+
+def _hash_uris(uris):
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(uri.encode("utf-8"), digest_size=8).digest(), "little") for uri in uris),
+        dtype=np.uint64,
+        count=len(uris)
+    )
+
+
+class Vocabulary:
+    """Sorted, deduplicated URI vocabulary of an Event-QA list file, with integer IDs.
+
+    ID `i` is the `i`-th URI in sorted order. The URIs are stored as one UTF-8
+    blob with offsets, and a table of 64-bit URI hashes sorted alongside their
+    IDs serves lookups; every array is a memory-mapped `.npy` file. `ids`
+    resolves a batch of URIs with one `searchsorted` over the hashes and
+    compares the hits byte for byte with the stored URIs, so lookups are
+    exact:
+
+        entities = load_vocabulary(entities_file)
+        ids = entities.ids(uris)       # -1 where a URI is not in the list
+        known = entities.contains(uris)
+    """
+
+    def __init__(self, vocab_dir):
+        self.vocab_dir = vocab_dir
+        # `datasets` patches `np.load` in loading scripts so it can no longer
+        # memory-map; `open_memmap` is not affected.
+        for name in ["hashes", "hash_ids", "offsets", "blob"]:
+            setattr(self, name, np.lib.format.open_memmap(os.path.join(vocab_dir, name + ".npy"), mode="r"))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @classmethod
+    def build(cls, names, vocab_dir):
+        """Writes the vocabulary of `names` to `vocab_dir` and opens it."""
+        names = sorted(set(names))
+        encoded = [name.encode("utf-8") for name in names]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(name) for name in encoded], out=offsets[1:])
+        hashes = _hash_uris(names)
+        order = np.lexsort((np.arange(len(names)), hashes))
+        tmp_dir = "{}.tmp{}".format(vocab_dir, os.getpid())
+        os.makedirs(tmp_dir, exist_ok=True)
+        np.save(os.path.join(tmp_dir, "hashes.npy"), hashes[order])
+        np.save(os.path.join(tmp_dir, "hash_ids.npy"), order.astype(np.int32))
+        np.save(os.path.join(tmp_dir, "offsets.npy"), offsets)
+        np.save(os.path.join(tmp_dir, "blob.npy"), np.frombuffer(b"".join(encoded), dtype=np.uint8))
+        try:
+            os.rename(tmp_dir, vocab_dir)
+        except OSError:
+            # Someone else finished this vocabulary first.
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return cls(vocab_dir)
+
+    def _encoded(self, idx):
+        return self.blob[self.offsets[idx]:self.offsets[idx + 1]].tobytes()
+
+    def name(self, idx):
+        return self._encoded(idx).decode("utf-8")
+
+    def names(self, ids):
+        return [self.name(idx) for idx in ids]
+
+    def _matches(self, ids, encoded):
+        """Compares the stored URIs of `ids` with the UTF-8 `encoded` URIs, all at once."""
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+        starts = self.offsets[ids]
+        same_length = self.offsets[ids + 1] - starts == lengths
+        counts = np.where(same_length, lengths, 0)
+        query = np.frombuffer(b"".join(encoded), dtype=np.uint8)[np.repeat(same_length, lengths)]
+        query_starts = np.cumsum(counts) - counts
+        stored = self.blob[np.repeat(starts - query_starts, counts) + np.arange(counts.sum())]
+        mismatches = np.bincount(np.repeat(np.arange(len(ids)), counts)[stored != query], minlength=len(ids))
+        return same_length & (mismatches == 0)
+
+    def ids(self, uris):
+        """Maps a batch of URIs to their IDs, -1 for URIs not in the vocabulary."""
+        if not len(self.hashes):
+            return np.full(len(uris), -1, dtype=np.int64)
+        hashes = _hash_uris(uris)
+        positions = np.minimum(np.searchsorted(self.hashes, hashes), len(self.hashes) - 1)
+        ids = np.where(self.hashes[positions] == hashes, self.hash_ids[positions], -1).astype(np.int64)
+        hits = np.flatnonzero(ids >= 0)
+        encoded = [uris[i].encode("utf-8") for i in hits]
+        for k in np.flatnonzero(~self._matches(ids[hits], encoded)):
+            i = hits[k]
+            ids[i] = -1
+            # A 64-bit hash collision inside the vocabulary: walk the rest of
+            # the run of equal hashes.
+            position = positions[i] + 1
+            while position < len(self.hashes) and self.hashes[position] == hashes[i]:
+                if self._encoded(self.hash_ids[position]) == encoded[k]:
+                    ids[i] = self.hash_ids[position]
+                    break
+                position += 1
+        return ids
+
+    def contains(self, uris):
+        return self.ids(uris) >= 0
+
+
+def _read_names(list_file):
+    with open(list_file, encoding="utf-8") as f:
+        return [name for name in (line.strip() for line in f) if name]
+
+
+def load_vocabulary(list_file):
+    """Opens the `Vocabulary` of an Event-QA list file, building it next to the file on first use."""
+    vocab_dir = os.path.splitext(list_file)[0] + "_vocab"
+    if os.path.exists(vocab_dir):
+        return Vocabulary(vocab_dir)
+    return Vocabulary.build(_read_names(list_file), vocab_dir)
+
+
 class EventQAConfig(datasets.BuilderConfig):
     """BuilderConfig for Event-QA"""
     def __init__(self,
@@ -57,6 +236,12 @@ class EventQA(datasets.GeneratorBasedBuilder):
             data_dir="EventQA",
             data_url="https://eventcqa.l3s.uni-hannover.de/dataset/data.tgz"
         ),
+        EventQAConfig(
+            name="eventkg-dbpedia",
+            description="Event-QA with the EventKG and DBpedia queries and answers side by side",
+            data_dir="EventQA",
+            data_url="https://eventcqa.l3s.uni-hannover.de/dataset/data.tgz"
+        ),
         EventQAConfig(
             name="predicates",
             description="Event-QA's predicates",
@@ -79,7 +264,7 @@ class EventQA(datasets.GeneratorBasedBuilder):
 
     def _info(self):
 
-        if self.config.name in ["predicates", "entities", "events"]:
+        if self.config.name in _VOCABULARY_CONFIGS:
             return datasets.DatasetInfo(
                 description=_DESCRIPTION,
                 supervised_keys=None,
@@ -87,7 +272,38 @@ class EventQA(datasets.GeneratorBasedBuilder):
                 citation=_CITATION,
                 features=datasets.Features(
                     {
-                        "name": datasets.Value("string")
+                        "name": datasets.Value("string"),
+                        "id": datasets.Value("int32")
+                    }
+                )
+            )
+
+        if self.config.name == "eventkg-dbpedia":
+            return datasets.DatasetInfo(
+                description=_DESCRIPTION,
+                supervised_keys=None,
+                homepage=_URL,
+                citation=_CITATION,
+                features=datasets.Features(
+                    {
+                        "id": datasets.Value("string"),
+                        "question": datasets.Value("string"),
+                        "hybrid": datasets.Value("string"),
+                        "onlydbo": datasets.Value("string"),
+                        "answertype": datasets.Value("string"),
+                        "aggregation": datasets.Value("string"),
+                        "eventkg_query": datasets.Features(
+                            {
+                                "sparql": datasets.Value("string")
+                            }
+                        ),
+                        "dbpedia_query": datasets.Features(
+                            {
+                                "sparql": datasets.Value("string")
+                            }
+                        ),
+                        "eventkg_answers": datasets.Value("string"),
+                        "dbpedia_answers": datasets.Value("string")
                     }
                 )
             )
@@ -119,14 +335,19 @@ class EventQA(datasets.GeneratorBasedBuilder):
     def _split_generators(self, dl_manager):
         data_dir = None
         eventqa_files = dl_manager.download_and_extract(
-            {
-                "eventkg": _DATA_URLS["eventkg"],
-                "dbpedia": _DATA_URLS["dbpedia"],
-                "entities": _DATA_URLS["entities"],
-                "predicates": _DATA_URLS["predicates"],
-                "events": _DATA_URLS["events"]
-            }
+            {resource: _DATA_URLS[resource] for resource in _CONFIG_RESOURCES[self.config.name]}
         )
+        if self.config.name == "eventkg-dbpedia":
+            return [
+                datasets.SplitGenerator(
+                    name=datasets.Split.TRAIN,
+                    gen_kwargs={
+                        "data_file": os.path.join(data_dir or "", eventqa_files["eventkg"]),
+                        "dbpedia_file": os.path.join(data_dir or "", eventqa_files["dbpedia"]),
+                        "split": "train"
+                    }
+                )
+            ]
         return [
             datasets.SplitGenerator(
                 name=datasets.Split.TRAIN,
@@ -138,19 +359,18 @@ class EventQA(datasets.GeneratorBasedBuilder):
         ]
 
     def _generate_examples(self, data_file, **kwargs):
-        if self.config.name in ["predicates", "entities", "events"]:
-            lines = open(data_file, encoding="utf-8").readlines()
-            for idx, line in enumerate(lines):
-                yield idx, {"name": line.strip()}
-        else:
-            all_data = json.load(open(data_file, encoding="utf8"))
-            questions = all_data["questions"]
+        if self.config.name in _VOCABULARY_CONFIGS:
+            # One row per line of the list file, as before the vocabulary
+            # existed; blank lines get the id -1.
+            with open(data_file, encoding="utf-8") as f:
+                names = [line.strip() for line in f]
+            ids = load_vocabulary(data_file).ids(names).tolist()
+            for idx, (name, vocabulary_id) in enumerate(zip(names, ids)):
+                yield idx, {"name": name, "id": vocabulary_id}
+        elif self.config.name == "eventkg-dbpedia":
+            questions = join_questions(_load_questions(data_file), _load_questions(kwargs["dbpedia_file"]))
             for idx, question in enumerate(questions):
-                if question.get("answerType"):
-                    question["answertype"] = question.pop("answerType")
-                if question.get("onlyDbo"):
-                    question["onlydbo"] = question.pop("onlyDbo")
-                question["question"] = json.dumps(question["question"])
-                question["id"] = str(question["id"])
-                question["answers"] = json.dumps(question["answers"])
+                yield idx, question
+        else:
+            for idx, question in enumerate(_load_questions(data_file)):
                 yield idx, question
\ No newline at end of file
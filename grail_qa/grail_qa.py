@@ -1,7 +1,14 @@
 """GrailQA: The Strongly Generalizable Question Answering Dataset."""
 
+import hashlib
 import json
 import os
+import re
+import sys
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
 
 import datasets
 
@@ -23,6 +30,530 @@ _DESCRIPTION = """\
 
 _URL = "https://dki-lab.github.io/GrailQA/"
 
+_READ_SIZE = 1024 * 1024
+_WHITESPACE = re.compile(r"\s*")
+
+
+def iter_json_array(f, read_size=_READ_SIZE):
+    """Yields the items of the top-level JSON array in the text file `f`, one at a time.
+
+    Only the item being decoded and the current read buffer are held in
+    memory. Reads grow geometrically while an item does not fit the buffer.
+    Items must be separated by exactly one comma; anything else, such as
+    `[1,,2]`, `[,1]` or `[1 2]`, raises a ValueError.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+    # What the next non-whitespace character must be: the opening "[", the
+    # first item or "]", an item after a comma, or the "," / "]" after an item.
+    expected = "array"
+    while True:
+        pos = _WHITESPACE.match(buffer, pos).end()
+        if pos < len(buffer):
+            char = buffer[pos]
+            if expected == "array":
+                if char != "[":
+                    raise ValueError("Expected a JSON array, found {!r}".format(char))
+                expected = "first item"
+                pos += 1
+                continue
+            if expected == "separator":
+                if char == "]":
+                    return
+                if char != ",":
+                    raise ValueError("Expected ',' or ']' after an array item, found {!r}".format(char))
+                expected = "item"
+                pos += 1
+                continue
+            if char == "]" and expected == "first item":
+                return
+            if char in ",]":
+                raise ValueError("Expected an array item, found {!r}".format(char))
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                end = None
+            # A value ending exactly at the buffer end may be cut short (e.g. a number).
+            if end is not None and (end < len(buffer) or eof):
+                yield item
+                pos = end
+                expected = "separator"
+                continue
+        elif eof:
+            raise ValueError("Unterminated JSON array")
+        chunk = f.read(max(read_size, 2 * (len(buffer) - pos)))
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+
+_SEXPR_TOKEN = re.compile(r"[()]|[^\s()]+")
+_FREEBASE_ENTITY = re.compile(r"^[mg]\.[\w]+$")
+_COMPARISONS = {"lt": "<", "le": "<=", "gt": ">", "ge": ">="}
+_SPARQL_PREFIX = "PREFIX : <http://rdf.freebase.com/ns/>"
+
+
+def parse_s_expression(s_expression):
+    """Parses a GrailQA S-expression into nested tuples of interned strings.
+
+    `(AND music.release (JOIN music.release.region m.03_2r3))` becomes
+    `("AND", "music.release", ("JOIN", "music.release.region", "m.03_2r3"))`.
+    """
+    stack = [[]]
+    for token in _SEXPR_TOKEN.findall(s_expression):
+        if token == "(":
+            stack.append([])
+        elif token == ")":
+            if len(stack) == 1:
+                raise ValueError("Unbalanced ')' in S-expression: {}".format(s_expression))
+            node = tuple(stack.pop())
+            stack[-1].append(node)
+        else:
+            stack[-1].append(sys.intern(token))
+    if len(stack) != 1 or len(stack[0]) != 1:
+        raise ValueError("Malformed S-expression: {}".format(s_expression))
+    return stack[0][0]
+
+
+def _sparql_term(atom):
+    if "^^" in atom:
+        value, datatype = atom.split("^^", 1)
+        return '"{}"^^<{}>'.format(value.strip('"'), datatype)
+    if _FREEBASE_ENTITY.match(atom):
+        return ":" + atom
+    return atom
+
+
+def _check_arity(node, num_arguments):
+    if len(node) != num_arguments + 1:
+        raise ValueError("S-expression function {!r} takes {} argument(s), got {}".format(
+            node[0], num_arguments, len(node) - 1))
+
+
+class _SparqlCompiler:
+
+    def __init__(self):
+        self.num_variables = 0
+        self.patterns = []
+
+    def variable(self):
+        self.num_variables += 1
+        return "?x{}".format(self.num_variables)
+
+    def edge(self, subject, relation, object):
+        if isinstance(relation, tuple) and relation[0] == "R":
+            _check_arity(relation, 1)
+            subject, object, relation = object, subject, relation[1]
+        if isinstance(relation, tuple) and relation[0] == "JOIN":
+            _check_arity(relation, 2)
+            middle = self.variable()
+            self.edge(subject, relation[1], middle)
+            self.edge(middle, relation[2], object)
+            return
+        if isinstance(relation, tuple):
+            raise ValueError("Unsupported S-expression relation {!r}".format(relation[0] if relation else relation))
+        self.patterns.append("{} :{} {} .".format(subject, relation, object))
+
+    def constrain(self, node, variable):
+        """Adds the patterns restricting `variable` to the denotation of `node`."""
+        if not isinstance(node, tuple):
+            if _FREEBASE_ENTITY.match(node) or "^^" in node:
+                self.patterns.append("VALUES {} {{ {} }}".format(variable, _sparql_term(node)))
+            else:
+                self.patterns.append("{} :type.object.type :{} .".format(variable, node))
+        elif not node:
+            raise ValueError("Empty S-expression")
+        elif node[0] == "AND":
+            if len(node) < 2:
+                raise ValueError("S-expression function 'AND' takes at least one argument")
+            for argument in node[1:]:
+                self.constrain(argument, variable)
+        elif node[0] == "JOIN":
+            _check_arity(node, 2)
+            relation, argument = node[1], node[2]
+            if not isinstance(argument, tuple) and (_FREEBASE_ENTITY.match(argument) or "^^" in argument):
+                self.edge(variable, relation, _sparql_term(argument))
+            else:
+                value = self.variable()
+                self.edge(variable, relation, value)
+                self.constrain(argument, value)
+        elif node[0] in _COMPARISONS:
+            _check_arity(node, 2)
+            value = self.variable()
+            self.edge(variable, node[1], value)
+            self.patterns.append("FILTER ({} {} {})".format(value, _COMPARISONS[node[0]], _sparql_term(node[2])))
+        else:
+            raise ValueError("Unsupported S-expression function {!r}".format(node[0]))
+
+
+def s_expression_to_sparql(tree):
+    """Compiles a tree from `parse_s_expression` into a SPARQL query over Freebase.
+
+    Raises a ValueError for functions it does not support and for functions
+    called with the wrong number of arguments.
+    """
+    compiler = _SparqlCompiler()
+    function = tree[0] if isinstance(tree, tuple) and tree else None
+    if function == "COUNT":
+        _check_arity(tree, 1)
+        compiler.constrain(tree[1], "?x")
+        select, modifiers = "SELECT (COUNT(DISTINCT ?x) AS ?count)", ""
+    elif function in ["ARGMAX", "ARGMIN"]:
+        _check_arity(tree, 2)
+        compiler.constrain(tree[1], "?x")
+        compiler.edge("?x", tree[2], "?value")
+        order = "DESC(?value)" if function == "ARGMAX" else "?value"
+        select, modifiers = "SELECT DISTINCT ?x", " ORDER BY {} LIMIT 1".format(order)
+    else:
+        compiler.constrain(tree, "?x")
+        select, modifiers = "SELECT DISTINCT ?x", ""
+    return "{}\n{} WHERE {{\n{}\n}}{}".format(_SPARQL_PREFIX, select, "\n".join(compiler.patterns), modifiers)
+
+
+def _tree_from_json(node):
+    return tuple(_tree_from_json(child) for child in node) if isinstance(node, list) else sys.intern(node)
+
+
+class LogicalFormCache:
+    """Memoizes parsed and compiled S-expressions, keyed by a hash of the S-expression text.
+
+    Building GrailQA writes the cache next to the Arrow files, so evaluation
+    code can open it with `LogicalFormCache.for_dataset(dataset)` and skip
+    re-parsing and re-compiling logical forms it has seen before.
+    """
+
+    FILE_NAME = "s_expression_cache.json"
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.path = os.path.join(cache_dir, self.FILE_NAME)
+        self._entries = {}
+        self._trees = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                self._entries = json.load(f)
+
+    @classmethod
+    def for_dataset(cls, dataset):
+        return cls(os.path.dirname(dataset.cache_files[0]["filename"]))
+
+    @staticmethod
+    def key(s_expression):
+        return hashlib.sha1(s_expression.encode("utf-8")).hexdigest()
+
+    def _entry(self, s_expression):
+        key = self.key(s_expression)
+        entry = self._entries.get(key)
+        if entry is None:
+            tree = parse_s_expression(s_expression)
+            entry = self._entries[key] = {"tree": tree, "sparql": s_expression_to_sparql(tree)}
+            self._trees[key] = tree
+        return key, entry
+
+    def parse(self, s_expression):
+        key, entry = self._entry(s_expression)
+        if key not in self._trees:
+            self._trees[key] = _tree_from_json(entry["tree"])
+        return self._trees[key]
+
+    def sparql(self, s_expression):
+        return self._entry(s_expression)[1]["sparql"]
+
+    def save(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = "{}.tmp{}".format(self.path, os.getpid())
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self.path)
+
+
+# `_NODE_INT_FIELDS` through `GraphQueryColumns` are shared verbatim with
+# graph_questions/graph_questions.py (loading scripts cannot import each
+# other); keep the two copies in sync.
+_NODE_INT_FIELDS = ["nid", "question_node"]
+_NODE_STRING_FIELDS = ["node_type", "id", "class", "friendly_name", "function"]
+_EDGE_INT_FIELDS = ["start", "end"]
+_EDGE_STRING_FIELDS = ["relation", "friendly_name"]
+
+
+def _list_offsets(list_array):
+    offsets = list_array.offsets.to_numpy(zero_copy_only=False).astype(np.int64)
+    return offsets - offsets[0]
+
+
+def _flatten_records(array, fields):
+    """Returns per-row offsets and the flattened `fields` of a `Sequence` of dicts.
+
+    `datasets.Sequence` stores a dict feature as a struct of lists, while
+    `datasets.List` stores a list of structs; both layouts are accepted.
+    """
+    if pa.types.is_struct(array.type):
+        lists = {field: array.field(field).fill_null([]) for field in fields}
+        return _list_offsets(lists[fields[0]]), {field: values.flatten() for field, values in lists.items()}
+    array = array.fill_null([])
+    values = array.flatten()
+    return _list_offsets(array), {field: values.field(field) for field in fields}
+
+
+def _encode_column(values):
+    """Returns int32 codes (-1 for null) and the vocabulary of a string column."""
+    encoded = pc.dictionary_encode(values)
+    codes = encoded.indices.fill_null(-1).to_numpy(zero_copy_only=False).astype(np.int32)
+    return codes, encoded.dictionary.to_pylist()
+
+
+class GraphQueryColumns:
+    """Flattened `graph_query` encoding: node and edge tables plus per-graph offsets.
+
+    The nodes of graph `i` are rows `node_offsets[i]:node_offsets[i + 1]` of the
+    arrays in `nodes`, and likewise for `edges`. Integer fields are kept as is;
+    string fields are int32 codes into `vocabularies[field]` (edge fields are
+    keyed `edge.<field>`), with -1 for null. Edge `start`/`end` are node `nid`s,
+    which are the node's position within its graph.
+    """
+
+    def __init__(self, node_offsets, edge_offsets, nodes, edges, vocabularies):
+        self.node_offsets = node_offsets
+        self.edge_offsets = edge_offsets
+        self.nodes = nodes
+        self.edges = edges
+        self.vocabularies = vocabularies
+
+    def __len__(self):
+        return len(self.node_offsets) - 1
+
+    @classmethod
+    def from_dataset(cls, dataset):
+        """Converts the `graph_query` column of a loaded split with Arrow compute kernels, without per-row Python."""
+        column = dataset.with_format("arrow")[:].column("graph_query").combine_chunks()
+        node_offsets, node_values = _flatten_records(column.field("nodes"), _NODE_INT_FIELDS + _NODE_STRING_FIELDS)
+        edge_offsets, edge_values = _flatten_records(column.field("edges"), _EDGE_INT_FIELDS + _EDGE_STRING_FIELDS)
+        nodes, edges, vocabularies = {}, {}, {}
+        for field in _NODE_INT_FIELDS:
+            nodes[field] = node_values[field].fill_null(-1).to_numpy(zero_copy_only=False).astype(np.int32)
+        for field in _NODE_STRING_FIELDS:
+            nodes[field], vocabularies[field] = _encode_column(node_values[field])
+        for field in _EDGE_INT_FIELDS:
+            edges[field] = edge_values[field].fill_null(-1).to_numpy(zero_copy_only=False).astype(np.int32)
+        for field in _EDGE_STRING_FIELDS:
+            edges[field], vocabularies["edge." + field] = _encode_column(edge_values[field])
+        return cls(node_offsets, edge_offsets, nodes, edges, vocabularies)
+
+    def save(self, out_dir):
+        os.makedirs(out_dir, exist_ok=True)
+        np.save(os.path.join(out_dir, "node_offsets.npy"), self.node_offsets)
+        np.save(os.path.join(out_dir, "edge_offsets.npy"), self.edge_offsets)
+        for prefix, table in [("node.", self.nodes), ("edge.", self.edges)]:
+            for field, values in table.items():
+                np.save(os.path.join(out_dir, prefix + field + ".npy"), values)
+        with open(os.path.join(out_dir, "vocabularies.json"), "w", encoding="utf-8") as f:
+            json.dump(self.vocabularies, f)
+
+    @classmethod
+    def load(cls, out_dir, mmap_mode="r"):
+        def column(name):
+            return np.lib.format.open_memmap(os.path.join(out_dir, name + ".npy"), mode=mmap_mode)
+
+        with open(os.path.join(out_dir, "vocabularies.json"), encoding="utf-8") as f:
+            vocabularies = json.load(f)
+        return cls(
+            column("node_offsets"),
+            column("edge_offsets"),
+            {field: column("node." + field) for field in _NODE_INT_FIELDS + _NODE_STRING_FIELDS},
+            {field: column("edge." + field) for field in _EDGE_INT_FIELDS + _EDGE_STRING_FIELDS},
+            vocabularies
+        )
+
+    def _gather(self, offsets, indices):
+        starts, ends = offsets[indices], offsets[indices + 1]
+        counts = ends - starts
+        positions = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+        return np.repeat(np.arange(len(indices)), counts), positions, counts
+
+    def node_features(self, indices, field, max_nodes=None):
+        """Returns a `(batch, max_nodes)` array of a node field for graphs `indices`, padded with -1."""
+        indices = np.asarray(indices, dtype=np.int64)
+        owners, positions, counts = self._gather(self.node_offsets, indices)
+        max_nodes = max_nodes or int(counts.max(initial=0))
+        slots = positions - np.repeat(self.node_offsets[indices], counts)
+        keep = slots < max_nodes
+        features = np.full((len(indices), max_nodes), -1, dtype=np.int32)
+        features[owners[keep], slots[keep]] = self.nodes[field][positions[keep]]
+        return features
+
+    def adjacency(self, indices, max_nodes=None):
+        """Returns a `(batch, max_nodes, max_nodes)` int32 tensor for graphs `indices`.
+
+        Entry `[b, start, end]` is the `edge.relation` code of that edge plus one,
+        so 0 means no edge.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        if max_nodes is None:
+            counts = self.node_offsets[indices + 1] - self.node_offsets[indices]
+            max_nodes = int(counts.max(initial=0))
+        owners, positions, _ = self._gather(self.edge_offsets, indices)
+        starts, ends = self.edges["start"][positions], self.edges["end"][positions]
+        keep = (starts >= 0) & (starts < max_nodes) & (ends >= 0) & (ends < max_nodes)
+        adjacency = np.zeros((len(indices), max_nodes, max_nodes), dtype=np.int32)
+        adjacency[owners[keep], starts[keep], ends[keep]] = self.edges["relation"][positions[keep]] + 1
+        return adjacency
+
+
+# `_records` through `canonical_graph_hash` are shared verbatim with
+# graph_questions/graph_questions.py (loading scripts cannot import each
+# other); keep the two copies in sync so graph hashes stay comparable
+# across the datasets.
+def _records(value):
+    """Returns a `Sequence` of dicts as a list of dicts, whether it is stored row- or column-wise."""
+    if isinstance(value, dict):
+        return [dict(zip(value, row)) for row in zip(*value.values())]
+    return value or []
+
+
+def _node_label(node):
+    # Entity and literal values are left out: only the query structure counts.
+    return "|".join(str(node.get(field)) for field in ["node_type", "class", "function", "question_node"])
+
+
+# Search tree nodes explored before falling back to the stable colouring.
+_MAX_CANONICAL_SEARCH = 1000
+
+
+class _SearchBudgetExceeded(Exception):
+    pass
+
+
+def _refine(colors, out_edges, in_edges):
+    """Colour refinement: splits colour classes by neighbour colours until the partition is stable.
+
+    Colours are ranks of sorted signatures, so they only depend on the
+    graph structure, never on node order.
+    """
+    num_colors = len(set(colors))
+    while True:
+        signatures = [
+            (colors[i],
+             tuple(sorted((relation, colors[j]) for j, relation in out_edges[i])),
+             tuple(sorted((relation, colors[j]) for j, relation in in_edges[i])))
+            for i in range(len(colors))
+        ]
+        ranks = {signature: rank for rank, signature in enumerate(sorted(set(signatures)))}
+        colors = [ranks[signature] for signature in signatures]
+        if len(ranks) == num_colors:
+            return colors
+        num_colors = len(ranks)
+
+
+def canonical_graph_hash(graph_query):
+    """Returns a hash of `graph_query` that is equal for isomorphic query graphs.
+
+    Nodes are compared by type, class, function and whether they are the
+    question node; `nid`s and concrete entity/literal values are ignored.
+    Colour refinement orders the nodes. Nodes it cannot tell apart are
+    individualized one at a time and refined again, keeping the smallest
+    encoding (individualization-refinement). Twins, nodes with the same
+    neighbours such as the leaves of a star, are interchangeable, so only one
+    of them is tried, which keeps symmetric graphs linear. A graph that still
+    needs more than `_MAX_CANONICAL_SEARCH` steps is hashed by its stable
+    colouring, which never separates isomorphic graphs but may merge a few
+    non-isomorphic ones.
+    """
+    nodes = _records(graph_query["nodes"])
+    position = {node["nid"]: i for i, node in enumerate(nodes)}
+    edges = [
+        (position[edge["start"]], position[edge["end"]], str(edge["relation"]))
+        for edge in _records(graph_query["edges"])
+        if edge["start"] in position and edge["end"] in position
+    ]
+    labels = [_node_label(node) for node in nodes]
+    out_edges = [[] for _ in nodes]
+    in_edges = [[] for _ in nodes]
+    for start, end, relation in edges:
+        out_edges[start].append((end, relation))
+        in_edges[end].append((start, relation))
+
+    twin_keys = [
+        (labels[i],
+         tuple(sorted((relation, -1 if j == i else j) for j, relation in out_edges[i])),
+         tuple(sorted((relation, -1 if j == i else j) for j, relation in in_edges[i])))
+        for i in range(len(nodes))
+    ]
+
+    def encode(colors):
+        return (
+            [labels[i] for i in sorted(range(len(nodes)), key=colors.__getitem__)],
+            sorted((colors[start], colors[end], relation) for start, end, relation in edges)
+        )
+
+    sorted_labels = sorted(set(labels))
+    stable = _refine([sorted_labels.index(label) for label in labels], out_edges, in_edges)
+    best = None
+    budget = _MAX_CANONICAL_SEARCH
+
+    def search(colors):
+        nonlocal best, budget
+        cells = {}
+        for i, color in enumerate(colors):
+            cells.setdefault(color, []).append(i)
+        ties = [cell for color, cell in sorted(cells.items()) if len(cell) > 1]
+        if not ties:
+            encoding = encode(colors)
+            if best is None or encoding < best:
+                best = encoding
+            return
+        tried = set()
+        for i in ties[0]:
+            if twin_keys[i] in tried:
+                continue
+            tried.add(twin_keys[i])
+            budget -= 1
+            if budget < 0:
+                raise _SearchBudgetExceeded()
+            # Doubling keeps the order of the other classes and puts `i` just before its own.
+            individualized = [2 * color for color in colors]
+            individualized[i] -= 1
+            search(_refine(individualized, out_edges, in_edges))
+
+    try:
+        search(stable)
+        encoding = best
+    except _SearchBudgetExceeded:
+        encoding = ["stable colouring", encode(stable)]
+    return hashlib.sha1(json.dumps(encoding).encode("utf-8")).hexdigest()
+
+
+def build_hash_index(graph_hashes):
+    """Maps every graph hash of a split to the row indices that have it."""
+    index = {}
+    for row, graph_hash in enumerate(graph_hashes):
+        index.setdefault(graph_hash, []).append(row)
+    return index
+
+
+def overlap_by_level(train, test):
+    """Counts, per GrailQA `level`, how many test questions share a query structure with train.
+
+    Returns `{level: (num_overlapping, num_questions)}`; both splits need the
+    `graph_hash` column.
+    """
+    overlap = structure_overlap(train["graph_hash"], test["graph_hash"])
+    counts = {}
+    for level, shared in zip(test["level"], overlap):
+        num_shared, total = counts.get(level, (0, 0))
+        counts[level] = (num_shared + int(shared), total + 1)
+    return counts
+
+
+def structure_overlap(train_hashes, test_hashes):
+    """Returns a boolean mask over the test rows whose query structure also occurs in train."""
+    seen = set(train_hashes)
+    return np.fromiter((graph_hash in seen for graph_hash in test_hashes), dtype=bool, count=len(test_hashes))
+
+
 class GrailQAConfig(datasets.BuilderConfig):
     """BuilderConfig for GrailQA"""
     def __init__(self,
@@ -123,7 +654,8 @@ class GrailQA(datasets.GeneratorBasedBuilder):
                         datasets.Value("string")
                     ),
                     "level": datasets.Value("string"),
-                    "s_expression": datasets.Value("string")
+                    "s_expression": datasets.Value("string"),
+                    "graph_hash": datasets.Value("string")
                 }
             )
         )
@@ -162,15 +694,31 @@ class GrailQA(datasets.GeneratorBasedBuilder):
 
     def _generate_examples(self, data_file, **kwargs):
         with open(data_file, encoding="utf8") as f:
-            grailqa = json.load(f)
+            grailqa = iter_json_array(f)
             if self.config.name == "grailqa_test_public":
                 for idx, question in enumerate(grailqa):
                     yield idx, question
             else:
+                # Warm the logical-form cache kept next to the Arrow files.
+                # S-expressions the compiler rejects are left out of the cache
+                # but their questions are still emitted.
+                cache = LogicalFormCache(self._output_dir)
+                num_uncompiled = 0
                 for idx, question in enumerate(grailqa):
                     if not question.get("level", None):
                         question["level"] = "null"
                     for answer in question["answer"]:
                         if not answer.get("entity_name", None):
                             answer["entity_name"] = "null"
+                    if question.get("s_expression"):
+                        try:
+                            cache.sparql(question["s_expression"])
+                        except ValueError as e:
+                            num_uncompiled += 1
+                            logger.debug("Not caching the S-expression of question %s: %s", question.get("qid"), e)
+                    question["graph_hash"] = canonical_graph_hash(question["graph_query"])
                     yield idx, question
+                if num_uncompiled:
+                    logger.warning("%d S-expressions in %s could not be compiled and are not cached",
+                                   num_uncompiled, data_file)
+                cache.save()
@@ -1,8 +1,13 @@
 """GraphQuestions: A Characteristic-Rich Dataset for Factoid Question Answering."""
 
+import hashlib
 import json
 import os
 
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
 import datasets
 
 logger = datasets.logging.get_logger(__name__)
@@ -32,6 +37,274 @@ _GRAPHQUESTIONS_URLS = {
     "test": "https://raw.githubusercontent.com/ysu1989/GraphQuestions/master/freebase13/graphquestions.testing.json"
 }
 
+# `_NODE_INT_FIELDS` through `GraphQueryColumns` are shared verbatim with
+# grail_qa/grail_qa.py (loading scripts cannot import each other); keep the
+# two copies in sync.
+_NODE_INT_FIELDS = ["nid", "question_node"]
+_NODE_STRING_FIELDS = ["node_type", "id", "class", "friendly_name", "function"]
+_EDGE_INT_FIELDS = ["start", "end"]
+_EDGE_STRING_FIELDS = ["relation", "friendly_name"]
+
+
+def _list_offsets(list_array):
+    offsets = list_array.offsets.to_numpy(zero_copy_only=False).astype(np.int64)
+    return offsets - offsets[0]
+
+
+def _flatten_records(array, fields):
+    """Returns per-row offsets and the flattened `fields` of a `Sequence` of dicts.
+
+    `datasets.Sequence` stores a dict feature as a struct of lists, while
+    `datasets.List` stores a list of structs; both layouts are accepted.
+    """
+    if pa.types.is_struct(array.type):
+        lists = {field: array.field(field).fill_null([]) for field in fields}
+        return _list_offsets(lists[fields[0]]), {field: values.flatten() for field, values in lists.items()}
+    array = array.fill_null([])
+    values = array.flatten()
+    return _list_offsets(array), {field: values.field(field) for field in fields}
+
+
+def _encode_column(values):
+    """Returns int32 codes (-1 for null) and the vocabulary of a string column."""
+    encoded = pc.dictionary_encode(values)
+    codes = encoded.indices.fill_null(-1).to_numpy(zero_copy_only=False).astype(np.int32)
+    return codes, encoded.dictionary.to_pylist()
+
+
+class GraphQueryColumns:
+    """Flattened `graph_query` encoding: node and edge tables plus per-graph offsets.
+
+    The nodes of graph `i` are rows `node_offsets[i]:node_offsets[i + 1]` of the
+    arrays in `nodes`, and likewise for `edges`. Integer fields are kept as is;
+    string fields are int32 codes into `vocabularies[field]` (edge fields are
+    keyed `edge.<field>`), with -1 for null. Edge `start`/`end` are node `nid`s,
+    which are the node's position within its graph.
+    """
+
+    def __init__(self, node_offsets, edge_offsets, nodes, edges, vocabularies):
+        self.node_offsets = node_offsets
+        self.edge_offsets = edge_offsets
+        self.nodes = nodes
+        self.edges = edges
+        self.vocabularies = vocabularies
+
+    def __len__(self):
+        return len(self.node_offsets) - 1
+
+    @classmethod
+    def from_dataset(cls, dataset):
+        """Converts the `graph_query` column of a loaded split with Arrow compute kernels, without per-row Python."""
+        column = dataset.with_format("arrow")[:].column("graph_query").combine_chunks()
+        node_offsets, node_values = _flatten_records(column.field("nodes"), _NODE_INT_FIELDS + _NODE_STRING_FIELDS)
+        edge_offsets, edge_values = _flatten_records(column.field("edges"), _EDGE_INT_FIELDS + _EDGE_STRING_FIELDS)
+        nodes, edges, vocabularies = {}, {}, {}
+        for field in _NODE_INT_FIELDS:
+            nodes[field] = node_values[field].fill_null(-1).to_numpy(zero_copy_only=False).astype(np.int32)
+        for field in _NODE_STRING_FIELDS:
+            nodes[field], vocabularies[field] = _encode_column(node_values[field])
+        for field in _EDGE_INT_FIELDS:
+            edges[field] = edge_values[field].fill_null(-1).to_numpy(zero_copy_only=False).astype(np.int32)
+        for field in _EDGE_STRING_FIELDS:
+            edges[field], vocabularies["edge." + field] = _encode_column(edge_values[field])
+        return cls(node_offsets, edge_offsets, nodes, edges, vocabularies)
+
+    def save(self, out_dir):
+        os.makedirs(out_dir, exist_ok=True)
+        np.save(os.path.join(out_dir, "node_offsets.npy"), self.node_offsets)
+        np.save(os.path.join(out_dir, "edge_offsets.npy"), self.edge_offsets)
+        for prefix, table in [("node.", self.nodes), ("edge.", self.edges)]:
+            for field, values in table.items():
+                np.save(os.path.join(out_dir, prefix + field + ".npy"), values)
+        with open(os.path.join(out_dir, "vocabularies.json"), "w", encoding="utf-8") as f:
+            json.dump(self.vocabularies, f)
+
+    @classmethod
+    def load(cls, out_dir, mmap_mode="r"):
+        def column(name):
+            return np.lib.format.open_memmap(os.path.join(out_dir, name + ".npy"), mode=mmap_mode)
+
+        with open(os.path.join(out_dir, "vocabularies.json"), encoding="utf-8") as f:
+            vocabularies = json.load(f)
+        return cls(
+            column("node_offsets"),
+            column("edge_offsets"),
+            {field: column("node." + field) for field in _NODE_INT_FIELDS + _NODE_STRING_FIELDS},
+            {field: column("edge." + field) for field in _EDGE_INT_FIELDS + _EDGE_STRING_FIELDS},
+            vocabularies
+        )
+
+    def _gather(self, offsets, indices):
+        starts, ends = offsets[indices], offsets[indices + 1]
+        counts = ends - starts
+        positions = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+        return np.repeat(np.arange(len(indices)), counts), positions, counts
+
+    def node_features(self, indices, field, max_nodes=None):
+        """Returns a `(batch, max_nodes)` array of a node field for graphs `indices`, padded with -1."""
+        indices = np.asarray(indices, dtype=np.int64)
+        owners, positions, counts = self._gather(self.node_offsets, indices)
+        max_nodes = max_nodes or int(counts.max(initial=0))
+        slots = positions - np.repeat(self.node_offsets[indices], counts)
+        keep = slots < max_nodes
+        features = np.full((len(indices), max_nodes), -1, dtype=np.int32)
+        features[owners[keep], slots[keep]] = self.nodes[field][positions[keep]]
+        return features
+
+    def adjacency(self, indices, max_nodes=None):
+        """Returns a `(batch, max_nodes, max_nodes)` int32 tensor for graphs `indices`.
+
+        Entry `[b, start, end]` is the `edge.relation` code of that edge plus one,
+        so 0 means no edge.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        if max_nodes is None:
+            counts = self.node_offsets[indices + 1] - self.node_offsets[indices]
+            max_nodes = int(counts.max(initial=0))
+        owners, positions, _ = self._gather(self.edge_offsets, indices)
+        starts, ends = self.edges["start"][positions], self.edges["end"][positions]
+        keep = (starts >= 0) & (starts < max_nodes) & (ends >= 0) & (ends < max_nodes)
+        adjacency = np.zeros((len(indices), max_nodes, max_nodes), dtype=np.int32)
+        adjacency[owners[keep], starts[keep], ends[keep]] = self.edges["relation"][positions[keep]] + 1
+        return adjacency
+
+
+# `_records` through `canonical_graph_hash` are shared verbatim with
+# grail_qa/grail_qa.py (loading scripts cannot import each other); keep the
+# two copies in sync so graph hashes stay comparable across the datasets.
+def _records(value):
+    """Returns a `Sequence` of dicts as a list of dicts, whether it is stored row- or column-wise."""
+    if isinstance(value, dict):
+        return [dict(zip(value, row)) for row in zip(*value.values())]
+    return value or []
+
+
+def _node_label(node):
+    # Entity and literal values are left out: only the query structure counts.
+    return "|".join(str(node.get(field)) for field in ["node_type", "class", "function", "question_node"])
+
+
+# Search tree nodes explored before falling back to the stable colouring.
+_MAX_CANONICAL_SEARCH = 1000
+
+
+class _SearchBudgetExceeded(Exception):
+    pass
+
+
+def _refine(colors, out_edges, in_edges):
+    """Colour refinement: splits colour classes by neighbour colours until the partition is stable.
+
+    Colours are ranks of sorted signatures, so they only depend on the
+    graph structure, never on node order.
+    """
+    num_colors = len(set(colors))
+    while True:
+        signatures = [
+            (colors[i],
+             tuple(sorted((relation, colors[j]) for j, relation in out_edges[i])),
+             tuple(sorted((relation, colors[j]) for j, relation in in_edges[i])))
+            for i in range(len(colors))
+        ]
+        ranks = {signature: rank for rank, signature in enumerate(sorted(set(signatures)))}
+        colors = [ranks[signature] for signature in signatures]
+        if len(ranks) == num_colors:
+            return colors
+        num_colors = len(ranks)
+
+
+def canonical_graph_hash(graph_query):
+    """Returns a hash of `graph_query` that is equal for isomorphic query graphs.
+
+    Nodes are compared by type, class, function and whether they are the
+    question node; `nid`s and concrete entity/literal values are ignored.
+    Colour refinement orders the nodes. Nodes it cannot tell apart are
+    individualized one at a time and refined again, keeping the smallest
+    encoding (individualization-refinement). Twins, nodes with the same
+    neighbours such as the leaves of a star, are interchangeable, so only one
+    of them is tried, which keeps symmetric graphs linear. A graph that still
+    needs more than `_MAX_CANONICAL_SEARCH` steps is hashed by its stable
+    colouring, which never separates isomorphic graphs but may merge a few
+    non-isomorphic ones.
+    """
+    nodes = _records(graph_query["nodes"])
+    position = {node["nid"]: i for i, node in enumerate(nodes)}
+    edges = [
+        (position[edge["start"]], position[edge["end"]], str(edge["relation"]))
+        for edge in _records(graph_query["edges"])
+        if edge["start"] in position and edge["end"] in position
+    ]
+    labels = [_node_label(node) for node in nodes]
+    out_edges = [[] for _ in nodes]
+    in_edges = [[] for _ in nodes]
+    for start, end, relation in edges:
+        out_edges[start].append((end, relation))
+        in_edges[end].append((start, relation))
+
+    twin_keys = [
+        (labels[i],
+         tuple(sorted((relation, -1 if j == i else j) for j, relation in out_edges[i])),
+         tuple(sorted((relation, -1 if j == i else j) for j, relation in in_edges[i])))
+        for i in range(len(nodes))
+    ]
+
+    def encode(colors):
+        return (
+            [labels[i] for i in sorted(range(len(nodes)), key=colors.__getitem__)],
+            sorted((colors[start], colors[end], relation) for start, end, relation in edges)
+        )
+
+    sorted_labels = sorted(set(labels))
+    stable = _refine([sorted_labels.index(label) for label in labels], out_edges, in_edges)
+    best = None
+    budget = _MAX_CANONICAL_SEARCH
+
+    def search(colors):
+        nonlocal best, budget
+        cells = {}
+        for i, color in enumerate(colors):
+            cells.setdefault(color, []).append(i)
+        ties = [cell for color, cell in sorted(cells.items()) if len(cell) > 1]
+        if not ties:
+            encoding = encode(colors)
+            if best is None or encoding < best:
+                best = encoding
+            return
+        tried = set()
+        for i in ties[0]:
+            if twin_keys[i] in tried:
+                continue
+            tried.add(twin_keys[i])
+            budget -= 1
+            if budget < 0:
+                raise _SearchBudgetExceeded()
+            # Doubling keeps the order of the other classes and puts `i` just before its own.
+            individualized = [2 * color for color in colors]
+            individualized[i] -= 1
+            search(_refine(individualized, out_edges, in_edges))
+
+    try:
+        search(stable)
+        encoding = best
+    except _SearchBudgetExceeded:
+        encoding = ["stable colouring", encode(stable)]
+    return hashlib.sha1(json.dumps(encoding).encode("utf-8")).hexdigest()
+
+
+def build_hash_index(graph_hashes):
+    """Maps every graph hash of a split to the row indices that have it."""
+    index = {}
+    for row, graph_hash in enumerate(graph_hashes):
+        index.setdefault(graph_hash, []).append(row)
+    return index
+
+
+def structure_overlap(train_hashes, test_hashes):
+    """Returns a boolean mask over the test rows whose query structure also occurs in train."""
+    seen = set(train_hashes)
+    return np.fromiter((graph_hash in seen for graph_hash in test_hashes), dtype=bool, count=len(test_hashes))
+
+
 class GraphQuestionsConfig(datasets.BuilderConfig):
     """BuilderConfig for GraphQuestions"""
     def __init__(self,
@@ -102,7 +375,8 @@ class GraphQuestions(datasets.GeneratorBasedBuilder):
                             )
                         }
                     ),
-                    "sparql_query": datasets.Value("string")
+                    "sparql_query": datasets.Value("string"),
+                    "graph_hash": datasets.Value("string")
                 }
             )
         )
@@ -137,4 +411,5 @@ class GraphQuestions(datasets.GeneratorBasedBuilder):
         with open(data_file, encoding="utf8") as f:
             graphquestion = json.load(f)
             for idx, question in enumerate(graphquestion):
+                question["graph_hash"] = canonical_graph_hash(question["graph_query"])
                 yield idx, question
@@ -3,6 +3,7 @@
 import json
 import os
 
+import pyarrow as pa
 import datasets
 
 logger = datasets.logging.get_logger(__name__)
@@ -31,6 +32,86 @@ _LCQUAD_URLS = {
     "templates": "https://raw.githubusercontent.com/AskNowQA/LC-QuAD/data/resources/templates.json"
 }
 
+# Resources each config reads; "lcquad" also needs the templates for the join.
+_CONFIG_RESOURCES = {
+    "lcquad": ["train", "test", "templates"],
+    "entities": ["entities"],
+    "predicates": ["predicates"],
+    "templates": ["templates"]
+}
+
+_NAME_SCHEMA = pa.schema([("name", pa.string())])
+
+_RESOURCE_SCHEMAS = {
+    "questions": pa.schema([
+        ("_id", pa.string()),
+        ("corrected_question", pa.string()),
+        ("intermediary_question", pa.string()),
+        ("sparql_query", pa.string()),
+        ("sparql_template_id", pa.int32())
+    ]),
+    "entities": _NAME_SCHEMA,
+    "predicates": _NAME_SCHEMA,
+    "templates": pa.schema([
+        ("id", pa.int32()),
+        ("n_entities", pa.int32()),
+        ("template", pa.string()),
+        ("type", pa.string())
+    ])
+}
+
+
+def _parse_resource(kind, data_file):
+    """Parses a downloaded LC-QuAD resource into rows of its `_RESOURCE_SCHEMAS` entry.
+
+    `kind` is "questions" for the train and test files, or "entities",
+    "predicates" or "templates".
+    """
+    if kind in ["entities", "predicates"]:
+        names = []
+        with open(data_file, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if kind == "predicates" and "," in line: line = line[0:-1]
+                names.append({"name": line})
+        return names
+    if kind in ["questions", "templates"]:
+        with open(data_file, encoding="utf8") as f:
+            return json.load(f)
+    raise ValueError("Unknown LC-QuAD resource kind {!r}".format(kind))
+
+
+def resource_file(data_file):
+    return os.path.splitext(data_file)[0] + ".arrow"
+
+
+def convert_resource(kind, data_file, arrow_file):
+    """Parses an LC-QuAD resource into an Arrow IPC file, renamed into place once complete."""
+    schema = _RESOURCE_SCHEMAS[kind]
+    table = pa.Table.from_pylist(_parse_resource(kind, data_file), schema=schema)
+    tmp_file = "{}.tmp{}".format(arrow_file, os.getpid())
+    with pa.OSFile(tmp_file, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_file, arrow_file)
+
+
+def load_resource(kind, data_file):
+    """Memory-maps the parsed copy of an LC-QuAD resource, converting it on first use.
+
+    The copy sits next to the download, so a refresh of all four configs
+    parses every file once: templates.json is parsed by whichever of
+    `templates` and `lcquad` is built first, and the other reads the mapped
+    table. A copy with another schema is converted again.
+    """
+    arrow_file = resource_file(data_file)
+    if os.path.exists(arrow_file):
+        table = pa.ipc.open_file(pa.memory_map(arrow_file, "r")).read_all()
+        if table.schema.equals(_RESOURCE_SCHEMAS[kind]):
+            return table
+    convert_resource(kind, data_file, arrow_file)
+    return pa.ipc.open_file(pa.memory_map(arrow_file, "r")).read_all()
+
+
 class LCQuADConfig(datasets.BuilderConfig):
     """BuilderConfig for LC-QuAD"""
     def __init__(self,
@@ -129,7 +210,9 @@ class LCQuAD(datasets.GeneratorBasedBuilder):
                     "corrected_question": datasets.Value("string"),
                     "intermediary_question": datasets.Value("string"),
                     "sparql_query": datasets.Value("string"),
-                    "sparql_template_id": datasets.Value("int32")
+                    "sparql_template_id": datasets.Value("int32"),
+                    "template_type": datasets.Value("string"),
+                    "template_n_entities": datasets.Value("int32")
                 }
             )
         )
@@ -137,13 +220,7 @@ class LCQuAD(datasets.GeneratorBasedBuilder):
     def _split_generators(self, dl_manager):
         data_dir = None
         lcquad_files = dl_manager.download(
-            {
-                "train": _LCQUAD_URLS["train"],
-                "test": _LCQUAD_URLS["test"],
-                "entities": _LCQUAD_URLS["entities"],
-                "predicates": _LCQUAD_URLS["predicates"],
-                "templates": _LCQUAD_URLS["templates"],
-            }
+            {resource: _LCQUAD_URLS[resource] for resource in _CONFIG_RESOURCES[self.config.name]}
         )
 
         if self.config.name == "entities":
@@ -184,6 +261,7 @@ class LCQuAD(datasets.GeneratorBasedBuilder):
                 name=datasets.Split.TRAIN,
                 gen_kwargs={
                     "data_file": os.path.join(data_dir or "", lcquad_files["train"]),
+                    "templates_file": os.path.join(data_dir or "", lcquad_files["templates"]),
                     "split": "train"
                 }
             ),
@@ -191,20 +269,22 @@ class LCQuAD(datasets.GeneratorBasedBuilder):
                 name=datasets.Split.TEST,
                 gen_kwargs={
                     "data_file": os.path.join(data_dir or "", lcquad_files["test"]),
+                    "templates_file": os.path.join(data_dir or "", lcquad_files["templates"]),
                     "split": "test"
                 }
             )
         ]
 
     def _generate_examples(self, data_file, **kwargs):
-        if self.config.name == "entities" or self.config.name == "predicates":
-            lines = open(data_file, encoding="utf-8").readlines()
-            for idx, line in enumerate(lines):
-                line = line.strip()
-                if self.config.name == "predicates" and "," in line: line = line[0:-1]
-                yield idx, {"name": line}
-        elif self.config.name == "templates" or self.config.name == "lcquad":
-            with open(data_file, encoding="utf8") as f:
-                all_data = json.load(f)
-                for idx, example in enumerate(all_data):
-                    yield idx, example
+        if self.config.name == "lcquad":
+            templates = load_resource("templates", kwargs["templates_file"])
+            template_ids = templates.column("id").to_pylist()
+            types = dict(zip(template_ids, templates.column("type").to_pylist()))
+            n_entities = dict(zip(template_ids, templates.column("n_entities").to_pylist()))
+            for idx, example in enumerate(load_resource("questions", data_file).to_pylist()):
+                example["template_type"] = types.get(example["sparql_template_id"])
+                example["template_n_entities"] = n_entities.get(example["sparql_template_id"])
+                yield idx, example
+        else:
+            for idx, row in enumerate(load_resource(self.config.name, data_file).to_pylist()):
+                yield idx, row
@@ -3,6 +3,7 @@
 import json
 import os
 
+import pyarrow as pa
 import datasets
 
 logger = datasets.logging.get_logger(__name__)
@@ -27,6 +28,72 @@ _LCQUAD2_URLS = {
     "test": "https://s3-eu-west-1.amazonaws.com/pfigshare-u-files/15738818/test.json"
 }
 
+_SPARQL_FIELDS = {
+    "wikidata": "sparql_wikidata",
+    "dbpedia": "sparql_dbpedia18"
+}
+
+
+def _as_list_column(values):
+    """Normalizes a str-or-list column: lists pass through, strings are wrapped and anything else becomes []."""
+    return [value if isinstance(value, list) else [value] if isinstance(value, str) else [] for value in values]
+
+
+_COLUMN_SCHEMA = pa.schema([
+    ("NNQT_question", pa.string()),
+    ("uid", pa.string()),
+    ("subgraph", pa.list_(pa.string())),
+    ("template_index", pa.string()),
+    ("question", pa.string()),
+    ("sparql_wikidata", pa.string()),
+    ("sparql_dbpedia18", pa.string()),
+    ("template", pa.list_(pa.string())),
+    ("template_id", pa.string()),
+    ("answer", pa.list_(pa.string())),
+    ("paraphrased_question", pa.list_(pa.string()))
+])
+
+
+def columns_file(data_file):
+    return os.path.splitext(data_file)[0] + ".arrow"
+
+
+def convert_columns(data_file, arrow_file):
+    """Parses an LC-QuAD 2.0 split into an Arrow IPC file holding both SPARQL columns."""
+    with open(data_file, encoding="utf8") as f:
+        lcquad2 = json.load(f)
+    columns = {
+        "NNQT_question": [question["NNQT_question"] for question in lcquad2],
+        "uid": [str(question["uid"]) for question in lcquad2],
+        "subgraph": _as_list_column(question["subgraph"] for question in lcquad2),
+        "template_index": [str(question["template_index"]) for question in lcquad2],
+        "question": [question["question"] for question in lcquad2],
+        "sparql_wikidata": [question["sparql_wikidata"] for question in lcquad2],
+        "sparql_dbpedia18": [question["sparql_dbpedia18"] for question in lcquad2],
+        "template": _as_list_column(question["template"] for question in lcquad2),
+        "template_id": [str(question["template_id"]) for question in lcquad2],
+        "answer": [question["answer"] for question in lcquad2],
+        "paraphrased_question": _as_list_column(question["paraphrased_question"] for question in lcquad2)
+    }
+    tmp_file = "{}.tmp{}".format(arrow_file, os.getpid())
+    with pa.OSFile(tmp_file, "wb") as sink, pa.ipc.new_file(sink, _COLUMN_SCHEMA) as writer:
+        writer.write_table(pa.Table.from_pydict(columns, schema=_COLUMN_SCHEMA))
+    os.replace(tmp_file, arrow_file)
+
+
+def load_columns(data_file):
+    """Memory-maps the columnar copy of an LC-QuAD 2.0 split, converting it on first use.
+
+    The copy sits next to the download, so whichever of `lcquad2-wikidata` and
+    `lcquad2-dbpedia` is built first pays for the JSON parse and the other
+    only selects its SPARQL column from the mapped file.
+    """
+    arrow_file = columns_file(data_file)
+    if not os.path.exists(arrow_file):
+        convert_columns(data_file, arrow_file)
+    return pa.ipc.open_file(pa.memory_map(arrow_file, "r")).read_all()
+
+
 class LCQuAD2Config(datasets.BuilderConfig):
     """BuilderConfig for LC-QuAD 2.0"""
     def __init__(self,
@@ -120,39 +187,11 @@ class LCQuAD2(datasets.GeneratorBasedBuilder):
         ]
 
     def _generate_examples(self, data_file, split, kb, **kwargs):
-        with open(data_file, encoding="utf8") as f:
-            lcquad2 = json.load(f)
-            for idx, question in enumerate(lcquad2):
-                paraphrases = []
-                templates = []
-                subgraphs = []
-                if isinstance(question["paraphrased_question"], list):
-                    paraphrases = question["paraphrased_question"]
-                elif isinstance(question["paraphrased_question"], str):
-                    paraphrases.append(question["paraphrased_question"])
-
-                if isinstance(question["template"], list):
-                    templates = question["template"]
-                elif isinstance(question["template"], str):
-                    templates.append(question["template"])
-
-                if isinstance(question["subgraph"], list):
-                    subgraphs = question["subgraph"]
-                elif isinstance(question["subgraph"], str):
-                    subgraphs.append(question["subgraph"])
-                if kb == "wikidata":
-                    sparql = question["sparql_wikidata"]
-                elif kb == "dbpedia":
-                    sparql = question["sparql_dbpedia18"]
-                yield idx, {
-                    "NNQT_question": question["NNQT_question"],
-                    "uid": str(question["uid"]),
-                    "subgraph": subgraphs,
-                    "template_index": str(question["template_index"]),
-                    "question": question["question"],
-                    "sparql": sparql,
-                    "template": templates,
-                    "template_id": str(question["template_id"]),
-                    "answer": question["answer"],
-                    "paraphrased_question": paraphrases
-                }
+        table = load_columns(data_file)
+        names = [name for name in table.column_names if name not in _SPARQL_FIELDS.values()]
+        table = table.select(names + [_SPARQL_FIELDS[kb]]).rename_columns(names + ["sparql"])
+        idx = 0
+        for batch in table.to_batches():
+            for question in batch.to_pylist():
+                yield idx, question
+                idx += 1
@@ -16,6 +16,9 @@
 
 
 import os
+import re
+import shutil
+from array import array
 
 import numpy as np
 
@@ -39,6 +42,372 @@ _HOMEPAGE = "https://github.com/yuyuz/MetaQA"
 
 _LICENSE = "CC License"
 
+_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+# `_iter_line_blocks` is shared verbatim with
+# simple_wikidata_qa/simple_wikidata_qa.py (loading scripts cannot import each
+# other); keep the two copies in sync.
+def _iter_line_blocks(path, chunk_size=_CHUNK_SIZE):
+    """Yields the file as `bytes` blocks of whole lines, reading `chunk_size` bytes at a time."""
+    tail = b""
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            chunk = tail + chunk
+            end = chunk.rfind(b"\n") + 1
+            tail = chunk[end:]
+            if end:
+                yield chunk[:end]
+    if tail:
+        yield tail
+
+
+def _parse_kb_lines(data):
+    triples = []
+    # Split on "\n" only: `str.splitlines` also breaks on characters such as
+    # "\x1c" or "\u2028" that can occur inside entity names.
+    for line in data.decode("utf-8").split("\n"):
+        line = line.rstrip("\r")
+        if line:
+            subject, predicate, object = line.split("|", 2)
+            triples.append((subject, predicate, object))
+    return triples
+
+
+def iter_kb_batches(kb_file, chunk_size=_CHUNK_SIZE):
+    """Yields batches of (subject, predicate, object) triples from a `|`-delimited KB file.
+
+    The file is read in chunks of `chunk_size` bytes, so memory stays bounded by
+    one chunk no matter how large the KB is.
+    """
+    for block in _iter_line_blocks(kb_file, chunk_size):
+        yield _parse_kb_lines(block)
+
+
+def iter_qa_pairs(qa_file, chunk_size=_CHUNK_SIZE):
+    """Yields (question, answers) from a MetaQA `qa_*.txt` file.
+
+    Lines are split on tab and `|` as bytes and only the resulting fields are
+    decoded, so memory does not grow with the file or its longest line.
+    """
+    for block in _iter_line_blocks(qa_file, chunk_size):
+        for line in block.split(b"\n"):
+            line = line.rstrip(b"\r")
+            if line:
+                question, answers = line.split(b"\t", 1)
+                yield question.decode("utf-8"), [answer.decode("utf-8") for answer in answers.split(b"|")]
+
+
+class TripleStoreWriter:
+    """Interns triples into entity/relation dictionaries and int32 columns.
+
+    Call `add` for every triple and `close` once to write the store to
+    `store_dir`. The store is written to a temporary directory first and moved
+    into place at the end, so readers never see a half-written store.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.entity_ids = {}
+        self.relation_ids = {}
+        self.subjects = array("i")
+        self.predicates = array("i")
+        self.objects = array("i")
+
+    def add(self, subject, predicate, object):
+        entity_ids = self.entity_ids
+        self.subjects.append(entity_ids.setdefault(subject, len(entity_ids)))
+        self.predicates.append(self.relation_ids.setdefault(predicate, len(self.relation_ids)))
+        self.objects.append(entity_ids.setdefault(object, len(entity_ids)))
+
+    def close(self):
+        tmp_dir = "{}.tmp{}".format(self.store_dir, os.getpid())
+        os.makedirs(tmp_dir, exist_ok=True)
+        for name in ["subjects", "predicates", "objects"]:
+            np.save(os.path.join(tmp_dir, name + ".npy"), np.frombuffer(getattr(self, name), dtype=np.int32))
+        for name, ids in [("entities", self.entity_ids), ("relations", self.relation_ids)]:
+            with open(os.path.join(tmp_dir, name + ".txt"), "w", encoding="utf-8") as f:
+                f.write("\n".join(ids))
+        try:
+            os.rename(tmp_dir, self.store_dir)
+        except OSError:
+            # Another process finished the same store first.
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return TripleStore(self.store_dir)
+
+
+class TripleStore:
+    """Integer-encoded KB built by `TripleStoreWriter`.
+
+    `subjects`, `predicates` and `objects` are int32 arrays memory-mapped from
+    `.npy` files, so opening a store costs a few syscalls and the pages are
+    shared by every process that maps them. The string dictionaries are only
+    read on first access.
+    """
+
+    def __init__(self, store_dir, mmap_mode="r"):
+        self.store_dir = store_dir
+        # `open_memmap` rather than `np.load`: `datasets` swaps `np.load` in
+        # loading scripts for a wrapper that cannot memory-map.
+        self.subjects = np.lib.format.open_memmap(os.path.join(store_dir, "subjects.npy"), mode=mmap_mode)
+        self.predicates = np.lib.format.open_memmap(os.path.join(store_dir, "predicates.npy"), mode=mmap_mode)
+        self.objects = np.lib.format.open_memmap(os.path.join(store_dir, "objects.npy"), mode=mmap_mode)
+        self._entities = None
+        self._relations = None
+        self._entity_ids = None
+        self._relation_ids = None
+
+    def __len__(self):
+        return len(self.subjects)
+
+    def _read_names(self, name):
+        with open(os.path.join(self.store_dir, name + ".txt"), encoding="utf-8") as f:
+            return f.read().split("\n")
+
+    @property
+    def entities(self):
+        if self._entities is None:
+            self._entities = self._read_names("entities")
+        return self._entities
+
+    @property
+    def relations(self):
+        if self._relations is None:
+            self._relations = self._read_names("relations")
+        return self._relations
+
+    @property
+    def entity_ids(self):
+        if self._entity_ids is None:
+            self._entity_ids = {name: idx for idx, name in enumerate(self.entities)}
+        return self._entity_ids
+
+    @property
+    def relation_ids(self):
+        if self._relation_ids is None:
+            self._relation_ids = {name: idx for idx, name in enumerate(self.relations)}
+        return self._relation_ids
+
+
+def _kb_store_dir(output_dir):
+    return os.path.join(output_dir, "kb_store")
+
+
+def load_kb_store(kb_file, store_dir):
+    """Returns the `TripleStore` of the MetaQA `kb_file` in `store_dir`, building it on first use."""
+    if os.path.exists(store_dir):
+        return TripleStore(store_dir)
+    writer = TripleStoreWriter(store_dir)
+    for batch in iter_kb_batches(kb_file):
+        for triple in batch:
+            writer.add(*triple)
+    return writer.close()
+
+
+def kb_store_for_dataset(dataset):
+    """Opens the `TripleStore` written next to the Arrow files of a loaded MetaQA split.
+
+    Every config writes it, so the `topic_entity_id` column of a question split
+    can be resolved against the store of that same split.
+    """
+    return TripleStore(_kb_store_dir(os.path.dirname(dataset.cache_files[0]["filename"])))
+
+
+def _build_csr(sources, predicates, targets, num_entities, num_relations):
+    keys = sources.astype(np.int64) * num_relations + predicates
+    order = np.argsort(keys, kind="stable")
+    indptr = np.zeros(num_entities * num_relations + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=num_entities * num_relations), out=indptr[1:])
+    return indptr, targets[order], order.astype(np.int32)
+
+
+def _gather_ranges(starts, ends):
+    """Returns the concatenation of `range(start, end)` for every row, plus the row lengths."""
+    counts = ends - starts
+    offsets = starts - (np.cumsum(counts) - counts)
+    return np.repeat(offsets, counts) + np.arange(counts.sum()), counts
+
+
+class KBGraph:
+    """CSR adjacency index over a `TripleStore`, in both edge directions.
+
+    Edges are sorted by (node, relation), so `indptr[node * num_relations + relation]`
+    starts the neighbours of `node` over `relation`, and the whole row of `node`
+    spans `indptr[node * num_relations]` to `indptr[(node + 1) * num_relations]`.
+    Alongside each neighbour the index keeps the edge's position in the store,
+    so expansions can return the traversed subgraph.
+
+    All expansion methods work on a batch of queries at once: `seeds[i]` is the
+    topic entity of query `i`, and frontiers are returned as parallel
+    `(queries, entities)` arrays. Entity IDs outside `[0, num_entities)`, such
+    as the -1 `topic_entity_id` of questions whose topic entity is not in the
+    KB, have no neighbours; relation IDs outside `[0, num_relations)` raise a
+    ValueError.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        subjects = np.asarray(store.subjects)
+        predicates = np.asarray(store.predicates)
+        objects = np.asarray(store.objects)
+        self.num_entities = int(max(subjects.max(), objects.max())) + 1 if len(subjects) else 0
+        self.num_relations = int(predicates.max()) + 1 if len(predicates) else 0
+        self.forward = _build_csr(subjects, predicates, objects, self.num_entities, self.num_relations)
+        self.backward = _build_csr(objects, predicates, subjects, self.num_entities, self.num_relations)
+
+    def _step(self, queries, entities, relations, direction):
+        if direction == "forward":
+            indexes = [self.forward]
+        elif direction == "backward":
+            indexes = [self.backward]
+        elif direction == "both":
+            indexes = [self.forward, self.backward]
+        else:
+            raise ValueError("direction must be 'forward', 'backward' or 'both', got {!r}".format(direction))
+
+        num_relations = self.num_relations
+        queries = np.asarray(queries, dtype=np.int64)
+        entities = np.asarray(entities, dtype=np.int64)
+        known = (entities >= 0) & (entities < self.num_entities)
+        if not known.all():
+            queries, entities = queries[known], entities[known]
+        if relations is None:
+            owners = queries
+            row_starts = entities * num_relations
+            row_ends = row_starts + num_relations
+        else:
+            relations = np.asarray(relations, dtype=np.int64)
+            if len(relations) and (relations.min() < 0 or relations.max() >= num_relations):
+                raise ValueError("relation IDs must be in [0, {}), got {}".format(
+                    num_relations, relations[(relations < 0) | (relations >= num_relations)].tolist()))
+            owners = np.repeat(queries, len(relations))
+            row_starts = (entities[:, None] * num_relations + relations[None, :]).ravel()
+            row_ends = row_starts + 1
+
+        all_queries, all_neighbors, all_edges = [], [], []
+        for indptr, neighbors, edges in indexes:
+            positions, counts = _gather_ranges(indptr[row_starts], indptr[row_ends])
+            all_queries.append(np.repeat(owners, counts))
+            all_neighbors.append(neighbors[positions])
+            all_edges.append(edges[positions])
+        return np.concatenate(all_queries), np.concatenate(all_neighbors), np.concatenate(all_edges)
+
+    def _unique_pairs(self, queries, values, num_values):
+        keys = np.unique(queries.astype(np.int64) * num_values + values)
+        return keys // num_values, keys % num_values
+
+    def expand(self, queries, entities, relations=None, direction="both"):
+        """Expands a frontier of `(queries, entities)` pairs by one hop.
+
+        Args:
+          queries: query index of every frontier entity.
+          entities: entity IDs of the frontier.
+          relations: optional relation IDs to follow; all relations by default.
+          direction: "forward" (subject to object), "backward" or "both".
+        Returns:
+          The next frontier as `(queries, entities)`, deduplicated per query.
+        """
+        queries, neighbors, _ = self._step(queries, entities, relations, direction)
+        return self._unique_pairs(queries, neighbors, self.num_entities)
+
+    def k_hop(self, seeds, k, relations=None, direction="both"):
+        """Returns the frontiers reached from `seeds` after 1, ..., `k` hops."""
+        queries = np.arange(len(seeds))
+        entities = np.asarray(seeds)
+        frontiers = []
+        for _ in range(k):
+            queries, entities = self.expand(queries, entities, relations, direction)
+            frontiers.append((queries, entities))
+        return frontiers
+
+    def subgraph(self, seeds, k, relations=None, direction="both"):
+        """Returns `(queries, edges)`: the store positions of every edge within `k` hops of each seed."""
+        queries = np.arange(len(seeds))
+        entities = np.asarray(seeds)
+        edge_queries, edge_ids = [], []
+        for _ in range(k):
+            step_queries, neighbors, edges = self._step(queries, entities, relations, direction)
+            edge_queries.append(step_queries)
+            edge_ids.append(edges)
+            queries, entities = self._unique_pairs(step_queries, neighbors, self.num_entities)
+        return self._unique_pairs(np.concatenate(edge_queries), np.concatenate(edge_ids), len(self.store))
+
+
+_TOPIC_ENTITY = re.compile(r"\[(.+?)\]")
+
+
+def _save_arrays(out_dir, **arrays):
+    tmp_dir = "{}.tmp{}".format(out_dir, os.getpid())
+    os.makedirs(tmp_dir, exist_ok=True)
+    for name, values in arrays.items():
+        np.save(os.path.join(tmp_dir, name + ".npy"), values)
+    if os.path.exists(out_dir):
+        # A directory cannot be renamed over a non-empty one, so an index left
+        # by an earlier build is moved aside and replaced rather than kept.
+        stale_dir = "{}.stale{}".format(out_dir, os.getpid())
+        os.replace(out_dir, stale_dir)
+        shutil.rmtree(stale_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+
+
+def _topic_index_dir(output_dir, split):
+    return os.path.join(output_dir, "topic_index-{}".format(split))
+
+
+class TopicEntityIndex:
+    """Inverted index from KB entity ID to the questions whose topic entity it is.
+
+    Question IDs are row indices of the split the index was built for. The
+    index is stored CSR-style: the questions of entity `e` are
+    `question_ids[indptr[e]:indptr[e + 1]]`.
+    """
+
+    def __init__(self, index_dir, mmap_mode="r"):
+        self.indptr = np.lib.format.open_memmap(os.path.join(index_dir, "indptr.npy"), mode=mmap_mode)
+        self.question_ids = np.lib.format.open_memmap(os.path.join(index_dir, "question_ids.npy"), mode=mmap_mode)
+
+    @classmethod
+    def build(cls, index_dir, topic_entity_ids, num_entities):
+        """Writes the index for `topic_entity_ids`, where -1 marks questions without a KB topic entity."""
+        topic_entity_ids = np.asarray(topic_entity_ids, dtype=np.int64)
+        question_ids = np.flatnonzero(topic_entity_ids >= 0)
+        keys = topic_entity_ids[question_ids]
+        question_ids = question_ids[np.argsort(keys, kind="stable")]
+        indptr = np.zeros(num_entities + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys, minlength=num_entities), out=indptr[1:])
+        _save_arrays(index_dir, indptr=indptr, question_ids=question_ids.astype(np.int32))
+        return cls(index_dir)
+
+    @classmethod
+    def for_dataset(cls, dataset):
+        """Opens the index written next to the Arrow files of a loaded MetaQA question split."""
+        return cls(_topic_index_dir(os.path.dirname(dataset.cache_files[0]["filename"]), dataset.split))
+
+    @property
+    def num_entities(self):
+        return len(self.indptr) - 1
+
+    def questions(self, entity_id):
+        """Returns the questions of `entity_id`; empty for IDs outside the KB, such as -1."""
+        if not 0 <= entity_id < self.num_entities:
+            return self.question_ids[:0]
+        return self.question_ids[self.indptr[entity_id]:self.indptr[entity_id + 1]]
+
+    def lookup(self, entity_ids):
+        """Returns `(positions, question_ids)`: every question of `entity_ids[positions[i]]`.
+
+        IDs outside `[0, num_entities)`, such as the -1 of unknown topic
+        entities, match no questions and never appear in `positions`.
+        """
+        entity_ids = np.asarray(entity_ids, dtype=np.int64)
+        known = np.flatnonzero((entity_ids >= 0) & (entity_ids < self.num_entities))
+        positions, counts = _gather_ranges(self.indptr[entity_ids[known]], self.indptr[entity_ids[known] + 1])
+        return np.repeat(known, counts), self.question_ids[positions]
+
+
 class MetaQAConfig(datasets.BuilderConfig):
 
     def __init__(self, **kwargs):
@@ -141,7 +510,10 @@ class MetaQA(datasets.GeneratorBasedBuilder):
                     "question": datasets.Value("string"),
                     "answers": datasets.Sequence(
                         datasets.Value("string")
-                    )
+                    ),
+                    "topic_entity": datasets.Value("string"),
+                    "topic_entity_id": datasets.Value("int32"),
+                    "qtype": datasets.Value("string")
                 }
             )
         )
@@ -202,6 +574,8 @@ class MetaQA(datasets.GeneratorBasedBuilder):
                 name=datasets.Split.TRAIN,
                 gen_kwargs={
                     "data_file": os.path.join(data_dir, hop_dir, type_dir, "qa_train.txt"),
+                    "qtype_file": os.path.join(data_dir, hop_dir, "qa_train_qtype.txt"),
+                    "kb_file": os.path.join(data_dir, "kb.txt"),
                     "split": "train"
                 }
             ),
@@ -209,6 +583,8 @@ class MetaQA(datasets.GeneratorBasedBuilder):
                 name=datasets.Split.VALIDATION,
                 gen_kwargs={
                     "data_file": os.path.join(data_dir, hop_dir, type_dir, "qa_dev.txt"),
+                    "qtype_file": os.path.join(data_dir, hop_dir, "qa_dev_qtype.txt"),
+                    "kb_file": os.path.join(data_dir, "kb.txt"),
                     "split": "validation"
                 }
             ),
@@ -216,6 +592,8 @@ class MetaQA(datasets.GeneratorBasedBuilder):
                 name=datasets.Split.TEST,
                 gen_kwargs={
                     "data_file": os.path.join(data_dir, hop_dir, type_dir, "qa_test.txt"),
+                    "qtype_file": os.path.join(data_dir, hop_dir, "qa_test_qtype.txt"),
+                    "kb_file": os.path.join(data_dir, "kb.txt"),
                     "split": "test"
                 }
             )
@@ -224,25 +602,50 @@ class MetaQA(datasets.GeneratorBasedBuilder):
     def _generate_examples(self, data_file, split, **kwargs):
         """Yields examples."""
         if self.config.name == "kb":
-            all_lines = np.loadtxt(data_file, delimiter="|", dtype=str)
-            for idx, line in enumerate(all_lines):
-                print(line)
-                yield idx, {
-                    "subject": line[0],
-                    "predicate": line[1],
-                    "object": line[2]
-                }
+            # The integer-encoded store is built in the same pass as the rows.
+            store_dir = _kb_store_dir(self._output_dir)
+            writer = None if os.path.exists(store_dir) else TripleStoreWriter(store_dir)
+            idx = 0
+            for batch in iter_kb_batches(data_file):
+                for subject, predicate, object in batch:
+                    if writer is not None:
+                        writer.add(subject, predicate, object)
+                    yield idx, {
+                        "subject": subject,
+                        "predicate": predicate,
+                        "object": object
+                    }
+                    idx += 1
+            if writer is not None:
+                writer.close()
         elif "qtype" in self.config.name:
-            all_lines = open(data_file, encoding="utf-8").readlines()
-            for idx, line in enumerate(all_lines):
-                yield idx, {
-                    "qtype": line.strip()
-                }
+            with open(data_file, encoding="utf-8") as f:
+                for idx, line in enumerate(f):
+                    yield idx, {
+                        "qtype": line.strip()
+                    }
         else:
-            all_lines = np.loadtxt(data_file, delimiter="\t", dtype=str)
-            for idx, line in enumerate(all_lines):
-                answers = [str(answer) for answer in line[1].split("|")]
-                yield idx, {
-                    "question": line[0],
-                    "answers": answers
-                }
\ No newline at end of file
+            # Topic entity, its KB ID and the aligned qtype line are joined in
+            # the same pass, and the entity -> question index is written at the end.
+            entity_ids = load_kb_store(kwargs["kb_file"], _kb_store_dir(self._output_dir)).entity_ids
+            topic_entity_ids = array("i")
+            with open(kwargs["qtype_file"], encoding="utf-8") as qtypes:
+                for idx, (question, answers) in enumerate(iter_qa_pairs(data_file)):
+                    qtype = next(qtypes, None)
+                    if qtype is None:
+                        raise ValueError("{} has no qtype line for question {} of {}".format(
+                            kwargs["qtype_file"], idx + 1, data_file))
+                    match = _TOPIC_ENTITY.search(question)
+                    topic_entity = match.group(1) if match else ""
+                    topic_entity_ids.append(entity_ids.get(topic_entity, -1))
+                    yield idx, {
+                        "question": question,
+                        "answers": answers,
+                        "topic_entity": topic_entity,
+                        "topic_entity_id": topic_entity_ids[-1],
+                        "qtype": qtype.strip()
+                    }
+                if any(line.strip() for line in qtypes):
+                    raise ValueError("{} has more lines than the {} questions of {}".format(
+                        kwargs["qtype_file"], len(topic_entity_ids), data_file))
+            TopicEntityIndex.build(_topic_index_dir(self._output_dir, split), topic_entity_ids, len(entity_ids))
\ No newline at end of file
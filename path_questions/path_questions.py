@@ -2,6 +2,10 @@
 
 import json
 import os
+import shutil
+from array import array
+
+import numpy as np
 
 import datasets
 
@@ -40,6 +44,133 @@ _PATHQUESTIONS_URLS = {
     "PQL2H-KB": "https://raw.githubusercontent.com/zmtkeke/IRN/master/PathQuestion/PQL2-KB.txt"
 }
 
+
+def _kb_store_dir(kb_file):
+    return os.path.splitext(kb_file)[0] + "_store"
+
+
+# `TripleStoreWriter` and `TripleStore` are copied verbatim from
+# meta_qa/meta_qa.py (loading scripts cannot import each other); keep the two
+# copies in sync.
+class TripleStoreWriter:
+    """Interns triples into entity/relation dictionaries and int32 columns.
+
+    Call `add` for every triple and `close` once to write the store to
+    `store_dir`. The store is written to a temporary directory first and moved
+    into place at the end, so readers never see a half-written store.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.entity_ids = {}
+        self.relation_ids = {}
+        self.subjects = array("i")
+        self.predicates = array("i")
+        self.objects = array("i")
+
+    def add(self, subject, predicate, object):
+        entity_ids = self.entity_ids
+        self.subjects.append(entity_ids.setdefault(subject, len(entity_ids)))
+        self.predicates.append(self.relation_ids.setdefault(predicate, len(self.relation_ids)))
+        self.objects.append(entity_ids.setdefault(object, len(entity_ids)))
+
+    def close(self):
+        tmp_dir = "{}.tmp{}".format(self.store_dir, os.getpid())
+        os.makedirs(tmp_dir, exist_ok=True)
+        for name in ["subjects", "predicates", "objects"]:
+            np.save(os.path.join(tmp_dir, name + ".npy"), np.frombuffer(getattr(self, name), dtype=np.int32))
+        for name, ids in [("entities", self.entity_ids), ("relations", self.relation_ids)]:
+            with open(os.path.join(tmp_dir, name + ".txt"), "w", encoding="utf-8") as f:
+                f.write("\n".join(ids))
+        try:
+            os.rename(tmp_dir, self.store_dir)
+        except OSError:
+            # Another process finished the same store first.
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return TripleStore(self.store_dir)
+
+
+class TripleStore:
+    """Integer-encoded KB built by `TripleStoreWriter`.
+
+    `subjects`, `predicates` and `objects` are int32 arrays memory-mapped from
+    `.npy` files, so opening a store costs a few syscalls and the pages are
+    shared by every process that maps them. The string dictionaries are only
+    read on first access.
+    """
+
+    def __init__(self, store_dir, mmap_mode="r"):
+        self.store_dir = store_dir
+        # `open_memmap` rather than `np.load`: `datasets` swaps `np.load` in
+        # loading scripts for a wrapper that cannot memory-map.
+        self.subjects = np.lib.format.open_memmap(os.path.join(store_dir, "subjects.npy"), mode=mmap_mode)
+        self.predicates = np.lib.format.open_memmap(os.path.join(store_dir, "predicates.npy"), mode=mmap_mode)
+        self.objects = np.lib.format.open_memmap(os.path.join(store_dir, "objects.npy"), mode=mmap_mode)
+        self._entities = None
+        self._relations = None
+        self._entity_ids = None
+        self._relation_ids = None
+
+    def __len__(self):
+        return len(self.subjects)
+
+    def _read_names(self, name):
+        with open(os.path.join(self.store_dir, name + ".txt"), encoding="utf-8") as f:
+            return f.read().split("\n")
+
+    @property
+    def entities(self):
+        if self._entities is None:
+            self._entities = self._read_names("entities")
+        return self._entities
+
+    @property
+    def relations(self):
+        if self._relations is None:
+            self._relations = self._read_names("relations")
+        return self._relations
+
+    @property
+    def entity_ids(self):
+        if self._entity_ids is None:
+            self._entity_ids = {name: idx for idx, name in enumerate(self.entities)}
+        return self._entity_ids
+
+    @property
+    def relation_ids(self):
+        if self._relation_ids is None:
+            self._relation_ids = {name: idx for idx, name in enumerate(self.relations)}
+        return self._relation_ids
+
+
+def iter_kb_triples(kb_file):
+    """Yields (subject, predicate, object) from a tab-separated PathQuestions KB file.
+
+    Blank lines are skipped; a line without exactly three fields raises a
+    ValueError naming the file and line number.
+    """
+    with open(kb_file, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            fields = line.split("\t")
+            if len(fields) != 3:
+                raise ValueError("{}:{}: expected 3 tab-separated fields, got {}".format(kb_file, line_number, len(fields)))
+            yield tuple(fields)
+
+
+def load_kb_store(kb_file):
+    """Returns the `TripleStore` for a downloaded PathQuestions KB file, building it on first use."""
+    store_dir = _kb_store_dir(kb_file)
+    if os.path.exists(store_dir):
+        return TripleStore(store_dir)
+    writer = TripleStoreWriter(store_dir)
+    for subject, predicate, object in iter_kb_triples(kb_file):
+        writer.add(subject, predicate, object)
+    return writer.close()
+
+
 class PathQuestionsConfig(datasets.BuilderConfig):
     """BuilderConfig for PathQuestions"""
     def __init__(self,
@@ -150,8 +281,8 @@ class PathQuestions(datasets.GeneratorBasedBuilder):
         ]
 
     def _generate_examples(self, data_file, split, **kwargs):
-        with open(data_file, encoding="utf-8") as f:
-            if self.config.name in ["PQ2H", "PQ3H", "PQL2H", "PQL3H"]:
+        if self.config.name in ["PQ2H", "PQ3H", "PQL2H", "PQL3H"]:
+            with open(data_file, encoding="utf-8") as f:
                 pathquestions = f.readlines()
                 for idx, line in enumerate(pathquestions):
                     question, answers, path = line.strip().split("\t")
@@ -164,12 +295,16 @@ class PathQuestions(datasets.GeneratorBasedBuilder):
                         "answer_set": answer_set,
                         "path": path
                     }
-            else:
-                kbs = f.readlines()
-                for idx, line in enumerate(kbs):
-                    subject, predicate, object = line.strip().split("\t")
-                    yield idx, {
-                        "subject": subject,
-                        "predicate": predicate,
-                        "object": object
-                    }
+        else:
+            store_dir = _kb_store_dir(data_file)
+            writer = None if os.path.exists(store_dir) else TripleStoreWriter(store_dir)
+            for idx, (subject, predicate, object) in enumerate(iter_kb_triples(data_file)):
+                if writer is not None:
+                    writer.add(subject, predicate, object)
+                yield idx, {
+                    "subject": subject,
+                    "predicate": predicate,
+                    "object": object
+                }
+            if writer is not None:
+                writer.close()
@@ -23,19 +23,143 @@ _QALD10_URLS = {
     "test": "https://raw.githubusercontent.com/KGQA/QALD_10/main/data/qald_10/qald_10.json"
 }
 
+_QUESTION_FEATURE = datasets.Sequence(
+    {
+        "language": datasets.Value("string"),
+        "string": datasets.Value("string"),
+        "keywords": datasets.Value("string")
+    }
+)
+
+_ANSWERS_FEATURE = {
+    "vars": datasets.Sequence(datasets.Value("string")),
+    "boolean": datasets.Value("bool"),
+    "bindings": datasets.Sequence(
+        {
+            "row": datasets.Value("int32"),
+            "var": datasets.Value("string"),
+            "type": datasets.Value("string"),
+            "value": datasets.Value("string"),
+            "datatype": datasets.Value("string"),
+            "lang": datasets.Value("string")
+        }
+    )
+}
+
+
+# `structured_question` and `structured_answers` are shared verbatim by
+# qald/qald-9.py and qald/qald-10.py (loading scripts cannot import each
+# other); keep the two copies in sync.
+def structured_question(question):
+    """Returns the language, string and keywords of the entries of a QALD `question` list.
+
+    The result is in the struct-of-lists layout `datasets.Sequence` stores a
+    dict feature in: one list per field, aligned by entry.
+    """
+    return {
+        "language": [entry.get("language") for entry in question],
+        "string": [entry.get("string") for entry in question],
+        "keywords": [entry.get("keywords") for entry in question]
+    }
+
+
+def structured_answers(answers):
+    """Flattens a QALD `answers` list of SPARQL results into one record.
+
+    Every bound variable of every result row becomes one entry of `bindings`;
+    `row` numbers the result rows, continuing across the answer objects.
+    Like `structured_question`, `bindings` holds one list per field.
+    """
+    variables, boolean = [], None
+    bindings = {"row": [], "var": [], "type": [], "value": [], "datatype": [], "lang": []}
+    row = 0
+    for answer in answers:
+        for var in answer.get("head", {}).get("vars", []):
+            if var not in variables:
+                variables.append(var)
+        if "boolean" in answer:
+            boolean = answer["boolean"]
+        for binding in answer.get("results", {}).get("bindings", []):
+            for var, term in binding.items():
+                bindings["row"].append(row)
+                bindings["var"].append(var)
+                bindings["type"].append(term.get("type"))
+                bindings["value"].append(term.get("value"))
+                bindings["datatype"].append(term.get("datatype"))
+                bindings["lang"].append(term.get("xml:lang"))
+            row += 1
+    return {"vars": variables, "boolean": boolean, "bindings": bindings}
+
+
+# `LanguageIndex` and `QALDQuestions._generate_language_rows` are shared
+# verbatim by qald/qald-9.py and qald/qald-10.py; keep the two copies in sync.
+class LanguageIndex:
+    """Row range of every language in a split of a `*-languages` config.
+
+    The rows of those configs are grouped by language, so a language subset is
+    a contiguous slice of the split:
+
+        index = LanguageIndex.for_dataset(qald["train"])
+        german = index.select(qald["train"], "de")
+    """
+
+    def __init__(self, ranges):
+        self.ranges = ranges
+
+    @staticmethod
+    def path(output_dir, split):
+        return os.path.join(output_dir, "language_index-{}.json".format(split))
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.ranges, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    @classmethod
+    def for_dataset(cls, dataset):
+        """Opens the index written alongside a loaded `*-languages` split."""
+        return cls.load(cls.path(os.path.dirname(dataset.cache_files[0]["filename"]), dataset.split))
+
+    @property
+    def languages(self):
+        return sorted(self.ranges)
+
+    def rows(self, language):
+        """Returns the `(start, stop)` row range of `language`, empty if it does not occur."""
+        start, stop = self.ranges.get(language, (0, 0))
+        return start, stop
+
+    def select(self, dataset, language):
+        """Returns the rows of `language` as a contiguous slice of `dataset`."""
+        return dataset.select(range(*self.rows(language)))
+
+
 class QALDConfig(datasets.BuilderConfig):
     """BuilderConfig for QALD-10"""
     def __init__(self,
                  data_url,
                  data_dir,
+                 structured=False,
+                 by_language=False,
                  **kwargs):
         """BuilderConfig for QALD-10.
         Args:
+          structured: store `question` and `answers` as nested features instead
+            of JSON strings.
+          by_language: emit one row per (question, language), grouped by
+            language.
           **kwargs: keyword arguments forwarded to super.
         """
         super(QALDConfig, self).__init__(**kwargs)
         self.data_url = data_url
         self.data_dir = data_dir
+        self.structured = structured
+        self.by_language = by_language
 
 class QALDQuestions(datasets.GeneratorBasedBuilder):
     """QALD-10."""
@@ -46,9 +170,44 @@ class QALDQuestions(datasets.GeneratorBasedBuilder):
             data_url="",
             data_dir="QALD-10"
         ),
+        QALDConfig(
+            name="qald10-structured",
+            description="QALD-10 with nested question and answer features",
+            data_url="",
+            data_dir="QALD-10",
+            structured=True
+        ),
+        QALDConfig(
+            name="qald10-languages",
+            description="QALD-10 with one row per question and language",
+            data_url="",
+            data_dir="QALD-10",
+            by_language=True
+        ),
     ]
 
     def _info(self):
+        if self.config.by_language:
+            return datasets.DatasetInfo(
+                description=_DESCRIPTION,
+                supervised_keys=None,
+                homepage=_URL,
+                citation=_CITATION,
+                features=datasets.Features(
+                    {
+                        "id": datasets.Value("string"),
+                        "language": datasets.Value("string"),
+                        "string": datasets.Value("string"),
+                        "keywords": datasets.Value("string")
+                    }
+                )
+            )
+        if self.config.structured:
+            question = _QUESTION_FEATURE
+            answers = _ANSWERS_FEATURE
+        else:
+            question = datasets.Value("string")
+            answers = datasets.Value("string")
         return datasets.DatasetInfo(
             description=_DESCRIPTION,
             supervised_keys=None,
@@ -57,13 +216,13 @@ class QALDQuestions(datasets.GeneratorBasedBuilder):
             features=datasets.Features(
                 {
                     "id": datasets.Value("string"),
-                    "question": datasets.Value("string"),
+                    "question": question,
                     "query": datasets.Features(
                         {
                             "sparql": datasets.Value("string")
                         }
                     ),
-                    "answers": datasets.Value("string")
+                    "answers": answers
                 }
             )
         )
@@ -95,12 +254,39 @@ class QALDQuestions(datasets.GeneratorBasedBuilder):
             )
         ]
 
+    def _generate_language_rows(self, questions, split):
+        by_language = {}
+        for question in questions:
+            for entry in question["question"]:
+                by_language.setdefault(entry["language"], []).append((question["id"], entry))
+        ranges = {}
+        idx = 0
+        for language in sorted(by_language):
+            start = idx
+            for question_id, entry in by_language[language]:
+                yield idx, {
+                    "id": question_id,
+                    "language": language,
+                    "string": entry.get("string"),
+                    "keywords": entry.get("keywords")
+                }
+                idx += 1
+            ranges[language] = [start, idx]
+        LanguageIndex(ranges).save(LanguageIndex.path(self._output_dir, split))
+
     def _generate_examples(self, data_file, **kwargs):
         with open(data_file, encoding="utf-8") as f:
             qald = json.load(f)
+            if self.config.by_language:
+                yield from self._generate_language_rows(qald["questions"], kwargs["split"])
+                return
             for idx, question in enumerate(qald["questions"]):
-                question["question"] = json.dumps(question["question"])
-                question["answers"] = json.dumps(question["answers"])
+                if self.config.structured:
+                    question["question"] = structured_question(question["question"])
+                    question["answers"] = structured_answers(question["answers"])
+                else:
+                    question["question"] = json.dumps(question["question"])
+                    question["answers"] = json.dumps(question["answers"])
 
                 if kwargs["split"]== "test":
                     del question["aggregation"]
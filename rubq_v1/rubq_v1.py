@@ -37,6 +37,22 @@ _RUBQ_URLS = {
     "test": "https://raw.githubusercontent.com/vladislavneon/RuBQ/master/RuBQ_1.0/RuBQ_1.0_test.json"
 }
 
+
+# `typed_answers` is shared verbatim with rubq_v2/rubq_v2.py (loading scripts
+# cannot import each other); keep the two copies in sync.
+def typed_answers(answers):
+    """Keeps the Wikidata value, label and value type of each RuBQ answer.
+
+    The result is in the struct-of-lists layout `datasets.Sequence` stores a
+    dict feature in: one list per field, aligned by answer.
+    """
+    return {
+        "value": [answer.get("value") for answer in answers],
+        "label": [answer.get("label") for answer in answers],
+        "type": [answer.get("type") for answer in answers]
+    }
+
+
 class RuBQConfig(datasets.BuilderConfig):
     """BuilderConfig for RuBQ"""
     def __init__(self,
@@ -81,6 +97,13 @@ class RuBQ(datasets.GeneratorBasedBuilder):
                         datasets.Value("string")
                     ),
                     "answers": datasets.Value("string"),
+                    "typed_answers": datasets.Sequence(
+                        {
+                            "value": datasets.Value("string"),
+                            "label": datasets.Value("string"),
+                            "type": datasets.Value("string")
+                        }
+                    ),
                     "tags": datasets.Sequence(
                         datasets.Value("string")
                     ),
@@ -118,5 +141,6 @@ class RuBQ(datasets.GeneratorBasedBuilder):
         with open(data_file, encoding="utf-8") as f:
             rubq = json.load(f)
             for idx, question in enumerate(rubq):
+                question["typed_answers"] = typed_answers(question["answers"])
                 question["answers"] = json.dumps(question["answers"])
                 yield idx, question
@@ -1,9 +1,12 @@
 """RuBQ 2.0: An Innovated Russian Question Answering Dataset."""
 
+import itertools
 import json
 import os
 import ast
 
+import numpy as np
+import pyarrow as pa
 import datasets
 
 logger = datasets.logging.get_logger(__name__)
@@ -27,9 +30,79 @@ _URL = "https://github.com/vladislavneon/RuBQ"
 
 _RUBQ2_URLS = {
     "dev": "https://raw.githubusercontent.com/vladislavneon/RuBQ/master/RuBQ_2.0/RuBQ_2.0_dev.json",
-    "test": "https://raw.githubusercontent.com/vladislavneon/RuBQ/master/RuBQ_2.0/RuBQ_2.0_test.json"
+    "test": "https://raw.githubusercontent.com/vladislavneon/RuBQ/master/RuBQ_2.0/RuBQ_2.0_test.json",
+    "paragraphs": "https://raw.githubusercontent.com/vladislavneon/RuBQ/master/RuBQ_2.0/RuBQ_2.0_paragraphs.json"
 }
 
+
+# `typed_answers` is shared verbatim with rubq_v1/rubq_v1.py (loading scripts
+# cannot import each other); keep the two copies in sync.
+def typed_answers(answers):
+    """Keeps the Wikidata value, label and value type of each RuBQ answer.
+
+    The result is in the struct-of-lists layout `datasets.Sequence` stores a
+    dict feature in: one list per field, aligned by answer.
+    """
+    return {
+        "value": [answer.get("value") for answer in answers],
+        "label": [answer.get("label") for answer in answers],
+        "type": [answer.get("type") for answer in answers]
+    }
+
+
+class ParagraphIndex:
+    """Maps RuBQ 2.0 paragraph uids to rows of the `rubq2-paragraphs` config.
+
+    Questions carry the uids of their paragraphs in `paragraphs_with_answer`
+    and `paragraphs_all_related`. `gather` resolves the uids of a whole batch
+    with one `searchsorted` and fetches the paragraphs with one Arrow take:
+
+        index = ParagraphIndex.from_dataset(paragraphs)
+        offsets, batch = index.gather(paragraphs, questions[:32]["paragraphs_all_related"])
+        # paragraphs of question i: batch.slice(offsets[i], offsets[i + 1] - offsets[i])
+    """
+
+    def __init__(self, uids):
+        uids = np.asarray(uids, dtype=np.int64)
+        self.order = np.argsort(uids, kind="stable")
+        self.sorted_uids = uids[self.order]
+
+    @classmethod
+    def from_dataset(cls, paragraphs):
+        return cls(paragraphs.with_format("arrow")["uid"].to_numpy())
+
+    def rows(self, uids):
+        """Returns the paragraph row of every uid, or -1 where the uid is unknown."""
+        uids = np.asarray(uids, dtype=np.int64)
+        if not len(self.sorted_uids):
+            return np.full(len(uids), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.sorted_uids, uids), len(self.sorted_uids) - 1)
+        return np.where(self.sorted_uids[positions] == uids, self.order[positions], -1)
+
+    def gather(self, paragraphs, uid_lists):
+        """Fetches the paragraphs of a batch of uid lists.
+
+        `uid_lists` is a list of uid lists or an Arrow list array. Returns
+        `(offsets, table)`: `table` holds the paragraph rows of all lists
+        back to back, and list `i` owns rows `offsets[i]:offsets[i + 1]`.
+        """
+        if isinstance(uid_lists, pa.ChunkedArray):
+            uid_lists = uid_lists.combine_chunks()
+        if isinstance(uid_lists, pa.ListArray):
+            offsets = uid_lists.offsets.to_numpy().astype(np.int64)
+            offsets -= offsets[0]
+            uids = uid_lists.flatten().to_numpy(zero_copy_only=False)
+        else:
+            lengths = np.fromiter(map(len, uid_lists), dtype=np.int64, count=len(uid_lists))
+            offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=offsets[1:])
+            uids = np.fromiter(itertools.chain.from_iterable(uid_lists), dtype=np.int64, count=offsets[-1])
+        rows = self.rows(uids)
+        if (rows < 0).any():
+            raise ValueError("Unknown paragraph uids: {}".format(np.unique(uids[rows < 0]).tolist()))
+        return offsets, paragraphs.with_format("arrow")[rows]
+
+
 class RuBQ2Config(datasets.BuilderConfig):
     """BuilderConfig for RuBQ 2.0"""
     def __init__(self,
@@ -52,10 +125,30 @@ class RuBQ2Questions(datasets.GeneratorBasedBuilder):
             description="RuBQ2",
             data_url="",
             data_dir="RuBQ2"
+        ),
+        RuBQ2Config(
+            name="rubq2-paragraphs",
+            description="Wikipedia paragraphs of RuBQ2",
+            data_url=_RUBQ2_URLS["paragraphs"],
+            data_dir="RuBQ2"
         )
     ]
 
     def _info(self):
+        if self.config.name == "rubq2-paragraphs":
+            return datasets.DatasetInfo(
+                description=_DESCRIPTION,
+                supervised_keys=None,
+                homepage=_URL,
+                citation=_CITATION,
+                features=datasets.Features(
+                    {
+                        "uid": datasets.Value("int32"),
+                        "ru_wiki_pageid": datasets.Value("int32"),
+                        "text": datasets.Value("string")
+                    }
+                )
+            )
         return datasets.DatasetInfo(
             description=_DESCRIPTION,
             supervised_keys=None,
@@ -74,7 +167,20 @@ class RuBQ2Questions(datasets.GeneratorBasedBuilder):
                         datasets.Value("string")
                     ),
                     "answers": datasets.Value("string"),
+                    "typed_answers": datasets.Sequence(
+                        {
+                            "value": datasets.Value("string"),
+                            "label": datasets.Value("string"),
+                            "type": datasets.Value("string")
+                        }
+                    ),
                     "paragraphs_uids": datasets.Value("string"),
+                    "paragraphs_with_answer": datasets.Sequence(
+                        datasets.Value("int32")
+                    ),
+                    "paragraphs_all_related": datasets.Sequence(
+                        datasets.Value("int32")
+                    ),
                     "tags": datasets.Sequence(
                         datasets.Value("string")
                     ),
@@ -86,6 +192,17 @@ class RuBQ2Questions(datasets.GeneratorBasedBuilder):
 
     def _split_generators(self, dl_manager):
         data_dir = None
+        if self.config.name == "rubq2-paragraphs":
+            paragraphs_file = dl_manager.download(self.config.data_url)
+            return [
+                datasets.SplitGenerator(
+                    name=datasets.Split.TRAIN,
+                    gen_kwargs={
+                        "data_file": paragraphs_file,
+                        "split": "train"
+                    }
+                )
+            ]
         rubq2_files = dl_manager.download(
             {
                 "dev": _RUBQ2_URLS["dev"],
@@ -112,7 +229,18 @@ class RuBQ2Questions(datasets.GeneratorBasedBuilder):
     def _generate_examples(self, data_file, **kwargs):
         with open(data_file, encoding="utf-8") as f:
             rubq2 = json.load(f)
+            if self.config.name == "rubq2-paragraphs":
+                for idx, paragraph in enumerate(rubq2):
+                    yield idx, {
+                        "uid": paragraph["uid"],
+                        "ru_wiki_pageid": paragraph.get("ru_wiki_pageid"),
+                        "text": paragraph["text"]
+                    }
+                return
             for idx, question in enumerate(rubq2):
+                question["typed_answers"] = typed_answers(question["answers"])
                 question["answers"] = json.dumps(question["answers"])
+                question["paragraphs_with_answer"] = question["paragraphs_uids"].get("with_answer", [])
+                question["paragraphs_all_related"] = question["paragraphs_uids"].get("all_related", [])
                 question["paragraphs_uids"] = json.dumps(question["paragraphs_uids"])
                 yield idx, question
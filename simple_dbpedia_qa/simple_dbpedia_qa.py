@@ -2,7 +2,9 @@
 
 import json
 import os
+from array import array
 
+import numpy as np
 import datasets
 
 logger = datasets.logging.get_logger(__name__)
@@ -33,6 +35,120 @@ _DATA_URLS = {
     "test": "https://raw.githubusercontent.com/castorini/SimpleDBpediaQA/master/V1/test.json"
 }
 
+
+# `CandidateIndex` is shared verbatim by simple_dbpedia_qa/simple_dbpedia_qa.py
+# and simple_wikidata_qa/simple_wikidata_qa.py (loading scripts cannot import
+# each other); keep the two copies in sync.
+class CandidateIndex:
+    """Candidate relations per subject, and relation frequencies, of one split.
+
+    For each subject the index lists every relation some question about that
+    subject uses, with the number of such questions. `relation_counts` counts
+    each relation over the whole split. Subjects are stored sorted, and their
+    ids are their positions, so `subject_ids` resolves a batch of subjects
+    with one `np.searchsorted`. Building the dataset writes one index per
+    split next to the Arrow files.
+
+        index = CandidateIndex.for_dataset(dataset["train"])
+        offsets, relations, counts = index.candidates(subjects)
+        # candidates of question i: relations[offsets[i]:offsets[i + 1]]
+    """
+
+    def __init__(self, subjects, relations, indptr, candidate_relations, pair_counts, relation_counts):
+        self.subjects = subjects
+        self.relations = relations
+        self.indptr = indptr
+        self.candidate_relations = candidate_relations
+        self.pair_counts = pair_counts
+        self.relation_counts = relation_counts
+
+    @staticmethod
+    def directory(output_dir, split):
+        return os.path.join(output_dir, "candidate_index-{}".format(split))
+
+    @classmethod
+    def build(cls, pairs):
+        """Builds the index from (subject, relation) pairs, one per question and relation."""
+        subject_names, relation_ids = [], {}
+        relations = array("i")
+        for subject, relation in pairs:
+            subject_names.append(subject)
+            relations.append(relation_ids.setdefault(relation, len(relation_ids)))
+        subjects, subject_codes = np.unique(np.asarray(subject_names, dtype=str), return_inverse=True)
+        relations = np.frombuffer(relations, dtype=np.int32)
+        num_relations = max(len(relation_ids), 1)
+        keys, pair_counts = np.unique(subject_codes.astype(np.int64) * num_relations + relations, return_counts=True)
+        indptr = np.zeros(len(subjects) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys // num_relations, minlength=len(subjects)), out=indptr[1:])
+        return cls(
+            subjects,
+            list(relation_ids),
+            indptr,
+            (keys % num_relations).astype(np.int32),
+            pair_counts.astype(np.int32),
+            np.bincount(relations, minlength=len(relation_ids)).astype(np.int64)
+        )
+
+    def save(self, index_dir):
+        os.makedirs(index_dir, exist_ok=True)
+        with open(os.path.join(index_dir, "relations.json"), "w", encoding="utf-8") as f:
+            json.dump(self.relations, f)
+        for name in ["subjects", "indptr", "candidate_relations", "pair_counts", "relation_counts"]:
+            np.save(os.path.join(index_dir, name + ".npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, index_dir):
+        with open(os.path.join(index_dir, "relations.json"), encoding="utf-8") as f:
+            relations = json.load(f)
+        subjects, indptr, candidate_relations, pair_counts, relation_counts = [
+            np.lib.format.open_memmap(os.path.join(index_dir, name + ".npy"), mode="r")
+            for name in ["subjects", "indptr", "candidate_relations", "pair_counts", "relation_counts"]
+        ]
+        return cls(subjects, relations, indptr, candidate_relations, pair_counts, relation_counts)
+
+    @classmethod
+    def for_dataset(cls, dataset):
+        """Opens the index written alongside a loaded split."""
+        return cls.load(cls.directory(os.path.dirname(dataset.cache_files[0]["filename"]), dataset.split))
+
+    def subject_ids(self, subjects):
+        """Maps subjects to ids, -1 for subjects that do not occur in the split."""
+        subjects = np.asarray(subjects, dtype=str)
+        if not len(self.subjects):
+            return np.full(len(subjects), -1, dtype=np.int64)
+        positions = np.searchsorted(self.subjects, subjects)
+        clipped = np.minimum(positions, len(self.subjects) - 1)
+        return np.where(self.subjects[clipped] == subjects, clipped, -1).astype(np.int64)
+
+    def candidates(self, subjects):
+        """Returns the candidate relations of a batch of subjects.
+
+        `subjects` are subject names or an integer array of subject ids. Returns
+        `(offsets, relations, counts)`: subject `i` has the relation ids
+        `relations[offsets[i]:offsets[i + 1]]`, each asked about `counts[...]`
+        times. Unknown subjects, and ids outside the index such as -1, get no
+        candidates.
+        """
+        if isinstance(subjects, np.ndarray) and subjects.dtype.kind in "iu":
+            ids = subjects.astype(np.int64)
+        else:
+            ids = self.subject_ids(subjects)
+        known = (ids >= 0) & (ids < len(self.indptr) - 1)
+        ids = np.where(known, ids, 0)
+        starts = self.indptr[ids]
+        lengths = np.where(known, self.indptr[ids + known] - starts, 0)
+        offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        positions = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return offsets, self.candidate_relations[positions], self.pair_counts[positions]
+
+
+def _relation(predicate):
+    if predicate.get("Direction") == "backward":
+        return "^" + predicate["Predicate"]
+    return predicate["Predicate"]
+
+
 class SimpleDBpediaQAConfig(datasets.BuilderConfig):
     """BuilderConfig for SimpleDBpediaQA"""
     def __init__(self,
@@ -116,5 +232,9 @@ class SimpleDBpediaQA(datasets.GeneratorBasedBuilder):
     def _generate_examples(self, data_file, **kwargs):
         with open(data_file, encoding="utf8") as f:
             qa_data = json.load(f)
+            pairs = []
             for idx, question in enumerate(qa_data["Questions"]):
+                for predicate in question["PredicateList"]:
+                    pairs.append((question["Subject"], _relation(predicate)))
                 yield idx, question
+        CandidateIndex.build(pairs).save(CandidateIndex.directory(self._output_dir, kwargs["split"]))
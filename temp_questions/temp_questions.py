@@ -2,7 +2,11 @@
 
 import json
 import os
+import re
 
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
 import datasets
 
 logger = datasets.logging.get_logger(__name__)
@@ -23,6 +27,141 @@ _DESCRIPTION = """\
 
 _URL = "https://tequila.mpi-inf.mpg.de/"
 
+SIGNALS = ["NO SIGNAL", "BEFORE", "AFTER", "START", "FINISH", "OVERLAP", "EQUAL", "DURING", "ORDINAL", "OTHER"]
+QUESTION_TYPES = ["EXPLICIT", "IMPLICIT", "TEMP.ANS", "ORDINAL", "OTHER"]
+
+_MONTHS = {
+    name: number
+    for number, names in enumerate([
+        ("january", "jan"), ("february", "feb"), ("march", "mar"), ("april", "apr"), ("may",),
+        ("june", "jun"), ("july", "jul"), ("august", "aug"), ("september", "sep", "sept"),
+        ("october", "oct"), ("november", "nov"), ("december", "dec")
+    ], 1)
+    for name in names
+}
+_ISO_DATE = re.compile(r"^([+-]?\d+)-(\d{1,2})-(\d{1,2})(?:[T\s]|$)")
+_YEAR = re.compile(r"^(\d{4})$")
+# Written dates need a three- or four-digit year: "March 15" is not a date.
+_MONTH_FIRST = re.compile(r"^([a-z]+)\.?\s+(?:(\d{1,2})(?:st|nd|rd|th)?,?\s+)?(\d{3,4})$")
+_DAY_FIRST = re.compile(r"^(\d{1,2})(?:st|nd|rd|th)?\s+([a-z]+)\.?,?\s+(\d{3,4})$")
+
+
+def _days_from_civil(year, month, day):
+    """Converts a proleptic Gregorian date to days since 1970-01-01, for any year."""
+    year -= month <= 2
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+
+def _days_in_month(year, month):
+    if month == 2:
+        return 29 if year % 4 == 0 and (year % 100 != 0 or year % 400 == 0) else 28
+    return 30 if month in (4, 6, 9, 11) else 31
+
+
+def parse_day(value):
+    """Turns a TempQuestions gold answer into a day offset from 1970-01-01 if it is a date.
+
+    Accepts ISO dates, four-digit years ("1990") and written dates such as
+    "May 4, 1990", "4 May 1990" or "May 1990"; missing months and days count
+    as the first. Returns None for every other answer, including days past
+    the end of their month such as "February 29, 1900".
+    """
+    value = (value or "").strip().lower()
+    match = _ISO_DATE.match(value)
+    if match is not None:
+        year, month, day = int(match.group(1)), int(match.group(2)), int(match.group(3))
+    elif _YEAR.match(value):
+        year, month, day = int(value), 1, 1
+    else:
+        match = _MONTH_FIRST.match(value)
+        if match is not None:
+            month_name, day, year = match.group(1), match.group(2) or "1", match.group(3)
+        else:
+            match = _DAY_FIRST.match(value)
+            if match is None:
+                return None
+            day, month_name, year = match.groups()
+        if month_name not in _MONTHS:
+            return None
+        year, month, day = int(year), _MONTHS[month_name], int(day)
+    month, day = max(month, 1), max(day, 1)
+    if month > 12 or day > _days_in_month(year, month):
+        return None
+    return _days_from_civil(year, month, day)
+
+
+def _normalize_labels(values, names):
+    labels = []
+    for value in values or []:
+        label = value.strip().upper()
+        labels.append(label if label in names else "OTHER")
+    return labels
+
+
+def split_answers(answers):
+    """Separates TempQuestions gold answers into entity names, day offsets and other values.
+
+    TempQuestions gives answers as names rather than KB IDs, so
+    `answer_entities` holds the names of the non-date answers; purely numeric
+    answers that are not years go to `answer_values`.
+    """
+    entities, days, values = [], [], []
+    for answer in answers or []:
+        day = parse_day(answer)
+        if day is not None:
+            days.append(day)
+        elif re.match(r"^[+-]?[\d.,]+$", answer.strip()):
+            values.append(answer)
+        else:
+            entities.append(answer)
+    return entities, days, values
+
+
+def _contains(list_column, value):
+    if isinstance(list_column, pa.ChunkedArray):
+        list_column = list_column.combine_chunks()
+    hits = np.zeros(len(list_column), dtype=bool)
+    parents = pc.list_parent_indices(list_column).to_numpy()
+    values = pc.list_flatten(list_column).to_numpy(zero_copy_only=False)
+    hits[parents[values == value]] = True
+    return hits
+
+
+def _non_empty(list_column):
+    return pc.fill_null(pc.list_value_length(list_column), 0).to_numpy() > 0
+
+
+def temporal_mask(dataset, signal=None, question_type=None, answer=None):
+    """Computes a row mask for TempQuestions from the typed columns, without decoding rows.
+
+    Args:
+      signal: required temporal signal, such as "AFTER".
+      question_type: required question type, such as "IMPLICIT".
+      answer: "entity", "date" or "value"; requires an answer of that kind.
+
+    For instance, implicit questions with an AFTER signal and a date answer:
+
+        mask = temporal_mask(tempquestions["train"], "AFTER", "IMPLICIT", "date")
+        subset = tempquestions["train"].select(np.flatnonzero(mask))
+    """
+    table = dataset.with_format("arrow")[:]
+    mask = np.ones(len(table), dtype=bool)
+    if signal is not None:
+        mask &= _contains(table.column("signal_labels"), SIGNALS.index(signal))
+    if question_type is not None:
+        mask &= _contains(table.column("type_labels"), QUESTION_TYPES.index(question_type))
+    if answer is not None:
+        columns = {"entity": "answer_entities", "date": "answer_days", "value": "answer_values"}
+        if answer not in columns:
+            raise ValueError("answer must be 'entity', 'date' or 'value', got {!r}".format(answer))
+        mask &= _non_empty(table.column(columns[answer]))
+    return mask
+
+
 class TempQuestionsConfig(datasets.BuilderConfig):
     """BuilderConfig for TempQuestions"""
     def __init__(self,
@@ -68,7 +207,22 @@ class TempQuestions(datasets.GeneratorBasedBuilder):
                         datasets.Value("string")
                     ),
                     "Data source": datasets.Value("string"),
-                    "Question creation date": datasets.Value("string")
+                    "Question creation date": datasets.Value("string"),
+                    "signal_labels": datasets.Sequence(
+                        datasets.ClassLabel(names=SIGNALS)
+                    ),
+                    "type_labels": datasets.Sequence(
+                        datasets.ClassLabel(names=QUESTION_TYPES)
+                    ),
+                    "answer_entities": datasets.Sequence(
+                        datasets.Value("string")
+                    ),
+                    "answer_days": datasets.Sequence(
+                        datasets.Value("int64")
+                    ),
+                    "answer_values": datasets.Sequence(
+                        datasets.Value("string")
+                    )
                 }
             )
         )
@@ -90,4 +244,10 @@ class TempQuestions(datasets.GeneratorBasedBuilder):
         with open(data_file, encoding="utf8") as f:
             tempquestions = json.load(f)
             for idx, question in enumerate(tempquestions):
+                entities, days, values = split_answers(question["Gold answer"])
+                question["signal_labels"] = _normalize_labels(question["Temporal signal"], SIGNALS)
+                question["type_labels"] = _normalize_labels(question["Type"], QUESTION_TYPES)
+                question["answer_entities"] = entities
+                question["answer_days"] = days
+                question["answer_values"] = values
                 yield idx, question
\ No newline at end of file
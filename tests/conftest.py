@@ -0,0 +1,31 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="session")
+def load_script():
+    """Returns a loader that imports a dataset script by its path relative to the repo root.
+
+    The scripts are not a package (and some have dashes in their names), so
+    they are imported by location. They are registered in `sys.modules`
+    because `datasets` looks a builder's module up by name.
+    """
+    modules = {}
+
+    def load(relative_path):
+        if relative_path not in modules:
+            name = "kgqa_" + os.path.splitext(relative_path)[0].replace("/", "_").replace("-", "_")
+            spec = importlib.util.spec_from_file_location(name, os.path.join(_ROOT, relative_path))
+            module = importlib.util.module_from_spec(spec)
+            sys.modules[name] = module
+            spec.loader.exec_module(module)
+            modules[relative_path] = module
+        return modules[relative_path]
+
+    return load
@@ -0,0 +1,182 @@
+import json
+import pickle
+
+import pyarrow as pa
+import pytest
+
+
+@pytest.fixture(scope="module")
+def cron_questions(load_script):
+    return load_script("cron_questions/cron_questions.py")
+
+
+_QUESTIONS = [
+    {
+        "question": "Who was the president of France in 1990",
+        "answers": {"Q2105", "Q2038"},
+        "answer_type": "entity",
+        "template": "Who was the {tail} of {head} in {time}",
+        "entities": {"Q30461", "Q142"},
+        "times": {1990},
+        "relations": {"P39"},
+        "type": "simple_time",
+        "annotation": {"tail": "Q30461", "head": "Q142", "time": 1990},
+        "uniq_id": 7,
+        "paraphrases": ["Who led France in 1990"]
+    },
+    {
+        "question": "When did Q42 win the award",
+        "answers": {2001},
+        "answer_type": "time",
+        "template": "When did {head} win {tail}",
+        "entities": {"Q42", "Q185667"},
+        "times": set(),
+        "relations": {"P166"},
+        "type": "simple_entity",
+        "annotation": {"head": "Q42", "tail": "Q185667"},
+        "uniq_id": 8,
+        "paraphrases": []
+    }
+]
+
+
+def _original_rows(data_file):
+    # The pickle-based `_generate_examples` the `cron_questions` config replaced.
+    with open(data_file, "rb") as f:
+        for question in pickle.load(f):
+            question["annotation"] = json.dumps(question["annotation"])
+            question["answers"] = json.dumps(list(question["answers"]))
+            question["times"] = json.dumps(list(question["times"]))
+            question["entities"] = list(question["entities"])
+            question["relations"] = list(question["relations"])
+            yield question
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    data_file = tmp_path / "train.pickle"
+    with open(data_file, "wb") as f:
+        pickle.dump(_QUESTIONS, f)
+    return str(data_file)
+
+
+def _rows(builder, data_file):
+    rows = [question for _, question in builder._generate_examples(data_file=data_file, split="train")]
+    for row in rows:
+        builder.info.features.encode_example(row)
+    return rows
+
+
+def test_legacy_config_matches_the_original_rows(cron_questions, data_file):
+    builder = cron_questions.CronQuestions(config_name="cron_questions")
+
+    rows = _rows(builder, data_file)
+
+    assert rows == list(_original_rows(data_file))
+
+
+def test_typed_config(cron_questions, data_file):
+    builder = cron_questions.CronQuestions(config_name="cron_questions-typed")
+
+    rows = _rows(builder, data_file)
+
+    assert set(rows[0]) == set(builder.info.features)
+    assert rows[0]["answers"] == ["Q2038", "Q2105"]
+    assert rows[0]["annotation"] == {"key": ["head", "tail", "time"], "value": ["Q142", "Q30461", "1990"]}
+    assert rows[1]["answers"] == [] and rows[1]["answer_times"] == [2001]
+    assert rows[1]["times"] == [] and rows[1]["entities"] == ["Q185667", "Q42"]
+
+
+def test_stale_arrow_copy_is_converted_again(cron_questions, data_file):
+    arrow_file = cron_questions.questions_arrow_file(data_file)
+    stale = pa.table({"question": ["stale"]})
+    with pa.OSFile(arrow_file, "wb") as sink, pa.ipc.new_file(sink, stale.schema) as writer:
+        writer.write_table(stale)
+
+    questions = cron_questions.load_questions(data_file)
+
+    assert questions.schema.equals(cron_questions._QUESTION_SCHEMA)
+    assert questions.column("question").to_pylist() == [question["question"] for question in _QUESTIONS]
+
+
+_FACTS = [
+    ("Q1", "P39", "Q2", 1990, 1995),
+    ("Q1", "P26", "Q3", 1980, 2000),
+    ("Q2", "P39", "Q4", 2001, 2001),
+    ("Q3", "P54", "Q3", 1970, 1975),
+    ("Q5", "P166", "Q1", 1996, 1996),
+]
+
+
+@pytest.fixture
+def kg_file(tmp_path):
+    kg_file = tmp_path / "kg" / "full.txt"
+    kg_file.parent.mkdir()
+    kg_file.write_text("".join("\t".join(map(str, fact)) + "\n" + ("\n" if i == 2 else "")
+                               for i, fact in enumerate(_FACTS)), encoding="utf-8")
+    return str(kg_file)
+
+
+def test_kg_config_rows_encode(cron_questions, kg_file):
+    builder = cron_questions.CronQuestions(config_name="kg")
+
+    rows = [row for _, row in builder._generate_examples(data_file=kg_file, split="train")]
+
+    assert [builder.info.features.encode_example(row) for row in rows][0] == {
+        "head": "Q1", "relation": "P39", "tail": "Q2", "start": 1990, "end": 1995,
+        "head_id": 0, "relation_id": 0, "tail_id": 1
+    }
+
+
+def test_kg_store_skips_blank_lines(cron_questions, kg_file):
+    store = cron_questions.load_kg_store(kg_file)
+
+    assert len(store) == len(_FACTS)
+    assert [(store.entities[h], store.relation_names[r], store.entities[t], s, e) for h, r, t, s, e in zip(
+        store.heads.tolist(), store.relations.tolist(), store.tails.tolist(), store.starts.tolist(),
+        store.ends.tolist())] == _FACTS
+
+
+@pytest.mark.parametrize("line, message", [
+    ("Q1\tP39\tQ2\t1990", r"full\.txt:2: expected 5 tab-separated fields, got 4"),
+    ("Q1\tP39\tQ2\t1990\tnow", r"full\.txt:2: expected integer years, got '1990' and 'now'"),
+])
+def test_kg_store_reports_malformed_lines(cron_questions, tmp_path, line, message):
+    kg_file = tmp_path / "full.txt"
+    kg_file.write_text("Q1\tP39\tQ2\t1990\t1995\n" + line + "\n", encoding="utf-8")
+
+    with pytest.raises(ValueError, match=message):
+        cron_questions.load_kg_store(str(kg_file))
+
+
+def _brute_force(store, begin_years, end_years, entities=None):
+    pairs = []
+    for query, (begin, end) in enumerate(zip(begin_years, end_years)):
+        for fact in range(len(store)):
+            if entities is not None and entities[query] not in (store.heads[fact], store.tails[fact]):
+                continue
+            if store.starts[fact] <= end and store.ends[fact] >= begin:
+                pairs.append((query, fact))
+    return pairs
+
+
+def test_interval_index_valid_at(cron_questions, kg_file):
+    store = cron_questions.load_kg_store(kg_file)
+    index = cron_questions.IntervalIndex(store)
+    q1, q3 = store.entity_ids["Q1"], store.entity_ids["Q3"]
+    entities, years = [q1, q1, q3, q3, -1, 99], [1992, 1996, 1972, 1990, 1992, 1992]
+
+    queries, facts = index.valid_at(entities, years)
+
+    assert list(zip(queries.tolist(), facts.tolist())) == _brute_force(store, years, years, entities)
+    assert list(zip(queries.tolist(), facts.tolist())) == [(0, 0), (0, 1), (1, 1), (1, 4), (2, 3), (3, 1)]
+
+
+def test_interval_index_overlapping(cron_questions, kg_file):
+    store = cron_questions.load_kg_store(kg_file)
+    index = cron_questions.IntervalIndex(store)
+    begin_years, end_years = [1900, 1996, 1976, 2002, 1995], [1960, 2001, 1979, 2010, 1990]
+
+    queries, facts = index.overlapping(begin_years, end_years)
+
+    assert list(zip(queries.tolist(), facts.tolist())) == _brute_force(store, begin_years, end_years)
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def cwq(load_script):
+    return load_script("cwq/cwq.py")
+
+
+def _question(idx):
+    return {
+        "CFQquestionIdx": idx,
+        "questionPatternModEntities": "Was M0 a film producer {}".format(idx),
+        "questionTemplate": "Was [entity] a [noun]",
+        "questionWithBrackets": "Was [Olé] a film producer",
+        "recursionDepth": 2,
+        "sparql": "ASK WHERE {{ ?x0 ns:q{} }}".format(idx),
+        "sparqlPattern": "ASK WHERE { M0 a M1 }",
+        "sparqlPatternModEntities": "ASK WHERE { M0 a film.producer }",
+        "questionWithBrackets_kn": "ಪ್ರಶ್ನೆ {}".format(idx),
+        "questionPatternModEntities_kn": "ಪ್ರಶ್ನೆ",
+        "questionWithBrackets_he": "שאלה {}".format(idx),
+        "questionPatternModEntities_he": "שאלה",
+        "questionWithBrackets_zh": "问题 {}".format(idx),
+        "questionPatternModEntities_zh": "问题",
+        "expectedResponse": idx % 2 == 0
+    }
+
+
+@pytest.fixture
+def data_files(tmp_path):
+    dataset_file = tmp_path / "dataset.json"
+    dataset_file.write_text(json.dumps([_question(idx) for idx in range(5)], ensure_ascii=False), encoding="utf-8")
+    split_file = tmp_path / "split.json"
+    split_file.write_text(json.dumps({"trainIdxs": [3, 0, 4], "devIdxs": [1], "testIdxs": [2]}), encoding="utf-8")
+    return {"dataset": str(dataset_file), "split": str(split_file)}
+
+
+def test_row_store_offsets(cwq, data_files):
+    rows_file, offsets = cwq.load_row_store(data_files["dataset"])
+
+    with open(rows_file, "rb") as f:
+        data = f.read()
+    assert offsets[0] == 0 and offsets[-1] == len(data)
+    assert [json.loads(data[offsets[i]:offsets[i + 1]]) for i in range(5)] == [_question(idx) for idx in range(5)]
+
+
+def test_splits_gather_their_rows_out_of_order(cwq, data_files):
+    builder = cwq.CWQ(config_name="custom", split_file=data_files["split"])
+
+    examples = list(builder._generate_examples(data_files=data_files, split="train", split_id="trainIdxs"))
+
+    assert [idx for idx, _ in examples] == [3, 0, 4]
+    assert [row for _, row in examples] == [_question(3), _question(0), _question(4)]
+    for _, row in examples:
+        builder.info.features.encode_example(row)
+
+
+def test_custom_config_needs_a_split_file(cwq):
+    builder = cwq.CWQ(config_name="custom")
+
+    with pytest.raises(ValueError, match="The `custom` config needs a split file"):
+        builder._split_generators(dl_manager=None)
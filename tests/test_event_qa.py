@@ -0,0 +1,96 @@
+import json
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture(scope="module")
+def event_qa(load_script):
+    return load_script("event_qa/event_qa.py")
+
+
+_NAMES = ["http://eventkg.l3s.uni-hannover.de/resource/event_1", "http://dbpedia.org/resource/Zürich",
+          "http://dbpedia.org/resource/Paris", "http://dbpedia.org/resource/Paris_Commune"]
+
+
+def test_vocabulary_ids(event_qa, tmp_path):
+    vocabulary = event_qa.Vocabulary.build(_NAMES + _NAMES[:1], str(tmp_path / "vocab"))
+
+    assert len(vocabulary) == 4
+    assert vocabulary.names(range(4)) == sorted(_NAMES)
+    uris = ["http://dbpedia.org/resource/Paris", "http://dbpedia.org/resource/Zürich", "http://dbpedia.org/resource/Pari",
+            "http://dbpedia.org/resource/Berlin", "", "http://dbpedia.org/resource/Paris_Commune"]
+    assert vocabulary.ids(uris).tolist() == [0, 2, -1, -1, -1, 1]
+    assert vocabulary.contains(uris).tolist() == [True, True, False, False, False, True]
+    assert vocabulary.ids([]).tolist() == []
+
+
+def test_vocabulary_ids_with_hash_collisions(event_qa, tmp_path, monkeypatch):
+    # Every URI shares one of two hashes, so lookups must walk runs of equal hashes.
+    monkeypatch.setattr(event_qa, "_hash_uris", lambda uris: np.array([len(uri) % 2 for uri in uris], dtype=np.uint64))
+    vocabulary = event_qa.Vocabulary.build(_NAMES, str(tmp_path / "vocab"))
+
+    uris = sorted(_NAMES, reverse=True) + ["http://dbpedia.org/resource/Berlin", "x"]
+    assert vocabulary.names(vocabulary.ids(uris)[:4]) == uris[:4]
+    assert vocabulary.ids(uris)[4:].tolist() == [-1, -1]
+
+
+def test_empty_vocabulary(event_qa, tmp_path):
+    vocabulary = event_qa.Vocabulary.build([], str(tmp_path / "vocab"))
+
+    assert len(vocabulary) == 0
+    assert vocabulary.ids(["http://dbpedia.org/resource/Paris"]).tolist() == [-1]
+
+
+def test_vocabulary_config_keeps_the_list_file_rows(event_qa, tmp_path):
+    list_file = tmp_path / "entities.txt"
+    list_file.write_text("http://dbpedia.org/resource/Paris \n\nhttp://dbpedia.org/resource/Berlin\n"
+                         "http://dbpedia.org/resource/Paris\n", encoding="utf-8")
+    builder = event_qa.EventQA(config_name="entities")
+
+    rows = [row for _, row in builder._generate_examples(data_file=str(list_file), split="train")]
+
+    assert rows == [
+        {"name": "http://dbpedia.org/resource/Paris", "id": 1},
+        {"name": "", "id": -1},
+        {"name": "http://dbpedia.org/resource/Berlin", "id": 0},
+        {"name": "http://dbpedia.org/resource/Paris", "id": 1}
+    ]
+
+
+def _write_questions(path, questions):
+    path.write_text(json.dumps({"questions": questions}), encoding="utf-8")
+    return str(path)
+
+
+def test_joined_config_aligns_questions_by_id(event_qa, tmp_path):
+    eventkg_file = _write_questions(tmp_path / "eventkg.json", [
+        {"id": 1, "question": [{"language": "en", "string": "When?"}], "answerType": "date", "hybrid": "false",
+         "query": {"sparql": "SELECT ?e"}, "answers": [{"boolean": True}]},
+        {"id": 2, "question": [], "query": {"sparql": "SELECT ?f"}, "answers": []}
+    ])
+    dbpedia_file = _write_questions(tmp_path / "dbpedia.json", [
+        {"id": 3, "question": [], "query": {"sparql": "SELECT ?h"}, "answers": []},
+        {"id": 1, "question": [], "onlyDbo": "true", "query": {"sparql": "SELECT ?g"}, "answers": []}
+    ])
+    builder = event_qa.EventQA(config_name="eventkg-dbpedia")
+
+    rows = [row for _, row in builder._generate_examples(data_file=eventkg_file, dbpedia_file=dbpedia_file, split="train")]
+
+    assert [row["id"] for row in rows] == ["1", "2", "3"]
+    assert rows[0]["answertype"] == "date" and rows[0]["question"] == '[{"language": "en", "string": "When?"}]'
+    assert (rows[0]["eventkg_query"], rows[0]["dbpedia_query"]) == ({"sparql": "SELECT ?e"}, {"sparql": "SELECT ?g"})
+    assert rows[1]["dbpedia_answers"] is None and rows[2]["eventkg_query"] is None
+
+
+def test_question_rows_are_not_shared_between_builds(event_qa, tmp_path):
+    data_file = _write_questions(tmp_path / "eventkg.json", [
+        {"id": 1, "question": [], "answerType": "date", "query": {"sparql": "SELECT ?e"}, "answers": []}
+    ])
+    builder = event_qa.EventQA(config_name="eventkg")
+
+    first = next(builder._generate_examples(data_file=data_file, split="train"))[1]
+    first["question"] = "changed"
+    second = next(builder._generate_examples(data_file=data_file, split="train"))[1]
+
+    assert second["question"] == "[]" and second["answertype"] == "date"
@@ -0,0 +1,281 @@
+import io
+import json
+
+import datasets
+import pytest
+
+
+@pytest.fixture(scope="module")
+def grail_qa(load_script):
+    return load_script("grail_qa/grail_qa.py")
+
+
+@pytest.mark.parametrize("read_size", [1, 3, 1024])
+def test_iter_json_array_yields_items_across_reads(grail_qa, read_size):
+    text = ' \n[ {"qid": 1, "s": "a,b"} ,\n 12345 , "x]" , [1, 2] ]\n'
+
+    items = list(grail_qa.iter_json_array(io.StringIO(text), read_size=read_size))
+
+    assert items == [{"qid": 1, "s": "a,b"}, 12345, "x]", [1, 2]]
+
+
+@pytest.mark.parametrize("text", ["[]", " [ \n ] "])
+def test_iter_json_array_accepts_empty_arrays(grail_qa, text):
+    assert list(grail_qa.iter_json_array(io.StringIO(text))) == []
+
+
+@pytest.mark.parametrize("text, message", [
+    ("[1,,2]", "Expected an array item, found ','"),
+    ("[,1]", "Expected an array item, found ','"),
+    ("[1,]", "Expected an array item, found ']'"),
+    ("[1 2]", "Expected ',' or ']' after an array item, found '2'"),
+    ('{"a": 1}', "Expected a JSON array"),
+    ("[1, 2", "Unterminated JSON array"),
+])
+def test_iter_json_array_rejects_malformed_separators(grail_qa, text, message):
+    with pytest.raises(ValueError, match=message):
+        list(grail_qa.iter_json_array(io.StringIO(text), read_size=2))
+
+
+def test_parse_s_expression_builds_nested_tuples(grail_qa):
+    tree = grail_qa.parse_s_expression("(AND music.release (JOIN music.release.region m.03_2r3))")
+
+    assert tree == ("AND", "music.release", ("JOIN", "music.release.region", "m.03_2r3"))
+
+
+@pytest.mark.parametrize("s_expression", ["(AND a (JOIN b c)", "(AND a))", "a b", ""])
+def test_parse_s_expression_rejects_malformed_input(grail_qa, s_expression):
+    with pytest.raises(ValueError):
+        grail_qa.parse_s_expression(s_expression)
+
+
+def test_s_expression_to_sparql_compiles_joins_reverses_and_comparisons(grail_qa):
+    tree = grail_qa.parse_s_expression(
+        "(COUNT (AND book.book (JOIN (R book.author.works_written) m.0abc)"
+        " (lt book.book.pages 300^^http://www.w3.org/2001/XMLSchema#integer)))")
+
+    sparql = grail_qa.s_expression_to_sparql(tree)
+
+    assert sparql == "\n".join([
+        "PREFIX : <http://rdf.freebase.com/ns/>",
+        "SELECT (COUNT(DISTINCT ?x) AS ?count) WHERE {",
+        "?x :type.object.type :book.book .",
+        ":m.0abc :book.author.works_written ?x .",
+        "?x :book.book.pages ?x1 .",
+        'FILTER (?x1 < "300"^^<http://www.w3.org/2001/XMLSchema#integer>)',
+        "}"
+    ])
+
+
+@pytest.mark.parametrize("s_expression, message", [
+    ("(TC book.book m.0abc 2001)", "Unsupported S-expression function 'TC'"),
+    ("(AND book.book (COUNT book.book))", "Unsupported S-expression function 'COUNT'"),
+    ("(JOIN book.author)", "'JOIN' takes 2 argument"),
+    ("(ARGMAX book.book)", "'ARGMAX' takes 2 argument"),
+    ("(JOIN (FOO a) m.0abc)", "Unsupported S-expression relation 'FOO'"),
+    ("(AND)", "'AND' takes at least one argument"),
+])
+def test_s_expression_to_sparql_rejects_unsupported_expressions(grail_qa, s_expression, message):
+    with pytest.raises(ValueError, match=message):
+        grail_qa.s_expression_to_sparql(grail_qa.parse_s_expression(s_expression))
+
+
+def test_unsupported_s_expressions_do_not_fail_the_build(grail_qa, tmp_path):
+    graph_query = {"nodes": [{"nid": 0, "node_type": "class", "id": "book.book", "class": "book.book",
+                              "friendly_name": "Book", "question_node": 1, "function": "none"}], "edges": []}
+    questions = [
+        {"qid": 1, "s_expression": "(TC book.book m.0abc 2001)", "answer": [], "graph_query": graph_query},
+        {"qid": 2, "s_expression": "(AND book.book (JOIN book.book.genre m.0xyz))", "answer": [],
+         "graph_query": graph_query},
+    ]
+    data_file = tmp_path / "grailqa_v1.0_train.json"
+    data_file.write_text(json.dumps(questions), encoding="utf-8")
+    builder = grail_qa.GrailQA(config_name="grail_qa")
+    builder._output_dir = str(tmp_path / "output")
+
+    rows = [row for _, row in builder._generate_examples(data_file=str(data_file), split="train")]
+
+    assert [row["qid"] for row in rows] == [1, 2]
+    cache = grail_qa.LogicalFormCache(str(tmp_path / "output"))
+    assert list(cache._entries) == [cache.key(questions[1]["s_expression"])]
+
+
+def _graph(nodes, edges):
+    return {
+        "nodes": [{"nid": nid, "node_type": node_type, "id": "x{}".format(nid), "class": cls,
+                   "friendly_name": "", "question_node": int(nid == 0), "function": "none"}
+                  for nid, (node_type, cls) in enumerate(nodes)],
+        "edges": [{"start": start, "end": end, "relation": relation, "friendly_name": ""}
+                  for start, end, relation in edges]
+    }
+
+
+def _renumber(graph_query, order):
+    nid = {old: new for new, old in enumerate(order)}
+    nodes = [dict(graph_query["nodes"][old], nid=new) for new, old in enumerate(order)]
+    edges = [dict(edge, start=nid[edge["start"]], end=nid[edge["end"]]) for edge in reversed(graph_query["edges"])]
+    return {"nodes": nodes, "edges": edges}
+
+
+_PATH = _graph([("class", "film"), ("class", "person"), ("entity", "country")],
+               [(0, 1, "directed_by"), (1, 2, "nationality")])
+
+
+def test_canonical_graph_hash_ignores_node_numbering_and_entities(grail_qa):
+    renumbered = _renumber(_PATH, [0, 2, 1])
+    for node in renumbered["nodes"]:
+        node["id"] = "m.other"
+
+    assert grail_qa.canonical_graph_hash(renumbered) == grail_qa.canonical_graph_hash(_PATH)
+
+
+def test_canonical_graph_hash_separates_different_structures(grail_qa):
+    reversed_edge = _graph([("class", "film"), ("class", "person"), ("entity", "country")],
+                           [(1, 0, "directed_by"), (1, 2, "nationality")])
+    other_relation = _graph([("class", "film"), ("class", "person"), ("entity", "country")],
+                            [(0, 1, "written_by"), (1, 2, "nationality")])
+
+    hashes = {grail_qa.canonical_graph_hash(graph) for graph in [_PATH, reversed_edge, other_relation]}
+
+    assert len(hashes) == 3
+
+
+def test_canonical_graph_hash_handles_many_symmetric_nodes(grail_qa):
+    leaves = 200
+    star = _graph([("class", "film")] + [("entity", "award")] * leaves,
+                  [(0, leaf, "won") for leaf in range(1, leaves + 1)])
+
+    assert grail_qa.canonical_graph_hash(star) == grail_qa.canonical_graph_hash(
+        _renumber(star, [0] + list(range(leaves, 0, -1))))
+
+
+def test_canonical_graph_hash_falls_back_to_stable_colouring(grail_qa, monkeypatch):
+    # Two disjoint triangles: every node looks alike and no two are twins.
+    cycle = _graph([("class", "c")] * 6, [(0, 1, "r"), (1, 2, "r"), (2, 0, "r"), (3, 4, "r"), (4, 5, "r"), (5, 3, "r")])
+    full_hash = grail_qa.canonical_graph_hash(cycle)
+    monkeypatch.setattr(grail_qa, "_MAX_CANONICAL_SEARCH", 0)
+
+    capped_hash = grail_qa.canonical_graph_hash(cycle)
+
+    assert capped_hash != full_hash
+    assert grail_qa.canonical_graph_hash(_renumber(cycle, [4, 0, 5, 2, 1, 3])) == capped_hash
+
+
+def test_graph_questions_hashes_match_grail_qa(grail_qa, load_script):
+    graph_questions = load_script("graph_questions/graph_questions.py")
+
+    assert graph_questions.canonical_graph_hash(_PATH) == grail_qa.canonical_graph_hash(_PATH)
+
+
+def _node(nid, node_type, node_id, friendly_name, question_node=0):
+    return {"nid": nid, "node_type": node_type, "id": node_id, "class": "music.release", "friendly_name": friendly_name,
+            "question_node": question_node, "function": "none"}
+
+
+def _edge(start, end, relation):
+    return {"start": start, "end": end, "relation": relation, "friendly_name": None}
+
+
+_GRAPH_QUERIES = [
+    {"nodes": [_node(0, "class", "music.release", "Release", 1), _node(1, "entity", "m.03_2r3", "Region")],
+     "edges": [_edge(0, 1, "music.release.region")]},
+    {"nodes": [_node(0, "class", "music.release", None, 1)], "edges": []},
+    {"nodes": [_node(0, "class", "book.book", "Book", 1), _node(1, "entity", "m.0abc", "Author"),
+               _node(2, "literal", "300", "300")],
+     "edges": [_edge(0, 1, "book.author.works_written"), _edge(0, 2, "music.release.region"), _edge(0, 5, "x"),
+               _edge(None, 1, "y")]},
+    {"nodes": [], "edges": []},
+]
+
+
+def _struct_of_lists(records, fields):
+    return {field: [record[field] for record in records] for field in fields}
+
+
+_GRAPH_BUILDERS = {"grail_qa/grail_qa.py": "GrailQA", "graph_questions/graph_questions.py": "GraphQuestions"}
+
+
+@pytest.fixture(scope="module", params=sorted(_GRAPH_BUILDERS))
+def graph_script(request, load_script):
+    return load_script(request.param), _GRAPH_BUILDERS[request.param]
+
+
+@pytest.fixture(scope="module", params=["sequence", "list"])
+def graph_split(request, graph_script):
+    script, builder_name = graph_script
+    builder = getattr(script, builder_name)
+    feature = builder(config_name=builder.BUILDER_CONFIGS[0].name).info.features["graph_query"]
+    if request.param == "sequence":
+        # The script's own feature: `Sequence({...})` stores a struct of lists.
+        graph_queries = [{
+            "nodes": _struct_of_lists(graph_query["nodes"], feature["nodes"].keys()),
+            "edges": _struct_of_lists(graph_query["edges"], feature["edges"].keys())
+        } for graph_query in _GRAPH_QUERIES]
+    else:
+        # A list of structs, as `datasets.List({...})` stores it.
+        feature = {key: datasets.List({field: value[field].feature for field in value}) for key, value in feature.items()}
+        graph_queries = _GRAPH_QUERIES
+    dataset = datasets.Dataset.from_dict({"graph_query": graph_queries},
+                                         features=datasets.Features({"graph_query": feature}))
+    return script.GraphQueryColumns.from_dataset(dataset)
+
+
+def _decode(columns, table, field, key=None):
+    vocabulary = columns.vocabularies[key or field]
+    return [vocabulary[code] if code >= 0 else None for code in table[field].tolist()]
+
+
+def test_graph_query_columns_offsets_and_codes(graph_split):
+    columns = graph_split
+
+    assert len(columns) == 4
+    assert columns.node_offsets.tolist() == [0, 2, 3, 6, 6]
+    assert columns.edge_offsets.tolist() == [0, 1, 1, 5, 5]
+    assert _decode(columns, columns.nodes, "node_type") == ["class", "entity", "class", "class", "entity", "literal"]
+    assert _decode(columns, columns.nodes, "friendly_name") == ["Release", "Region", None, "Book", "Author", "300"]
+    assert _decode(columns, columns.edges, "friendly_name", "edge.friendly_name") == [None] * 5
+    assert columns.nodes["question_node"].tolist() == [1, 0, 1, 1, 0, 0]
+    assert columns.edges["start"].tolist() == [0, 0, 0, 0, -1]
+
+
+def test_graph_query_columns_node_features_pad_and_truncate(graph_split):
+    columns = graph_split
+    codes = {name: code for code, name in enumerate(columns.vocabularies["node_type"])}
+
+    assert columns.node_features([2, 3, 0], "node_type").tolist() == [
+        [codes["class"], codes["entity"], codes["literal"]],
+        [-1, -1, -1],
+        [codes["class"], codes["entity"], -1],
+    ]
+    assert columns.node_features([2, 0], "nid", max_nodes=1).tolist() == [[0], [0]]
+    assert columns.node_features([3], "nid").shape == (1, 0)
+
+
+def test_graph_query_columns_adjacency_skips_out_of_range_edges(graph_split):
+    columns = graph_split
+    relations = {name: code + 1 for code, name in enumerate(columns.vocabularies["edge.relation"])}
+
+    adjacency = columns.adjacency([2, 0, 1])
+
+    assert adjacency.shape == (3, 3, 3)
+    expected = [[[0] * 3 for _ in range(3)] for _ in range(3)]
+    expected[0][0][1] = relations["book.author.works_written"]
+    expected[0][0][2] = relations["music.release.region"]
+    expected[1][0][1] = relations["music.release.region"]
+    assert adjacency.tolist() == expected
+    assert columns.adjacency([2], max_nodes=2).tolist() == [[[0, relations["book.author.works_written"]], [0, 0]]]
+    assert columns.adjacency([3]).shape == (1, 0, 0)
+
+
+def test_graph_query_columns_save_and_load(graph_split, graph_script, tmp_path):
+    graph_split.save(str(tmp_path / "columns"))
+
+    loaded = graph_script[0].GraphQueryColumns.load(str(tmp_path / "columns"))
+
+    assert loaded.vocabularies == graph_split.vocabularies
+    assert loaded.node_offsets.tolist() == graph_split.node_offsets.tolist()
+    assert loaded.edge_offsets.tolist() == graph_split.edge_offsets.tolist()
+    for table, loaded_table in [(graph_split.nodes, loaded.nodes), (graph_split.edges, loaded.edges)]:
+        assert {field: values.tolist() for field, values in loaded_table.items()} == \
+            {field: values.tolist() for field, values in table.items()}
+    assert (loaded.adjacency([0, 1, 2, 3]) == graph_split.adjacency([0, 1, 2, 3])).all()
@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def lcquad(load_script):
+    return load_script("lcquad_v1/lcquad_v1.py")
+
+
+@pytest.fixture
+def files(tmp_path):
+    train_file = tmp_path / "train-data.json"
+    train_file.write_text(json.dumps([
+        {"_id": "1", "corrected_question": "q1", "intermediary_question": "i1", "sparql_query": "s1",
+         "sparql_template_id": 2},
+        {"_id": "2", "corrected_question": "q2", "intermediary_question": "i2", "sparql_query": "s2",
+         "sparql_template_id": 7}
+    ]), encoding="utf-8")
+    templates_file = tmp_path / "templates.json"
+    templates_file.write_text(json.dumps([{"id": 2, "n_entities": 1, "template": "t", "type": "vanilla"}]),
+                              encoding="utf-8")
+    predicates_file = tmp_path / "predicates.txt"
+    predicates_file.write_text("http://dbpedia.org/ontology/author,\nhttp://dbpedia.org/ontology/birthPlace\n",
+                               encoding="utf-8")
+    return {"train": str(train_file), "templates": str(templates_file), "predicates": str(predicates_file)}
+
+
+def _rows(lcquad, config_name, **kwargs):
+    builder = lcquad.LCQuAD(config_name=config_name)
+    rows = [row for _, row in builder._generate_examples(split="train", **kwargs)]
+    for row in rows:
+        builder.info.features.encode_example(row)
+    return rows
+
+
+def test_questions_are_joined_with_their_template(lcquad, files):
+    rows = _rows(lcquad, "lcquad", data_file=files["train"], templates_file=files["templates"])
+
+    assert [(row["template_type"], row["template_n_entities"]) for row in rows] == [("vanilla", 1), (None, None)]
+    assert rows[0]["corrected_question"] == "q1"
+
+
+def test_resources_are_parsed_once(lcquad, files, monkeypatch):
+    assert _rows(lcquad, "templates", data_file=files["templates"]) == [
+        {"id": 2, "n_entities": 1, "template": "t", "type": "vanilla"}
+    ]
+    assert _rows(lcquad, "predicates", data_file=files["predicates"]) == [
+        {"name": "http://dbpedia.org/ontology/author"}, {"name": "http://dbpedia.org/ontology/birthPlace"}
+    ]
+
+    parse_resource = lcquad._parse_resource
+    parsed = []
+
+    def parse(kind, data_file):
+        parsed.append(kind)
+        return parse_resource(kind, data_file)
+
+    monkeypatch.setattr(lcquad, "_parse_resource", parse)
+    rows = _rows(lcquad, "lcquad", data_file=files["train"], templates_file=files["templates"])
+    _rows(lcquad, "predicates", data_file=files["predicates"])
+
+    assert parsed == ["questions"]
+    assert rows[0]["template_type"] == "vanilla"
+
+
+def test_unknown_resource_kind(lcquad, files):
+    with pytest.raises(ValueError, match="Unknown LC-QuAD resource kind 'train'"):
+        lcquad._parse_resource("train", files["train"])
@@ -0,0 +1,34 @@
+import json
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def lcquad2(load_script):
+    return load_script("lcquad_v2/lcquad_v2.py")
+
+
+def _question(uid, paraphrase):
+    return {"NNQT_question": "nnqt {}".format(uid), "uid": uid, "subgraph": "simple question left",
+            "template_index": 3, "question": "question {}".format(uid),
+            "sparql_wikidata": "wd {}".format(uid), "sparql_dbpedia18": "dbr {}".format(uid),
+            "template": ["E REF ?F"], "template_id": 2, "answer": [], "paraphrased_question": paraphrase}
+
+
+def test_both_kb_variants_read_one_columnar_copy(lcquad2, tmp_path):
+    data_file = tmp_path / "train.json"
+    data_file.write_text(json.dumps([_question(1, "p1"), _question(2, None)]), encoding="utf-8")
+
+    wikidata = [row for _, row in lcquad2.LCQuAD2(config_name="lcquad2-wikidata")._generate_examples(
+        data_file=str(data_file), split="train", kb="wikidata")]
+    # The second variant reads the Arrow copy, not the JSON.
+    data_file.write_text("not json", encoding="utf-8")
+    dbpedia = [row for _, row in lcquad2.LCQuAD2(config_name="lcquad2-dbpedia")._generate_examples(
+        data_file=str(data_file), split="train", kb="dbpedia")]
+
+    assert [row["sparql"] for row in wikidata] == ["wd 1", "wd 2"]
+    assert [row["sparql"] for row in dbpedia] == ["dbr 1", "dbr 2"]
+    assert wikidata[0] == dict(dbpedia[0], sparql="wd 1")
+    assert wikidata[0]["subgraph"] == ["simple question left"]
+    assert [row["paraphrased_question"] for row in wikidata] == [["p1"], []]
+    assert wikidata[0]["uid"] == "1" and wikidata[0]["template_id"] == "2"
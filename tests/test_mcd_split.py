@@ -0,0 +1,39 @@
+import warnings
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture(scope="module")
+def mcd_split(load_script):
+    return load_script("cwq/mcd_split.py")
+
+
+def _queries(n, seed=0):
+    rng = np.random.default_rng(seed)
+    queries = []
+    for _ in range(n):
+        predicates = ["ns:p.r{}".format(int(rng.zipf(1.5)) % 20) for _ in range(rng.integers(1, 4))]
+        triples = ["ns:m.0{} {} ?x".format(rng.integers(100), predicates[0])]
+        triples += ["?x {} ?y{}".format(predicate, i) for i, predicate in enumerate(predicates[1:])]
+        queries.append("SELECT DISTINCT ?x WHERE { " + " . ".join(triples) + " . }")
+    return queries
+
+
+def test_split_keeps_atom_divergence_within_tolerance(mcd_split):
+    queries = _queries(3000)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        split = mcd_split.generate_mcd_split(queries, max_atom_divergence=0.02)
+
+    ids = split["trainIdxs"] + split["devIdxs"] + split["testIdxs"]
+    assert sorted(ids) == list(range(len(queries)))
+    assert len(split["trainIdxs"]) == 2400
+    atom_divergence, _ = mcd_split.divergences(queries, split["trainIdxs"], split["devIdxs"] + split["testIdxs"])
+    assert atom_divergence <= 0.02
+
+
+def test_split_warns_when_tolerance_cannot_be_met(mcd_split):
+    with pytest.warns(UserWarning, match="exceeds max_atom_divergence"):
+        mcd_split.generate_mcd_split(_queries(300), max_atom_divergence=0.0, candidates_per_step=1)
@@ -0,0 +1,141 @@
+import pytest
+
+
+@pytest.fixture(scope="module")
+def meta_qa(load_script):
+    return load_script("meta_qa/meta_qa.py")
+
+
+def test_iter_kb_batches_keeps_unicode_line_separators_inside_names(meta_qa, tmp_path):
+    kb_file = tmp_path / "kb.txt"
+    names = ["Caf\x1cé", "Line\u2028Break", "Form\x0cFeed", "Next\x85Line"]
+    kb_file.write_text("".join("{}|has_tags|{}\n".format(name, i) for i, name in enumerate(names)), encoding="utf-8")
+
+    triples = [triple for batch in meta_qa.iter_kb_batches(str(kb_file), chunk_size=7) for triple in batch]
+
+    assert triples == [(name, "has_tags", str(i)) for i, name in enumerate(names)]
+
+
+def test_iter_kb_batches_handles_crlf_and_missing_final_newline(meta_qa, tmp_path):
+    kb_file = tmp_path / "kb.txt"
+    kb_file.write_bytes(b"a|r|b\r\n\r\nc|r|d|e")
+
+    triples = [triple for batch in meta_qa.iter_kb_batches(str(kb_file), chunk_size=3) for triple in batch]
+
+    assert triples == [("a", "r", "b"), ("c", "r", "d|e")]
+
+
+def test_iter_qa_pairs_splits_fields_and_answers(meta_qa, tmp_path):
+    qa_file = tmp_path / "qa_train.txt"
+    qa_file.write_text("what films did [Tom Hanks] star in\tBig|Cast Away\nwho wrote [Dune]\tFrank Herbert\n",
+                       encoding="utf-8")
+
+    pairs = list(meta_qa.iter_qa_pairs(str(qa_file), chunk_size=5))
+
+    assert pairs == [
+        ("what films did [Tom Hanks] star in", ["Big", "Cast Away"]),
+        ("who wrote [Dune]", ["Frank Herbert"]),
+    ]
+
+
+def test_kb_config_writes_store_under_output_dir(meta_qa, tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    (data_dir / "kb.txt").write_text("a|r|b\nb|s|c\n", encoding="utf-8")
+    builder = meta_qa.MetaQA(config_name="kb")
+    builder._output_dir = str(tmp_path / "output")
+
+    rows = [row for _, row in builder._generate_examples(data_file=str(data_dir / "kb.txt"), split="kb")]
+
+    assert len(rows) == 2
+    assert not (data_dir / "kb_store").exists()
+    store = meta_qa.TripleStore(str(tmp_path / "output" / "kb_store"))
+    assert store.entities == ["a", "b", "c"]
+    assert store.relations == ["r", "s"]
+
+
+@pytest.fixture
+def kb_graph(meta_qa, tmp_path):
+    writer = meta_qa.TripleStoreWriter(str(tmp_path / "kb_store"))
+    for triple in [("a", "r", "b"), ("b", "r", "c"), ("a", "s", "c"), ("c", "s", "d")]:
+        writer.add(*triple)
+    return meta_qa.KBGraph(writer.close())
+
+
+def test_kb_graph_expand_follows_relations_and_directions(kb_graph):
+    queries, entities = kb_graph.expand([0, 1], [0, 2], direction="forward")
+    assert list(zip(queries.tolist(), entities.tolist())) == [(0, 1), (0, 2), (1, 3)]
+
+    queries, entities = kb_graph.expand([0], [2], relations=[0], direction="backward")
+    assert list(zip(queries.tolist(), entities.tolist())) == [(0, 1)]
+
+
+def test_kb_graph_masks_out_of_range_entities(kb_graph):
+    queries, entities = kb_graph.expand([0, 1, 2, 3], [-1, 0, 4, -5])
+    assert list(zip(queries.tolist(), entities.tolist())) == [(1, 1), (1, 2)]
+
+    frontiers = kb_graph.k_hop([-1, 3], 2)
+    assert [list(zip(q.tolist(), e.tolist())) for q, e in frontiers] == [[(1, 2)], [(1, 0), (1, 1), (1, 3)]]
+
+    queries, edges = kb_graph.subgraph([-1], 2)
+    assert len(queries) == len(edges) == 0
+
+
+def test_kb_graph_rejects_unknown_relations(kb_graph):
+    with pytest.raises(ValueError, match="relation IDs must be in"):
+        kb_graph.expand([0], [0], relations=[2])
+    with pytest.raises(ValueError, match="relation IDs must be in"):
+        kb_graph.expand([0], [0], relations=[-1])
+
+
+def _write_qa_files(data_dir, n_qtypes):
+    (data_dir / "kb.txt").write_text("Big|starred_actors|Tom Hanks\nDune|written_by|Frank Herbert\n", encoding="utf-8")
+    (data_dir / "qa_train.txt").write_text(
+        "what films did [Tom Hanks] star in\tBig\nwho wrote [Dune]\tFrank Herbert\nwho directed [Alien]\tRidley Scott\n",
+        encoding="utf-8")
+    (data_dir / "qa_train_qtype.txt").write_text("".join("qtype_{}\n".format(i) for i in range(n_qtypes)),
+                                                  encoding="utf-8")
+
+
+def _generate_qa(meta_qa, data_dir, output_dir):
+    builder = meta_qa.MetaQA(config_name="metaqa-1hop-vanilla")
+    builder._output_dir = str(output_dir)
+    return [row for _, row in builder._generate_examples(
+        data_file=str(data_dir / "qa_train.txt"), qtype_file=str(data_dir / "qa_train_qtype.txt"),
+        kb_file=str(data_dir / "kb.txt"), split="train")]
+
+
+def test_question_rows_join_topic_entity_ids_and_index(meta_qa, tmp_path):
+    _write_qa_files(tmp_path, 3)
+
+    rows = _generate_qa(meta_qa, tmp_path, tmp_path / "output")
+
+    assert [row["qtype"] for row in rows] == ["qtype_0", "qtype_1", "qtype_2"]
+    assert [row["topic_entity_id"] for row in rows] == [1, 2, -1]
+    assert not (tmp_path / "qa_train_topic_index").exists()
+    index = meta_qa.TopicEntityIndex(str(tmp_path / "output" / "topic_index-train"))
+    positions, question_ids = index.lookup([row["topic_entity_id"] for row in rows] + [99])
+    assert positions.tolist() == [0, 1]
+    assert question_ids.tolist() == [0, 1]
+    assert index.questions(-1).tolist() == []
+
+
+def test_rebuilding_the_topic_index_replaces_the_old_one(meta_qa, tmp_path):
+    _write_qa_files(tmp_path, 3)
+    _generate_qa(meta_qa, tmp_path, tmp_path / "output")
+    (tmp_path / "qa_train.txt").write_text("who wrote [Dune]\tFrank Herbert\n", encoding="utf-8")
+    (tmp_path / "qa_train_qtype.txt").write_text("qtype_0\n", encoding="utf-8")
+
+    _generate_qa(meta_qa, tmp_path, tmp_path / "output")
+
+    index = meta_qa.TopicEntityIndex(str(tmp_path / "output" / "topic_index-train"))
+    assert index.questions(2).tolist() == [0]
+    assert index.questions(1).tolist() == []
+
+
+@pytest.mark.parametrize("n_qtypes, message", [(2, "no qtype line for question 3"), (4, "more lines than the 3 questions")])
+def test_question_rows_reject_misaligned_qtype_files(meta_qa, tmp_path, n_qtypes, message):
+    _write_qa_files(tmp_path, n_qtypes)
+
+    with pytest.raises(ValueError, match=message):
+        _generate_qa(meta_qa, tmp_path, tmp_path / "output")
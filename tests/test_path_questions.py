@@ -0,0 +1,24 @@
+import pytest
+
+
+@pytest.fixture(scope="module")
+def path_questions(load_script):
+    return load_script("path_questions/path_questions.py")
+
+
+def test_load_kb_store_skips_blank_lines(path_questions, tmp_path):
+    kb_file = tmp_path / "kb.txt"
+    kb_file.write_text("a\tr\tb\n\n  \nb\tr\tc\n", encoding="utf-8")
+
+    store = path_questions.load_kb_store(str(kb_file))
+
+    assert len(store) == 2
+    assert store.entities == ["a", "b", "c"]
+
+
+def test_load_kb_store_reports_malformed_line_number(path_questions, tmp_path):
+    kb_file = tmp_path / "kb.txt"
+    kb_file.write_text("a\tr\tb\n\nb\tr\n", encoding="utf-8")
+
+    with pytest.raises(ValueError, match=r"kb\.txt:3: expected 3 tab-separated fields, got 2"):
+        path_questions.load_kb_store(str(kb_file))
@@ -0,0 +1,88 @@
+import importlib.util
+import json
+import os
+import sys
+
+import pytest
+
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="module")
+def qald9(load_script):
+    return load_script("qald/qald-9.py")
+
+
+@pytest.fixture(scope="module")
+def qald10(load_script):
+    return load_script("qald/qald-10.py")
+
+
+_QUESTION = [{"language": "en", "string": "Who?", "keywords": "who"}, {"language": "de", "string": "Wer?"}]
+_ANSWERS = [
+    {"head": {"vars": ["uri", "label"]},
+     "results": {"bindings": [
+         {"uri": {"type": "uri", "value": "http://dbpedia.org/resource/A"},
+          "label": {"type": "literal", "value": "A", "xml:lang": "en"}},
+         {"uri": {"type": "uri", "value": "http://dbpedia.org/resource/B"}}]}},
+    {"head": {}, "boolean": True}
+]
+
+
+def test_structured_features_use_the_stored_struct_of_lists_layout(qald9):
+    assert qald9.structured_question(_QUESTION) == {
+        "language": ["en", "de"], "string": ["Who?", "Wer?"], "keywords": ["who", None]}
+    assert qald9.structured_answers(_ANSWERS) == {
+        "vars": ["uri", "label"],
+        "boolean": True,
+        "bindings": {
+            "row": [0, 0, 1],
+            "var": ["uri", "label", "uri"],
+            "type": ["uri", "literal", "uri"],
+            "value": ["http://dbpedia.org/resource/A", "A", "http://dbpedia.org/resource/B"],
+            "datatype": [None, None, None],
+            "lang": [None, "en", None]
+        }
+    }
+
+
+def test_qald9_and_qald10_helpers_agree(qald9, qald10):
+    assert qald10.structured_question(_QUESTION) == qald9.structured_question(_QUESTION)
+    assert qald10.structured_answers(_ANSWERS) == qald9.structured_answers(_ANSWERS)
+
+
+def test_benchmark_epochs_agree_on_built_datasets(tmp_path):
+    spec = importlib.util.spec_from_file_location("qald_features", os.path.join(_ROOT, "benchmarks", "qald_features.py"))
+    benchmark = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = benchmark
+    spec.loader.exec_module(benchmark)
+    data_file = str(tmp_path / "qald.json")
+    benchmark._write_synthetic_qald(data_file, n_questions=50)
+    qald9 = benchmark._load_qald9()
+
+    as_json = benchmark._build(qald9, "qald", data_file)
+    structured = benchmark._build(qald9, "qald-structured", data_file)
+
+    n_values = benchmark._epoch_json(as_json)
+    assert n_values > 0
+    assert benchmark._epoch_structured(structured) == n_values
+    assert benchmark._epoch_columns(structured, batch_size=7) == n_values
+
+
+def test_language_rows_are_grouped_and_indexed(qald9, tmp_path):
+    data_file = tmp_path / "qald.json"
+    data_file.write_text(json.dumps({"questions": [
+        {"id": "1", "question": [{"language": "en", "string": "One?"}, {"language": "de", "string": "Eins?"}]},
+        {"id": "2", "question": [{"language": "en", "string": "Two?"}]}
+    ]}), encoding="utf-8")
+    builder = qald9.QALDQuestions(config_name="qald-languages")
+    builder._output_dir = str(tmp_path / "output")
+
+    rows = [row for _, row in builder._generate_examples(data_file=str(data_file), split="train")]
+
+    assert [(row["language"], row["id"]) for row in rows] == [("de", "1"), ("en", "1"), ("en", "2")]
+    index = qald9.LanguageIndex.load(qald9.LanguageIndex.path(str(tmp_path / "output"), "train"))
+    assert index.languages == ["de", "en"]
+    assert index.rows("en") == (1, 3)
+    assert index.rows("fr") == (0, 0)
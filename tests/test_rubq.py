@@ -0,0 +1,111 @@
+import json
+
+import datasets
+import pyarrow as pa
+import pytest
+
+
+@pytest.fixture(scope="module")
+def rubq(load_script):
+    return load_script("rubq_v1/rubq_v1.py")
+
+
+@pytest.fixture(scope="module")
+def rubq2(load_script):
+    return load_script("rubq_v2/rubq_v2.py")
+
+
+_ANSWERS = [
+    {"value": "http://www.wikidata.org/entity/Q649", "label": "Москва", "type": "uri", "wd_names": {"ru": ["Москва"]}},
+    {"value": "1147", "type": "literal"}
+]
+
+
+def _question(uid, **fields):
+    return dict({
+        "uid": uid,
+        "question_text": "Какой город основан в 1147 году?",
+        "query": "SELECT ?answer WHERE { ?answer wdt:P571 ?date }",
+        "answer_text": "Москва",
+        "question_uris": ["http://www.wikidata.org/entity/Q649"],
+        "question_props": ["wdt:P571"],
+        "answers": _ANSWERS,
+        "tags": ["1-hop"],
+        "question_eng": "Which city was founded in 1147?"
+    }, **fields)
+
+
+def _write(path, rows):
+    path.write_text(json.dumps(rows, ensure_ascii=False), encoding="utf-8")
+    return str(path)
+
+
+def _encoded_rows(builder, data_file):
+    rows = [row for _, row in builder._generate_examples(data_file=data_file, split="test")]
+    return rows, [builder.info.features.encode_example(row) for row in rows]
+
+
+def test_rubq_rows_encode_typed_answers(rubq, tmp_path):
+    builder = rubq.RuBQ(config_name="rubq")
+
+    rows, encoded = _encoded_rows(builder, _write(tmp_path / "test.json", [_question(1)]))
+
+    assert encoded[0]["typed_answers"] == {
+        "value": ["http://www.wikidata.org/entity/Q649", "1147"],
+        "label": ["Москва", None],
+        "type": ["uri", "literal"]
+    }
+    assert json.loads(rows[0]["answers"]) == _ANSWERS
+
+
+def test_rubq2_rows_encode_typed_answers_and_paragraph_uids(rubq2, tmp_path):
+    builder = rubq2.RuBQ2Questions(config_name="rubq2")
+    questions = [
+        _question(1, paragraphs_uids={"with_answer": [7], "all_related": [7, 3]}, RuBQ_version="1.0"),
+        _question(2, answers=[], paragraphs_uids={}, RuBQ_version="2.0")
+    ]
+
+    rows, encoded = _encoded_rows(builder, _write(tmp_path / "test.json", questions))
+
+    assert encoded[0]["typed_answers"]["label"] == ["Москва", None]
+    assert encoded[1]["typed_answers"] == {"value": [], "label": [], "type": []}
+    assert [(row["paragraphs_with_answer"], row["paragraphs_all_related"]) for row in encoded] == [([7], [7, 3]), ([], [])]
+    assert json.loads(rows[0]["paragraphs_uids"]) == {"with_answer": [7], "all_related": [7, 3]}
+
+
+@pytest.fixture
+def paragraphs(rubq2, tmp_path):
+    builder = rubq2.RuBQ2Questions(config_name="rubq2-paragraphs")
+    data_file = _write(tmp_path / "paragraphs.json", [
+        {"uid": 7, "ru_wiki_pageid": 70, "text": "seven"},
+        {"uid": 3, "ru_wiki_pageid": 30, "text": "three"},
+        {"uid": 12, "text": "twelve"}
+    ])
+    rows = [row for _, row in builder._generate_examples(data_file=data_file, split="train")]
+    return datasets.Dataset.from_list(rows, features=builder.info.features)
+
+
+def test_paragraph_index_rows(rubq2, paragraphs):
+    index = rubq2.ParagraphIndex.from_dataset(paragraphs)
+
+    assert index.rows([3, 12, 7, 5, 99, -1]).tolist() == [1, 2, 0, -1, -1, -1]
+    assert rubq2.ParagraphIndex([]).rows([3]).tolist() == [-1]
+
+
+def test_paragraph_index_gathers_python_and_arrow_uid_lists(rubq2, paragraphs):
+    index = rubq2.ParagraphIndex.from_dataset(paragraphs)
+    uid_lists = [[7, 3], [], [12]]
+
+    for batch in [uid_lists, pa.array([[99]] + uid_lists, type=pa.list_(pa.int32())).slice(1),
+                  pa.chunked_array([pa.array(uid_lists, type=pa.list_(pa.int32()))])]:
+        offsets, table = index.gather(paragraphs, batch)
+
+        assert offsets.tolist() == [0, 2, 2, 3]
+        assert table.column("text").to_pylist() == ["seven", "three", "twelve"]
+
+
+def test_paragraph_index_rejects_unknown_uids(rubq2, paragraphs):
+    index = rubq2.ParagraphIndex.from_dataset(paragraphs)
+
+    with pytest.raises(ValueError, match=r"Unknown paragraph uids: \[5\]"):
+        index.gather(paragraphs, [[7], [5, 5]])
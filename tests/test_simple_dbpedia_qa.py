@@ -0,0 +1,57 @@
+import json
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture(scope="module")
+def simple_dbpedia_qa(load_script):
+    return load_script("simple_dbpedia_qa/simple_dbpedia_qa.py")
+
+
+_PAIRS = [("dbr:Paris", "dbo:country"), ("dbr:Berlin", "dbo:country"), ("dbr:Paris", "^dbo:birthPlace"),
+          ("dbr:Paris", "dbo:country"), ("dbr:Athens", "dbo:mayor")]
+
+
+def test_candidate_index_resolves_subjects_with_sorted_keys(simple_dbpedia_qa, tmp_path):
+    simple_dbpedia_qa.CandidateIndex.build(_PAIRS).save(str(tmp_path / "index"))
+    index = simple_dbpedia_qa.CandidateIndex.load(str(tmp_path / "index"))
+
+    assert index.subjects.tolist() == ["dbr:Athens", "dbr:Berlin", "dbr:Paris"]
+    assert index.subject_ids(["dbr:Paris", "dbr:Rome", "dbr:Athens", "dbr:Zzz", "dbr:Paris2", ""]).tolist() == \
+        [2, -1, 0, -1, -1, -1]
+    offsets, relations, counts = index.candidates(["dbr:Paris", "dbr:Rome", "dbr:Berlin"])
+    assert offsets.tolist() == [0, 2, 2, 3]
+    assert [index.relations[r] for r in relations] == ["dbo:country", "^dbo:birthPlace", "dbo:country"]
+    assert counts.tolist() == [2, 1, 1]
+    assert index.relation_counts.tolist() == [3, 1, 1]
+
+
+def test_candidate_index_ignores_out_of_range_ids(simple_dbpedia_qa):
+    index = simple_dbpedia_qa.CandidateIndex.build(_PAIRS)
+
+    offsets, relations, _ = index.candidates(np.array([-1, 0, 3, 99]))
+
+    assert offsets.tolist() == [0, 0, 1, 1, 1]
+    assert [index.relations[r] for r in relations] == ["dbo:mayor"]
+
+
+def test_empty_candidate_index(simple_dbpedia_qa):
+    index = simple_dbpedia_qa.CandidateIndex.build([])
+
+    assert index.subject_ids(["dbr:Paris"]).tolist() == [-1]
+    assert index.candidates(["dbr:Paris"])[0].tolist() == [0, 0]
+
+
+def test_build_writes_backward_relations(simple_dbpedia_qa, tmp_path):
+    data_file = tmp_path / "train.json"
+    data_file.write_text(json.dumps({"Questions": [
+        {"Subject": "dbr:Paris", "PredicateList": [{"Predicate": "dbo:birthPlace", "Direction": "backward"}]}
+    ]}), encoding="utf-8")
+    builder = simple_dbpedia_qa.SimpleDBpediaQA(config_name=simple_dbpedia_qa.SimpleDBpediaQA.BUILDER_CONFIGS[0].name)
+    builder._output_dir = str(tmp_path / "output")
+
+    list(builder._generate_examples(data_file=str(data_file), split="train"))
+
+    index = simple_dbpedia_qa.CandidateIndex.load(simple_dbpedia_qa.CandidateIndex.directory(str(tmp_path / "output"), "train"))
+    assert index.relations == ["^dbo:birthPlace"]
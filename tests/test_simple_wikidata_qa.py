@@ -0,0 +1,26 @@
+import pytest
+
+
+@pytest.fixture(scope="module")
+def simple_wikidata_qa(load_script):
+    return load_script("simple_wikidata_qa/simple_wikidata_qa.py")
+
+
+def test_iter_annotated_lines_splits_each_line_once(simple_wikidata_qa, tmp_path):
+    data_file = tmp_path / "annotated.txt"
+    data_file.write_text("Q1\tP19\tQ2\twhere was it\x1cborn\nQ3\tR27\tQ4\twho is a citizen of x\n\n",
+                         encoding="utf-8")
+
+    lines = list(simple_wikidata_qa.iter_annotated_lines(str(data_file), chunk_size=4))
+
+    assert lines == [
+        (b"Q1", b"P19", b"Q2", "where was it\x1cborn"),
+        (b"Q3", b"R27", b"Q4", "who is a citizen of x"),
+    ]
+
+
+def test_wikidata_id_encodes_reverse_relations_as_negative(simple_wikidata_qa):
+    assert simple_wikidata_qa.wikidata_id(b"Q42") == 42
+    assert simple_wikidata_qa.wikidata_id(b"P31") == 31
+    assert simple_wikidata_qa.wikidata_id(b"R31") == -31
+    assert simple_wikidata_qa.wikidata_id(b"Qx") == 0
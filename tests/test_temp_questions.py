@@ -0,0 +1,40 @@
+import datetime
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def temp_questions(load_script):
+    return load_script("temp_questions/temp_questions.py")
+
+
+def _days(year, month, day):
+    return (datetime.date(year, month, day) - datetime.date(1970, 1, 1)).days
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("1990", _days(1990, 1, 1)),
+    ("2001-04-30", _days(2001, 4, 30)),
+    ("May 4, 1990", _days(1990, 5, 4)),
+    ("4th May 1990", _days(1990, 5, 4)),
+    ("Sept. 1990", _days(1990, 9, 1)),
+    ("February 29, 2000", _days(2000, 2, 29)),
+    ("29 February 1996", _days(1996, 2, 29)),
+    ("June 1, 800", _days(800, 6, 1)),
+])
+def test_parse_day(temp_questions, value, expected):
+    assert temp_questions.parse_day(value) == expected
+
+
+@pytest.mark.parametrize("value", [
+    "February 31, 2001", "2001-04-31", "February 29, 1900", "29 February 2001", "2001-13-01",
+    "March 15", "15 March", "May 4, 19", "Barack Obama", "42", "", None
+])
+def test_parse_day_rejects_non_dates(temp_questions, value):
+    assert temp_questions.parse_day(value) is None
+
+
+def test_split_answers_keeps_month_and_day_without_year_as_entity(temp_questions):
+    entities, days, values = temp_questions.split_answers(["March 15", "May 1990", "42"])
+
+    assert (entities, days, values) == (["March 15"], [_days(1990, 5, 1)], ["42"])
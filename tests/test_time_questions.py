@@ -0,0 +1,36 @@
+import datetime
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def time_questions(load_script):
+    return load_script("time_questions/time_questions.py")
+
+
+def _days(year, month, day):
+    return (datetime.date(year, month, day) - datetime.date(1970, 1, 1)).days
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("2001-04-30", _days(2001, 4, 30)),
+    ("+2000-02-29T00:00:00Z", _days(2000, 2, 29)),
+    ("1990-00-00T00:00:00Z", _days(1990, 1, 1)),
+    ("1990-02-00T00:00:00Z", _days(1990, 2, 1)),
+])
+def test_parse_day(time_questions, value, expected):
+    assert time_questions.parse_day(value) == expected
+
+
+@pytest.mark.parametrize("value", [
+    "2001-02-29", "1900-02-29T00:00:00Z", "2001-04-31", "2001-13-01", "Q76", "1990", "", None
+])
+def test_parse_day_rejects_non_dates(time_questions, value):
+    assert time_questions.parse_day(value) is None
+
+
+def test_parse_day_before_year_one(time_questions):
+    # Proleptic Gregorian years: year 0 and -4 are leap years, -1 is not.
+    assert time_questions.parse_day("0001-01-01") - time_questions.parse_day("0000-01-01") == 366
+    assert time_questions.parse_day("-0004-02-29T00:00:00Z") is not None
+    assert time_questions.parse_day("-0001-02-29T00:00:00Z") is None
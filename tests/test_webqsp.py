@@ -0,0 +1,89 @@
+import io
+import json
+import zipfile
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def webqsp(load_script):
+    return load_script("webqsp/webqsp.py")
+
+
+def test_iter_questions_drops_unused_keys(webqsp):
+    text = json.dumps({"Version": "1.0", "Questions": [
+        {"QuestionId": "q1", "Parses": [{"Time": 1, "Order": 2, "ParseId": "q1.p0"}]},
+        {"QuestionId": "q2", "Parses": []}
+    ]})
+
+    questions = list(webqsp.iter_questions(io.StringIO(text), read_size=5))
+
+    assert questions == [{"QuestionId": "q1", "Parses": [{"ParseId": "q1.p0"}]}, {"QuestionId": "q2", "Parses": []}]
+
+
+def test_iter_questions_keeps_time_and_order_outside_parses(webqsp):
+    constraint = {"Operator": "Equal", "Time": "2001", "Order": {"Nodes": 1}}
+    text = json.dumps({"Questions": [
+        {"QuestionId": "q1", "Time": 3, "Parses": [{"ParseId": "q1.p0", "Order": {"Count": 1}, "Constraints": [constraint]}]}
+    ]})
+
+    questions = list(webqsp.iter_questions(io.StringIO(text)))
+
+    assert questions == [{"QuestionId": "q1", "Time": 3, "Parses": [{"ParseId": "q1.p0", "Constraints": [constraint]}]}]
+
+
+@pytest.mark.parametrize("questions", ['[{"QuestionId": "q1"},,{"QuestionId": "q2"}]', '[,{"QuestionId": "q1"}]',
+                                       '[{"QuestionId": "q1"} {"QuestionId": "q2"}]'])
+def test_iter_questions_rejects_malformed_separators(webqsp, questions):
+    with pytest.raises(ValueError, match="`Questions` entry"):
+        list(webqsp.iter_questions(io.StringIO('{"Questions": ' + questions + "}")))
+
+
+def _parse(chain, *constraints):
+    return {"InferentialChain": chain,
+            "Constraints": [{"Operator": "Equal", "ArgumentType": argument_type, "ValueType": value_type,
+                             "NodePredicate": predicate} for argument_type, value_type, predicate in constraints]}
+
+
+@pytest.fixture
+def parse_index(webqsp, tmp_path):
+    questions = [
+        {"QuestionId": "q0", "RawQuestion": "r0", "ProcessedQuestion": "p0",
+         "Parses": [_parse(["film.film.directed_by"]),
+                    _parse(["film.film.directed_by", "people.person.nationality"],
+                           ("Value", "DateTime", "film.film.initial_release_date"))]},
+        {"QuestionId": "q1", "RawQuestion": "r1", "ProcessedQuestion": "p1", "Parses": [_parse(None)]},
+        {"QuestionId": "q2", "RawQuestion": "r2", "ProcessedQuestion": "p2",
+         "Parses": [_parse(["people.person.parents", "people.person.nationality"], ("Entity", "String", "x.y"))]},
+    ]
+    archive = tmp_path / "WebQSP.zip"
+    with zipfile.ZipFile(archive, "w") as f:
+        f.writestr("WebQSP/data/WebQSP.train.json", json.dumps({"Version": "1.0", "Questions": questions}))
+    builder = webqsp.WebQuestionsSP(config_name="webqsp")
+    builder._output_dir = str(tmp_path / "output")
+    rows = [row for _, row in builder._generate_examples(
+        data_file=str(archive), member="WebQSP/data/WebQSP.train.json", split="train")]
+    assert [row["QuestionId"] for row in rows] == ["q0", "q1", "q2"]
+    return webqsp.ParseIndex.load(webqsp.ParseIndex.directory(str(tmp_path / "output"), "train"))
+
+
+def test_parse_index_answers_single_and_combined_conditions(parse_index):
+    questions, parses = parse_index.query(chain_length=2)
+    assert list(zip(questions.tolist(), parses.tolist())) == [(0, 1), (2, 0)]
+
+    questions, parses = parse_index.query(chain_length=2, value_type="DateTime")
+    assert list(zip(questions.tolist(), parses.tolist())) == [(0, 1)]
+
+    questions, _ = parse_index.query(predicate="people.person.nationality", chain="film.film.directed_by")
+    assert questions.tolist() == []
+
+
+def test_parse_index_accepts_alternative_values_and_unknown_keys(parse_index):
+    questions, parses = parse_index.query(chain_length=[0, 1])
+    assert list(zip(questions.tolist(), parses.tolist())) == [(0, 0), (1, 0)]
+
+    questions, parses = parse_index.query(operator="NotAnOperator")
+    assert len(questions) == len(parses) == 0
+
+    with pytest.raises(ValueError, match="At least one condition"):
+        parse_index.query()
@@ -2,7 +2,11 @@
 
 import json
 import os
+import re
 
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
 import datasets
 
 logger = datasets.logging.get_logger(__name__)
@@ -33,6 +37,111 @@ _DESCRIPTION = """\
 
 _URL = "https://exaqt.mpi-inf.mpg.de/"
 
+SIGNALS = ["NO SIGNAL", "BEFORE", "AFTER", "START", "FINISH", "OVERLAP", "EQUAL", "DURING", "ORDINAL", "OTHER"]
+QUESTION_TYPES = ["EXPLICIT", "IMPLICIT", "TEMP.ANS", "ORDINAL", "OTHER"]
+
+_ISO_DATE = re.compile(r"^\s*([+-]?\d+)-(\d{1,2})-(\d{1,2})(?:[T\s]|$)")
+
+
+def _days_from_civil(year, month, day):
+    """Days from 1970-01-01 to a proleptic Gregorian date; works for years `datetime` rejects."""
+    year -= month <= 2
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+
+def _days_in_month(year, month):
+    if month == 2:
+        return 29 if year % 4 == 0 and (year % 100 != 0 or year % 400 == 0) else 28
+    return 30 if month in (4, 6, 9, 11) else 31
+
+
+def parse_day(value):
+    """Parses an ISO date or Wikidata timestamp into a day offset from 1970-01-01.
+
+    Wikidata writes year or month precision as `00` month/day; those count as
+    the first month/day. Returns None for anything that is not a date,
+    including days past the end of their month such as 2001-02-29.
+    """
+    match = _ISO_DATE.match(value or "")
+    if match is None:
+        return None
+    year, month, day = int(match.group(1)), int(match.group(2)), int(match.group(3))
+    month, day = max(month, 1), max(day, 1)
+    if month > 12 or day > _days_in_month(year, month):
+        return None
+    return _days_from_civil(year, month, day)
+
+
+def _normalize_labels(values, names):
+    labels = []
+    for value in values or []:
+        label = value.strip().upper()
+        labels.append(label if label in names else "OTHER")
+    return labels
+
+
+def split_answers(answers):
+    """Splits a TimeQuestions `Answer` list into entity IDs, day offsets and other values."""
+    entities, days, values = [], [], []
+    for answer in answers:
+        if answer.get("AnswerType") == "Entity":
+            entities.append(answer.get("WikidataQid"))
+            continue
+        argument = answer.get("AnswerArgument")
+        day = parse_day(argument)
+        if day is None:
+            values.append(argument)
+        else:
+            days.append(day)
+    return entities, days, values
+
+
+def _contains(list_column, value):
+    if isinstance(list_column, pa.ChunkedArray):
+        list_column = list_column.combine_chunks()
+    hits = np.zeros(len(list_column), dtype=bool)
+    parents = pc.list_parent_indices(list_column).to_numpy()
+    values = pc.list_flatten(list_column).to_numpy(zero_copy_only=False)
+    hits[parents[values == value]] = True
+    return hits
+
+
+def _non_empty(list_column):
+    return pc.fill_null(pc.list_value_length(list_column), 0).to_numpy() > 0
+
+
+def temporal_mask(dataset, signal=None, question_type=None, answer=None):
+    """Returns a boolean mask over the rows of a TimeQuestions split.
+
+    Args:
+      signal: keep questions with this temporal signal, e.g. "BEFORE".
+      question_type: keep questions of this type, e.g. "ORDINAL".
+      answer: "entity", "date" or "value" to keep questions with at least one
+        answer of that kind.
+
+    Example, ordinal questions with a BEFORE signal answered with a date:
+
+        mask = temporal_mask(timequestions["test"], "BEFORE", "ORDINAL", "date")
+        subset = timequestions["test"].select(np.flatnonzero(mask))
+    """
+    table = dataset.with_format("arrow")[:]
+    mask = np.ones(len(table), dtype=bool)
+    if signal is not None:
+        mask &= _contains(table.column("signal_labels"), SIGNALS.index(signal))
+    if question_type is not None:
+        mask &= _contains(table.column("type_labels"), QUESTION_TYPES.index(question_type))
+    if answer is not None:
+        columns = {"entity": "answer_entities", "date": "answer_days", "value": "answer_values"}
+        if answer not in columns:
+            raise ValueError("answer must be 'entity', 'date' or 'value', got {!r}".format(answer))
+        mask &= _non_empty(table.column(columns[answer]))
+    return mask
+
+
 class TimeQuestionsConfig(datasets.BuilderConfig):
     """BuilderConfig for TimeQuestions"""
     def __init__(self,
@@ -74,7 +183,22 @@ class TimeQuestions(datasets.GeneratorBasedBuilder):
                     "Answer": datasets.Value("string"),
                     "Data source": datasets.Value("string"),
                     "Question creation date": datasets.Value("string"),
-                    "Data set": datasets.Value("string")
+                    "Data set": datasets.Value("string"),
+                    "signal_labels": datasets.Sequence(
+                        datasets.ClassLabel(names=SIGNALS)
+                    ),
+                    "type_labels": datasets.Sequence(
+                        datasets.ClassLabel(names=QUESTION_TYPES)
+                    ),
+                    "answer_entities": datasets.Sequence(
+                        datasets.Value("string")
+                    ),
+                    "answer_days": datasets.Sequence(
+                        datasets.Value("int64")
+                    ),
+                    "answer_values": datasets.Sequence(
+                        datasets.Value("string")
+                    )
                 }
             ),
             supervised_keys=None,
@@ -113,5 +237,11 @@ class TimeQuestions(datasets.GeneratorBasedBuilder):
         with open(data_file, encoding="utf8") as f:
             timequestions = json.load(f)
             for idx, question in enumerate(timequestions):
+                entities, days, values = split_answers(question["Answer"])
+                question["signal_labels"] = _normalize_labels(question["Temporal signal"], SIGNALS)
+                question["type_labels"] = _normalize_labels(question["Temporal question type"], QUESTION_TYPES)
+                question["answer_entities"] = entities
+                question["answer_days"] = days
+                question["answer_values"] = values
                 question["Answer"] = json.dumps(question["Answer"])
                 yield idx, question
\ No newline at end of file
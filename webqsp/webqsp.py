@@ -1,7 +1,13 @@
 """WebQuestionsSP: The WebQuestions Semantic Parses Dataset"""
 
+import io
 import json
 import os
+import re
+import zipfile
+from array import array
+
+import numpy as np
 
 import datasets
 
@@ -24,6 +30,194 @@ _DESCRIPTION = """\
 
 _URL = "https://www.microsoft.com/en-us/download/details.aspx?id=52763"
 
+_READ_SIZE = 1024 * 1024
+_WHITESPACE = re.compile(r"\s*")
+_QUESTIONS_KEY = re.compile(r'"Questions"\s*:\s*')
+# Parse fields that are not part of the features.
+_DROPPED_KEYS = {"Time", "Order"}
+
+
+def _drop_unused_keys(pairs):
+    """Builds a decoded JSON object, leaving `_DROPPED_KEYS` out of parses.
+
+    Only objects with a `ParseId` are parses; `Time` or `Order` keys of any
+    other object are kept. The dropped values have already been decoded by
+    the time the parse is built; they are just not kept in it.
+    """
+    if not any(key == "ParseId" for key, _ in pairs):
+        return dict(pairs)
+    return {key: value for key, value in pairs if key not in _DROPPED_KEYS}
+
+
+def iter_questions(f, read_size=_READ_SIZE):
+    """Yields the entries of the `Questions` array of a WebQSP file, one at a time.
+
+    `_DROPPED_KEYS` are left out of every parse as the decoder builds it (see
+    `_drop_unused_keys`), and memory is bounded by one question plus the read
+    buffer.
+    Entries must be separated by exactly one comma, as in `iter_json_array`
+    of grail_qa/grail_qa.py; anything else raises a ValueError.
+    """
+    decoder = json.JSONDecoder(object_pairs_hook=_drop_unused_keys)
+    buffer = ""
+    pos = 0
+    eof = False
+    # What the next non-whitespace character must be once the array is open:
+    # the first entry or "]", an entry after a comma, or the "," / "]" after an entry.
+    expected = None
+    while True:
+        if expected is None:
+            match = _QUESTIONS_KEY.search(buffer)
+            if match and match.end() < len(buffer):
+                pos = match.end()
+                if buffer[pos] != "[":
+                    raise ValueError("Expected the `Questions` array, found {!r}".format(buffer[pos]))
+                expected = "first entry"
+                pos += 1
+                continue
+            elif eof:
+                raise ValueError("No `Questions` array found")
+            elif match:
+                pos = match.start()
+            else:
+                # Keep a tail in case the key is split between two reads.
+                pos = max(0, len(buffer) - len('"Questions"'))
+        else:
+            pos = _WHITESPACE.match(buffer, pos).end()
+            if pos < len(buffer):
+                char = buffer[pos]
+                if expected == "separator":
+                    if char == "]":
+                        return
+                    if char != ",":
+                        raise ValueError("Expected ',' or ']' after a `Questions` entry, found {!r}".format(char))
+                    expected = "entry"
+                    pos += 1
+                    continue
+                if char == "]" and expected == "first entry":
+                    return
+                if char in ",]":
+                    raise ValueError("Expected a `Questions` entry, found {!r}".format(char))
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    end = None
+                if end is not None and (end < len(buffer) or eof):
+                    yield item
+                    pos = end
+                    expected = "separator"
+                    continue
+            elif eof:
+                raise ValueError("Unterminated `Questions` array")
+        chunk = f.read(max(read_size, 2 * (len(buffer) - pos)))
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+
+def _parse_index_keys(parse):
+    """Returns the index keys a parse is filed under."""
+    chain = parse.get("InferentialChain") or []
+    keys = {"chain_length={}".format(len(chain))}
+    if chain:
+        keys.add("chain=" + "/".join(chain))
+    keys.update("predicate=" + predicate for predicate in chain)
+    for constraint in parse.get("Constraints") or []:
+        for field, name in [("Operator", "operator"), ("ArgumentType", "argument_type"),
+                            ("ValueType", "value_type"), ("NodePredicate", "node_predicate")]:
+            if constraint.get(field) is not None:
+                keys.add("{}={}".format(name, constraint[field]))
+    return keys
+
+
+class ParseIndex:
+    """Inverted index from parse properties to the (question, parse) pairs that have them.
+
+    Keys are `predicate`, `chain` (predicates joined by "/"), `chain_length`,
+    and the constraint fields `operator`, `argument_type`, `value_type` and
+    `node_predicate`. Building WebQSP writes one index per split next to the
+    Arrow files.
+
+    Example, all 2-hop parses with a date constraint:
+
+        index = ParseIndex.for_dataset(webqsp["train"])
+        subset = index.select(webqsp["train"], chain_length=2, value_type="DateTime")
+    """
+
+    def __init__(self, keys, indptr, questions, parses):
+        self.keys = keys
+        self.key_ids = {key: i for i, key in enumerate(keys)}
+        self.indptr = indptr
+        self.questions = questions
+        self.parses = parses
+
+    @staticmethod
+    def directory(output_dir, split):
+        return os.path.join(output_dir, "parse_index-{}".format(split))
+
+    @classmethod
+    def build(cls, postings):
+        """Builds the index from a `{key: [(question, parse), ...]}` mapping."""
+        keys = sorted(postings)
+        lengths = [len(postings[key]) // 2 for key in keys]
+        pairs = np.frombuffer(b"".join(postings[key].tobytes() for key in keys), dtype=np.int32).reshape(-1, 2)
+        indptr = np.zeros(len(keys) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        return cls(keys, indptr, pairs[:, 0].copy(), pairs[:, 1].copy())
+
+    def save(self, index_dir):
+        os.makedirs(index_dir, exist_ok=True)
+        with open(os.path.join(index_dir, "keys.json"), "w", encoding="utf-8") as f:
+            json.dump(self.keys, f)
+        for name in ["indptr", "questions", "parses"]:
+            np.save(os.path.join(index_dir, name + ".npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, index_dir):
+        with open(os.path.join(index_dir, "keys.json"), encoding="utf-8") as f:
+            keys = json.load(f)
+        arrays = [
+            np.lib.format.open_memmap(os.path.join(index_dir, name + ".npy"), mode="r")
+            for name in ["indptr", "questions", "parses"]
+        ]
+        return cls(keys, *arrays)
+
+    @classmethod
+    def for_dataset(cls, dataset):
+        """Opens the index written alongside a loaded WebQSP split."""
+        return cls.load(cls.directory(os.path.dirname(dataset.cache_files[0]["filename"]), dataset.split))
+
+    def _pairs(self, field, value):
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        codes = []
+        for value in values:
+            key_id = self.key_ids.get("{}={}".format(field, value))
+            if key_id is not None:
+                start, end = self.indptr[key_id], self.indptr[key_id + 1]
+                codes.append(self.questions[start:end].astype(np.int64) << 16 | self.parses[start:end])
+        return np.unique(np.concatenate(codes)) if codes else np.zeros(0, dtype=np.int64)
+
+    def query(self, **conditions):
+        """Returns `(questions, parses)` of the parses matching every condition.
+
+        Each condition is `field=value`, or `field=[values]` to accept any of
+        several values; all conditions must hold for the same parse.
+        """
+        codes = None
+        for field, value in conditions.items():
+            pairs = self._pairs(field, value)
+            codes = pairs if codes is None else np.intersect1d(codes, pairs, assume_unique=True)
+        if codes is None:
+            raise ValueError("At least one condition is required")
+        return (codes >> 16).astype(np.int32), (codes & 0xFFFF).astype(np.int32)
+
+    def select(self, dataset, **conditions):
+        """Returns the rows of `dataset` with at least one parse matching `conditions`."""
+        return dataset.select(np.unique(self.query(**conditions)[0]))
+
+
 class WebQSPConfig(datasets.BuilderConfig):
     """BuilderConfig for WebQuestionsSP"""
     def __init__(self,
@@ -100,37 +294,39 @@ class WebQuestionsSP(datasets.GeneratorBasedBuilder):
         )
 
     def _split_generators(self, dl_manager):
-        download_dir = dl_manager.download_and_extract(self.config.data_url)
-        data_dir = os.path.join(download_dir, self.config.data_dir)
+        # The splits are streamed straight out of the archive, which is never extracted.
+        archive = dl_manager.download(self.config.data_url)
         return [
             datasets.SplitGenerator(
                 name=datasets.Split.TRAIN,
                 gen_kwargs={
-                    "data_file": os.path.join(data_dir, "data", "WebQSP.train.json"),
+                    "data_file": archive,
+                    "member": "/".join([self.config.data_dir, "data", "WebQSP.train.json"]),
                     "split": "train"
                 }
             ),
             datasets.SplitGenerator(
                 name=datasets.Split.TEST,
                 gen_kwargs={
-                    "data_file": os.path.join(data_dir, "data", "WebQSP.test.json"),
+                    "data_file": archive,
+                    "member": "/".join([self.config.data_dir, "data", "WebQSP.test.json"]),
                     "split": "test"
                 }
             )
         ]
 
-    def _generate_examples(self, data_file, **kwargs):
-        with open(data_file, encoding="utf8") as f:
-            webqsp = json.load(f)
-            for idx, question in enumerate(webqsp["Questions"]):
-                parses = []
-                for parse in question["Parses"]:
-                    parse.pop("Time", None)
-                    parse.pop("Order", None)
-                    parses.append(parse)
-                yield idx, {
-                  "QuestionId": question["QuestionId"],
-                  "RawQuestion": question["RawQuestion"],
-                  "ProcessedQuestion": question["ProcessedQuestion"],
-                  "Parses": parses
-                }
\ No newline at end of file
+    def _generate_examples(self, data_file, member, split, **kwargs):
+        postings = {}
+        with zipfile.ZipFile(data_file) as archive:
+            with io.TextIOWrapper(archive.open(member), encoding="utf8") as f:
+                for idx, question in enumerate(iter_questions(f)):
+                    for parse_idx, parse in enumerate(question["Parses"]):
+                        for key in _parse_index_keys(parse):
+                            postings.setdefault(key, array("i")).extend((idx, parse_idx))
+                    yield idx, {
+                      "QuestionId": question["QuestionId"],
+                      "RawQuestion": question["RawQuestion"],
+                      "ProcessedQuestion": question["ProcessedQuestion"],
+                      "Parses": question["Parses"]
+                    }
+        ParseIndex.build(postings).save(ParseIndex.directory(self._output_dir, split))